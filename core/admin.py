@@ -2,7 +2,8 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from .models import (
     User, Abonnement, Seance, Reservation,
-    Paiement, Ticket, Charge, PresencePersonnel, Personnel
+    Paiement, Ticket, Charge, PresencePersonnel, Personnel, TacheDocument,
+    CompteurMetrique, ExpirationAbonnement
 )
 
 class UserAdmin(BaseUserAdmin):
@@ -33,10 +34,11 @@ class SeanceAdmin(admin.ModelAdmin):
     list_filter = ('date_jour', 'coach')
 
 class ReservationAdmin(admin.ModelAdmin):
-    list_display = ('nom_client', 'type_reservation', 'montant', 'statut')
+    list_display = ('nom_client', 'client', 'type_reservation', 'montant', 'statut')
     search_fields = ('nom_client', 'description')
     list_filter = ('type_reservation', 'statut')
-    fields = ('nom_client', 'type_reservation', 'montant', 'statut', 'description')
+    fields = ('nom_client', 'client', 'type_reservation', 'montant', 'statut', 'description')
+    raw_id_fields = ('client',)
     
     def save_model(self, request, obj, form, change):
         if not change:
@@ -50,9 +52,23 @@ class PaiementAdmin(admin.ModelAdmin):
     list_filter = ('status', 'mode_paiement', 'date_paiement')
 
 class TicketAdmin(admin.ModelAdmin):
-    list_display = ('uuid', 'paiement', 'type_ticket', 'date_generation')
+    list_display = ('uuid', 'paiement', 'type_ticket', 'statut', 'date_generation')
     search_fields = ('uuid', 'paiement__client__nom', 'paiement__client__prenom')
-    list_filter = ('type_ticket', 'date_generation')
+    list_filter = ('type_ticket', 'statut', 'date_generation')
+
+class TacheDocumentAdmin(admin.ModelAdmin):
+    list_display = ('id', 'ticket', 'source_modele', 'source_id', 'statut', 'tentatives', 'date_creation', 'date_traitement')
+    list_filter = ('statut', 'source_modele')
+    readonly_fields = ('erreur',)
+
+class CompteurMetriqueAdmin(admin.ModelAdmin):
+    list_display = ('nom', 'valeur', 'date_maj')
+    readonly_fields = ('nom', 'valeur', 'date_maj')
+
+class ExpirationAbonnementAdmin(admin.ModelAdmin):
+    list_display = ('date_execution', 'modele', 'nombre')
+    list_filter = ('modele',)
+    readonly_fields = ('date_execution', 'modele', 'nombre', 'identifiants')
 
 class ChargeAdmin(admin.ModelAdmin):
     list_display = ('titre', 'montant', 'date')
@@ -71,6 +87,9 @@ admin.site.register(Seance, SeanceAdmin)
 admin.site.register(Reservation, ReservationAdmin)
 admin.site.register(Paiement, PaiementAdmin)
 admin.site.register(Ticket, TicketAdmin)
+admin.site.register(TacheDocument, TacheDocumentAdmin)
+admin.site.register(CompteurMetrique, CompteurMetriqueAdmin)
+admin.site.register(ExpirationAbonnement, ExpirationAbonnementAdmin)
 admin.site.register(Charge, ChargeAdmin)
 admin.site.register(PresencePersonnel, PresencePersonnelAdmin)
 admin.site.register(Personnel)
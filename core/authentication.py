@@ -0,0 +1,89 @@
+"""
+Authentification JWT sans chargement complet de l'utilisateur pour les lectures.
+
+Pour une requête en lecture (GET, HEAD, OPTIONS), ClaimsJWTAuthentication construit
+l'utilisateur à partir de l'identifiant du jeton et de son état d'autorisation (role,
+email, is_active) : les autres champs sont différés et le premier accès à l'un d'eux
+charge tout le profil en une requête (voir User.refresh_from_db). Les écritures
+chargent l'utilisateur complet, comme JWTAuthentication.
+
+Les claims `role` et `email` du jeton ne font pas foi : ils restent valables jusqu'à
+7 jours (rafraîchissements compris) après un changement. L'état est lu en base (une
+requête sur la clé primaire, trois colonnes) et gardé AUTH_CACHE_TTL_SECONDS dans le
+cache. Une modification ou suppression d'un utilisateur (signaux, voir core.signals)
+met à jour le cache du processus qui l'enregistre ; les autres processus, et les
+mises à jour en masse (update()), l'appliquent au plus tard à l'expiration de l'entrée.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router
+from django.utils.translation import gettext_lazy as _
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import User
+
+CHAMPS = ('email', 'role', 'is_active')
+
+
+def _cle(user_id):
+    return f'auth:utilisateur:{user_id}'
+
+
+def _ttl():
+    return getattr(settings, 'AUTH_CACHE_TTL_SECONDS', 60)
+
+
+def memoriser(utilisateur):
+    """Enregistre l'état courant de `utilisateur`, pris en compte immédiatement dans ce processus."""
+    etat = {champ: getattr(utilisateur, champ) for champ in CHAMPS}
+    cache.set(_cle(utilisateur.pk), etat, _ttl())
+
+
+def revoquer(user_id):
+    """Utilisateur supprimé : ses jetons encore valides sont refusés."""
+    cache.set(_cle(user_id), {'email': '', 'role': '', 'is_active': False}, _ttl())
+
+
+def utilisateur_partiel(user_id, etat):
+    """User avec id, email, role et is_active chargés ; les autres champs sont différés."""
+    valeurs = dict(etat, id=user_id)
+    champs = [f.attname for f in User._meta.concrete_fields if f.attname in valeurs]
+    utilisateur = User.from_db(router.db_for_read(User), champs, [valeurs[champ] for champ in champs])
+    utilisateur._depuis_jeton = True
+    return utilisateur
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+
+        # Écritures et révocation par mot de passe : utilisateur complet lu en base
+        if request.method not in SAFE_METHODS or api_settings.CHECK_REVOKE_TOKEN:
+            return self.get_user(validated_token), validated_token
+        return self.get_user_from_claims(validated_token), validated_token
+
+    def get_user_from_claims(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        etat = cache.get(_cle(user_id))
+        if etat is None:
+            etat = User.objects.filter(**{api_settings.USER_ID_FIELD: user_id}).values(*CHAMPS).first()
+            if etat is None:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found")
+            cache.set(_cle(user_id), etat, _ttl())
+
+        if not etat['is_active']:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return utilisateur_partiel(user_id, etat)
@@ -0,0 +1,158 @@
+"""
+Banc de mesure des endpoints critiques de l'API.
+
+`peupler()` crée un jeu de données volumineux (core.seed) ; `executer()` appelle chaque scénario
+plusieurs fois et relève la latence (médiane, p95, max), le nombre de requêtes SQL
+et le temps de rendu PDF (en-tête Server-Timing) ; pour les exports en flux, le
+pic mémoire pendant la lecture complète de la réponse. Chaque scénario a un budget de
+requêtes SQL : un dépassement est signalé dans les résultats.
+
+Utilisé par `python manage.py bench_api`, qui travaille sur une base jetable.
+"""
+import re
+import tracemalloc
+from decimal import Decimal
+from statistics import median
+from time import perf_counter
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .exports import EXPORTS
+from .jobs import traiter_taches
+from .models import User, Abonnement, Reservation, Paiement, AbonnementClientPresentiel
+from .seed import generer
+
+
+def peupler(clients=10000, paiements=100000, reservations=None, presentiels=None, jours=365, graine=42):
+    """
+    Crée le jeu de données du banc (core.seed, paiements tous aboutis). Retourne
+    un dict avec les comptes utilisés par les scénarios (admin, employé).
+    """
+    admin = User.objects.create_user(email='bench-admin@example.com', password='bench', nom='Bench',
+                                     prenom='Admin', role='ADMIN')
+    employe = User.objects.create_user(email='bench-employe@example.com', password='bench', nom='Bench',
+                                       prenom='Employe', role='EMPLOYE')
+    generer(clients=clients, paiements=paiements, reservations=reservations, presentiels=presentiels,
+            charges=jours, jours=jours, graine=graine, statuts_paiement={'PAYE': 1}, domaine='bench.local')
+    return {'admin': admin, 'employe': employe}
+
+
+def _reservation_en_attente(numero):
+    return Reservation.objects.create(
+        nom_client=f'Bench {numero}', type_reservation='SEANCE', montant=Decimal('0'), statut='EN_ATTENTE'
+    )
+
+
+def _paiement_en_attente(numero):
+    return Paiement.objects.create(montant=Decimal('2000'), status='EN_ATTENTE')
+
+
+def _presentiel_ouvert(numero):
+    abonnement = Abonnement.objects.order_by('prix').first()
+    return AbonnementClientPresentiel.objects.create(
+        client_nom='Bench', client_prenom=str(numero), abonnement=abonnement, date_debut=timezone.localdate()
+    )
+
+
+# Scénarios : (nom, rôle, budget de requêtes SQL, fonction (numéro) -> (méthode, url, données))
+SCENARIOS = [
+    ('reservations_list', 'employe', 5,
+     lambda n: ('get', reverse('reservation-list'), None)),
+    ('paiements_list', 'employe', 4,
+     lambda n: ('get', reverse('paiement-list'), None)),
+    ('presentiels_list', 'employe', 6,
+     lambda n: ('get', reverse('abonnementclientpresentiel-list'), None)),
+    ('presentiels_list_resume', 'employe', 4,
+     lambda n: ('get', reverse('abonnementclientpresentiel-list'), {'resume': 1})),
+    ('financial_report', 'admin', 10,
+     lambda n: ('get', reverse('financial-report'), None)),
+    ('reservation_valider', 'employe', 25,
+     lambda n: ('post', reverse('valider-reservation-seance', args=[_reservation_en_attente(n).pk]), {'montant': 2000})),
+    ('paiement_valider', 'employe', 14,
+     lambda n: ('post', reverse('valider-paiement', args=[_paiement_en_attente(n).pk]), None)),
+    ('presentiel_ajouter_paiement', 'employe', 10,
+     lambda n: ('post', reverse('abonnementclientpresentiel-ajouter-paiement', args=[_presentiel_ouvert(n).pk]),
+                {'montant': '1000'})),
+]
+# Exports en flux : réponse lue jusqu'au bout, pic mémoire relevé (tracemalloc)
+SCENARIOS_MEMOIRE = {f'export_{nom}' for nom in EXPORTS}
+SCENARIOS += [
+    (f'export_{nom}', 'admin', 2, lambda n, nom=nom: ('get', reverse('export', args=[nom, 'csv']), None))
+    for nom in EXPORTS
+]
+
+
+def _pdf_ms(response):
+    correspondance = re.search(r'pdf;dur=([\d.]+)', response.get('Server-Timing', ''))
+    return float(correspondance.group(1)) if correspondance else 0.0
+
+
+def _p95(valeurs):
+    valeurs = sorted(valeurs)
+    return valeurs[min(len(valeurs) - 1, int(round(0.95 * (len(valeurs) - 1))))]
+
+
+def _resume(nom, budget, durees, requetes, pdf, statuts, pics=None):
+    return {
+        'scenario': nom,
+        'runs': len(durees),
+        'p50_ms': round(median(durees), 2),
+        'p95_ms': round(_p95(durees), 2),
+        'max_ms': round(max(durees), 2),
+        'queries': max(requetes),
+        'query_budget': budget,
+        'over_budget': budget is not None and max(requetes) > budget,
+        'pdf_ms': round(sum(pdf) / len(pdf), 2),
+        'statuses': sorted(set(statuts)),
+        'peak_kb': round(max(pics) / 1024, 1) if pics else None,
+    }
+
+
+def executer(comptes, repetitions=20, scenarios=None):
+    """Exécute les scénarios (tous par défaut) et retourne la liste des résultats."""
+    resultats = []
+    for nom, role, budget, requete in SCENARIOS:
+        if scenarios and nom not in scenarios:
+            continue
+        client = APIClient()
+        client.force_authenticate(comptes[role])
+        memoire = nom in SCENARIOS_MEMOIRE
+        durees, requetes, pdf, statuts, pics = [], [], [], [], []
+        for numero in range(repetitions):
+            methode, url, donnees = requete(numero)
+            if memoire:
+                tracemalloc.start()
+            with CaptureQueriesContext(connection) as ctx:
+                debut = perf_counter()
+                response = getattr(client, methode)(url, donnees, format='json')
+                if response.streaming:
+                    for _morceau in response.streaming_content:
+                        pass
+                durees.append((perf_counter() - debut) * 1000)
+            if memoire:
+                pics.append(tracemalloc.get_traced_memory()[1])
+                tracemalloc.stop()
+            requetes.append(len(ctx.captured_queries))
+            pdf.append(_pdf_ms(response))
+            statuts.append(response.status_code)
+        resultats.append(_resume(nom, budget, durees, requetes, pdf, statuts, pics))
+
+    if not scenarios or 'pdf_worker' in scenarios:
+        # Rendu des tickets planifiés par les scénarios de validation (un rendu par passage)
+        durees, requetes = [], []
+        for _ in range(repetitions):
+            with CaptureQueriesContext(connection) as ctx:
+                debut = perf_counter()
+                traitees, _echecs = traiter_taches(limite=1)
+                duree = (perf_counter() - debut) * 1000
+            if not traitees:
+                break
+            durees.append(duree)
+            requetes.append(len(ctx.captured_queries))
+        if durees:
+            resultats.append(_resume('pdf_worker', 15, durees, requetes, durees, []))
+    return resultats
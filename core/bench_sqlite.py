@@ -0,0 +1,110 @@
+"""
+Banc d'écriture concurrente sur SQLite.
+
+`mesurer()` lance N processus (fork, comme les workers gunicorn) qui enchaînent des
+transactions lecture puis écriture sur une base SQLite jetable (table Personnel, sans
+signaux), et relève le débit, les latences et le nombre d'erreurs « database is locked ».
+Deux profils :
+- 'defaut' : réglages SQLite de Django, connexion rouverte à chaque requête ;
+- 'production' : OPTIONS (PRAGMA, timeout, transaction_mode) et CONN_MAX_AGE de
+  settings.DATABASES['default'].
+
+Utilisé par `python manage.py bench_sqlite`.
+"""
+import multiprocessing
+import os
+import tempfile
+from datetime import date
+from statistics import median
+from time import perf_counter
+
+from django.conf import settings
+from django.db import OperationalError, connections, transaction
+
+from .models import Personnel
+
+ALIAS = 'bench_sqlite'
+
+
+def profils():
+    """nom -> (OPTIONS de connexion, connexion persistante)"""
+    defaut = settings.DATABASES['default']
+    return {
+        'defaut': ({}, False),
+        'production': (dict(defaut.get('OPTIONS', {})), bool(defaut.get('CONN_MAX_AGE'))),
+    }
+
+
+def _configurer(chemin, options):
+    """Déclare (ou remplace) la connexion ALIAS vers la base `chemin`."""
+    base = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': chemin, 'OPTIONS': options}
+    config = connections.configure_settings({'default': settings.DATABASES['default'], ALIAS: base})
+    if ALIAS in connections.settings:
+        connections[ALIAS].close()
+        del connections[ALIAS]
+    connections.settings[ALIAS] = config[ALIAS]
+
+
+def _travailleur(chemin, options, persistant, transactions, numero, resultats):
+    _configurer(chemin, options)
+    personnel = Personnel.objects.using(ALIAS)
+    jour = date.today()
+    latences, erreurs = [], 0
+    for i in range(transactions):
+        debut = perf_counter()
+        try:
+            # Lecture puis écriture dans la même transaction, comme une validation de paiement
+            with transaction.atomic(using=ALIAS):
+                personnel.filter(date_emploi=jour).count()
+                personnel.create(nom=f'Bench {numero}', prenom=str(i), date_emploi=jour, categorie='AUTRE')
+            latences.append((perf_counter() - debut) * 1000)
+        except OperationalError:
+            erreurs += 1
+        if not persistant:
+            # CONN_MAX_AGE = 0 : connexion fermée en fin de requête
+            connections[ALIAS].close()
+    connections[ALIAS].close()
+    resultats.put((latences, erreurs))
+
+
+def mesurer(profil, travailleurs=4, transactions=200, dossier=None):
+    """Exécute le banc pour `profil` et retourne ses mesures."""
+    options, persistant = profils()[profil]
+    with tempfile.TemporaryDirectory(dir=dossier) as repertoire:
+        chemin = os.path.join(repertoire, f'{profil}.sqlite3')
+        _configurer(chemin, options)
+        with connections[ALIAS].schema_editor() as editeur:
+            editeur.create_model(Personnel)
+        connections[ALIAS].close()
+
+        contexte = multiprocessing.get_context('fork')
+        resultats = contexte.Queue()
+        processus = [
+            contexte.Process(target=_travailleur, args=(chemin, options, persistant, transactions, numero, resultats))
+            for numero in range(travailleurs)
+        ]
+        debut = perf_counter()
+        for p in processus:
+            p.start()
+        mesures = [resultats.get() for _ in processus]
+        for p in processus:
+            p.join()
+        duree = perf_counter() - debut
+
+        _configurer(chemin, options)
+        lignes = Personnel.objects.using(ALIAS).count()
+        connections[ALIAS].close()
+        del connections[ALIAS]
+        del connections.settings[ALIAS]
+
+    latences = sorted(latence for latences_, _erreurs in mesures for latence in latences_)
+    return {
+        'profil': profil,
+        'travailleurs': travailleurs,
+        'transactions': travailleurs * transactions,
+        'validees': lignes,
+        'erreurs': sum(erreurs for _latences, erreurs in mesures),
+        'debit_tps': round(lignes / duree, 1),
+        'p50_ms': round(median(latences), 2) if latences else None,
+        'p95_ms': round(latences[int(0.95 * (len(latences) - 1))], 2) if latences else None,
+    }
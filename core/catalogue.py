@@ -0,0 +1,92 @@
+"""
+Catalogue des abonnements, gardé en mémoire par processus.
+
+Le catalogue (quelques lignes) est lu en une requête puis servi depuis la mémoire.
+Il est invalidé après le commit de chaque écriture sur Abonnement (signaux
+post_save/post_delete, voir core.signals). Les autres processus ne reçoivent pas
+ces signaux : leur copie expire au plus tard après CATALOGUE_TTL_SECONDS secondes.
+
+Les valeurs dérivées du catalogue (représentation de l'API, voir `derive`) sont
+construites une fois par chargement du catalogue.
+
+Les instances retournées sont partagées : ne pas les modifier.
+"""
+import re
+import threading
+import time
+
+from django.conf import settings
+
+from .models import Abonnement
+
+_verrou = threading.Lock()
+_etat = {'abonnements': None, 'charge_le': 0.0, 'derives': {}}
+
+
+def _ttl():
+    return getattr(settings, 'CATALOGUE_TTL_SECONDS', 60)
+
+
+def _valide(abonnements):
+    return abonnements is not None and time.monotonic() - _etat['charge_le'] < _ttl()
+
+
+def _catalogue():
+    abonnements = _etat['abonnements']
+    if _valide(abonnements):
+        return abonnements
+    with _verrou:
+        # Rechargé par un autre thread entre-temps, ou invalidé : état relu sous le verrou
+        if not _valide(_etat['abonnements']):
+            _etat['abonnements'] = {a.pk: a for a in Abonnement.objects.order_by('id')}
+            _etat['charge_le'] = time.monotonic()
+            _etat['derives'] = {}
+        return _etat['abonnements']
+
+
+def invalider():
+    """Oublie le catalogue : il sera relu au prochain accès."""
+    with _verrou:
+        _etat['abonnements'] = None
+        _etat['derives'] = {}
+
+
+def abonnements():
+    """Tous les abonnements, par id croissant."""
+    return list(_catalogue().values())
+
+
+def abonnement(pk):
+    """Abonnement d'identifiant `pk`, ou None."""
+    if pk is None:
+        return None
+    return _catalogue().get(int(pk))
+
+
+def derive(cle, construire):
+    """
+    Valeur `construire(abonnements)` mémorisée sous `cle` jusqu'au prochain
+    rechargement du catalogue.
+    """
+    # Dictionnaire lu avant le catalogue : une valeur calculée pendant un rechargement est jetée avec lui
+    derives = _etat['derives']
+    abonnements_ = abonnements()
+    if cle not in derives:
+        derives[cle] = construire(abonnements_)
+    return derives[cle]
+
+
+def deviner(description, montant=None):
+    """
+    Retrouve l'abonnement d'une réservation qui ne l'indique pas : nom cité dans la
+    description ("Abonnement Gold - ..."), à défaut prix à 10 % près du montant.
+    Utilisé une seule fois, à la création de la réservation.
+    """
+    correspondance = re.search(r'Abonnement\s+([\w\- ]+)', description or '')
+    if correspondance:
+        nom = correspondance.group(1).strip().lower()
+        return next((a for a in abonnements() if nom in a.nom.lower()), None)
+    if montant:
+        montant = float(montant)
+        return next((a for a in abonnements() if montant * 0.9 <= float(a.prix) <= montant * 1.1), None)
+    return None
@@ -0,0 +1,142 @@
+"""
+Contrôle d'accès à l'entrée : validité de l'abonnement associé à un ticket.
+
+`verifier(code)` répond à partir de l'uuid du ticket (QR code imprimé sur le PDF) :
+VALIDE (jusqu'au ...), EXPIRE, IMPAYE ou INACTIF (désactivé avant échéance). Le ticket est lu par son index unique,
+avec son paiement ; seule la source du ticket (abonnement) demande une lecture par clé.
+
+Les adhésions valides sont gardées en mémoire par processus (CHECKIN_CACHE_TTL_SECONDS) :
+les passages répétés du matin ne touchent pas la base. L'échéance est recalculée à
+chaque lecture depuis la date de fin mémorisée ; toute écriture sur l'abonnement ou le
+paiement concerné retire l'entrée du processus qui l'a faite (core.signals, et pour les
+UPDATE directs AbonnementClientPresentiel.crediter et core.expiration). Les autres
+processus ne sont pas prévenus : une adhésion désactivée ou impayée peut encore y être
+acceptée pendant au plus CHECKIN_CACHE_TTL_SECONDS. Les réponses négatives ne sont
+jamais mises en cache : un membre qui vient de payer passe immédiatement.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Ticket, AbonnementClient, AbonnementClientPresentiel
+
+_verrou = threading.Lock()
+_adhesions = {}      # uuid (str) -> (expire_le, réponse, clés d'invalidation)
+_par_cle = {}        # (modèle, id) -> {uuid}
+
+
+def _ttl():
+    return getattr(settings, 'CHECKIN_CACHE_TTL_SECONDS', 30)
+
+
+def _limiter():
+    """Garde le cache sous CHECKIN_CACHE_MAX entrées (appelé verrou tenu)."""
+    if len(_adhesions) < getattr(settings, 'CHECKIN_CACHE_MAX', 10000):
+        return
+    maintenant = time.monotonic()
+    for code in [code for code, entree in _adhesions.items() if entree[0] <= maintenant]:
+        del _adhesions[code]
+    if len(_adhesions) >= getattr(settings, 'CHECKIN_CACHE_MAX', 10000):
+        _adhesions.clear()
+    # Index inverse reconstruit sur les entrées restantes
+    _par_cle.clear()
+    for code, entree in _adhesions.items():
+        for cle in entree[2]:
+            _par_cle.setdefault(cle, set()).add(code)
+
+
+def _reponse(statut, type_ticket, client, valide_jusqu_au=None, abonnement=None):
+    return {
+        'statut': statut,
+        'type': type_ticket,
+        'client': client,
+        'abonnement': abonnement,
+        'valide_jusqu_au': valide_jusqu_au,
+    }
+
+
+def _evaluer(ticket):
+    """Réponse pour `ticket` et clés (modèle, id) des objets dont elle dépend."""
+    paiement = ticket.paiement
+    cles = {('Paiement', paiement.pk)}
+    abonnement = None
+    if ticket.source_modele == 'AbonnementClient':
+        abonnement = AbonnementClient.objects.select_related('abonnement', 'client', 'paiement').filter(
+            pk=ticket.source_id).first()
+    elif ticket.source_modele == 'AbonnementClientPresentiel':
+        abonnement = AbonnementClientPresentiel.objects.select_related('abonnement').filter(pk=ticket.source_id).first()
+    elif hasattr(paiement, 'abonnementclient'):
+        # Tickets antérieurs aux données de rendu : abonnement rattaché au paiement
+        abonnement = paiement.abonnementclient
+
+    if abonnement is None:
+        # Séance ou réservation : valable une fois payée
+        client = str(paiement.client) if paiement.client_id else None
+        statut = 'VALIDE' if paiement.status == 'PAYE' else 'IMPAYE'
+        return _reponse(statut, ticket.type_ticket, client), cles
+
+    cles.add((type(abonnement).__name__, abonnement.pk))
+    if isinstance(abonnement, AbonnementClientPresentiel):
+        client = f"{abonnement.client_prenom} {abonnement.client_nom}"
+        statut = 'VALIDE' if abonnement.statut_paiement == 'PAIEMENT_TERMINE' else 'IMPAYE'
+    else:
+        client = str(abonnement.client)
+        paye = abonnement.paiement_id is not None and abonnement.paiement.status == 'PAYE'
+        if abonnement.actif:
+            statut = 'VALIDE'
+        elif abonnement.date_fin < timezone.localdate():
+            # actif remis à False à l'échéance (core.expiration) : EXPIRE s'il avait été payé
+            statut = 'VALIDE' if paye else 'IMPAYE'
+        else:
+            # Pas encore validé, ou désactivé avant son échéance
+            statut = 'INACTIF' if paye else 'IMPAYE'
+    reponse = _reponse(statut, 'ABONNEMENT', client, abonnement.date_fin, abonnement.abonnement.nom)
+    return reponse, cles
+
+
+def _avec_echeance(reponse):
+    """Applique la date du jour : une adhésion valide dont la date de fin est passée est EXPIRE."""
+    if reponse['statut'] == 'VALIDE' and reponse['valide_jusqu_au'] and reponse['valide_jusqu_au'] < timezone.localdate():
+        reponse = dict(reponse, statut='EXPIRE')
+    return reponse
+
+
+def verifier(code):
+    """Réponse de contrôle pour le ticket d'uuid `code`, ou None si aucun ticket ne correspond."""
+    code = str(code)
+    entree = _adhesions.get(code)
+    if entree and entree[0] > time.monotonic():
+        return _avec_echeance(entree[1])
+
+    ticket = Ticket.objects.select_related('paiement__client', 'paiement__abonnementclient__abonnement').filter(
+        uuid=code).first()
+    if ticket is None:
+        return None
+    reponse, cles = _evaluer(ticket)
+    reponse = _avec_echeance(reponse)
+    if reponse['statut'] == 'VALIDE':
+        with _verrou:
+            _limiter()
+            _adhesions[code] = (time.monotonic() + _ttl(), reponse, cles)
+            for cle in cles:
+                _par_cle.setdefault(cle, set()).add(code)
+    return reponse
+
+
+def invalider(modele, pk):
+    """Retire du cache les adhésions qui dépendent de l'objet (modele, pk)."""
+    with _verrou:
+        for code in _par_cle.pop((modele, pk), ()):
+            entree = _adhesions.pop(code, None)
+            for cle in (entree[2] if entree else ()):
+                if cle != (modele, pk):
+                    _par_cle.get(cle, set()).discard(code)
+
+
+def vider():
+    """Vide le cache des adhésions."""
+    with _verrou:
+        _adhesions.clear()
+        _par_cle.clear()
@@ -0,0 +1,109 @@
+"""
+Téléchargement des documents PDF (tickets, factures).
+
+`servir_fichier` répond à un GET sur un fichier stocké :
+- validateurs de cache `ETag` / `Last-Modified` : un client qui possède déjà le
+  fichier reçoit un 304 sans corps (`If-None-Match`, `If-Modified-Since`) ;
+- requêtes partielles `Range: bytes=...` (206, 416 hors limites), avec `If-Range` ;
+- délégation de l'envoi au serveur frontal selon DOCUMENTS_OFFLOAD :
+  'x-accel-redirect' (nginx, préfixe interne DOCUMENTS_ACCEL_PREFIX) ou 'x-sendfile'
+  (Apache/lighttpd, chemin absolu). Le worker ne lit alors plus le fichier ; le
+  serveur frontal gère lui-même les Range.
+
+Les noms des tickets sont adressés par contenu (voir core.utils.cle_ticket) : un
+fichier n'est jamais réécrit sous le même nom, ce qui rend l'ETag fiable.
+"""
+import hashlib
+import os
+import re
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+
+_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def _etag(nom, taille, modifie):
+    empreinte = hashlib.md5(f'{nom}:{taille}:{modifie}'.encode()).hexdigest()
+    return quote_etag(empreinte)
+
+
+def _plage(entete, taille):
+    """
+    Interprète un en-tête Range à une seule plage. Retourne (début, fin incluse),
+    None si l'en-tête est absent ou non pris en charge (réponse complète),
+    ou False si la plage est hors du fichier (416).
+    """
+    correspondance = _RANGE.match(entete.strip()) if entete else None
+    if not correspondance:
+        return None
+    debut, fin = correspondance.groups()
+    if not debut and not fin:
+        return None
+    if not debut:
+        # Suffixe : les `fin` derniers octets
+        longueur = int(fin)
+        if longueur == 0:
+            return False
+        return max(taille - longueur, 0), taille - 1
+    debut = int(debut)
+    fin = min(int(fin), taille - 1) if fin else taille - 1
+    if debut >= taille or fin < debut:
+        return False
+    return debut, fin
+
+
+def _offload(nom, reponse):
+    mode = getattr(settings, 'DOCUMENTS_OFFLOAD', None)
+    if mode == 'x-accel-redirect':
+        prefixe = getattr(settings, 'DOCUMENTS_ACCEL_PREFIX', '/protected-media/')
+        reponse['X-Accel-Redirect'] = prefixe.rstrip('/') + '/' + nom
+    elif mode == 'x-sendfile':
+        reponse['X-Sendfile'] = default_storage.path(nom)
+    else:
+        return False
+    return True
+
+
+def servir_fichier(request, fichier, content_type='application/pdf'):
+    """Réponse HTTP pour le fichier stocké `fichier` (FieldFile) ; 404 s'il n'existe pas."""
+    nom = fichier.name if fichier else ''
+    if not nom or not default_storage.exists(nom):
+        raise Http404("Fichier non trouvé sur le serveur")
+
+    taille = default_storage.size(nom)
+    modifie = int(default_storage.get_modified_time(nom).timestamp())
+    etag = _etag(nom, taille, modifie)
+
+    # 304 (ou 412) si le client possède déjà cette version
+    conditionnelle = get_conditional_response(request, etag=etag, last_modified=modifie)
+    if conditionnelle is not None:
+        return conditionnelle
+
+    nom_fichier = os.path.basename(nom)
+    reponse = HttpResponse(content_type=content_type)
+    if not _offload(nom, reponse):
+        plage = _plage(request.headers.get('Range'), taille)
+        si_plage = request.headers.get('If-Range')
+        if plage is not None and si_plage and si_plage != etag and parse_http_date_safe(si_plage) != modifie:
+            plage = None  # le client possède une autre version : fichier complet
+        if plage is False:
+            reponse = HttpResponse(status=416)
+            reponse['Content-Range'] = f'bytes */{taille}'
+        elif plage is not None:
+            debut, fin = plage
+            with default_storage.open(nom, 'rb') as f:
+                f.seek(debut)
+                reponse = HttpResponse(f.read(fin - debut + 1), status=206, content_type=content_type)
+            reponse['Content-Range'] = f'bytes {debut}-{fin}/{taille}'
+        else:
+            reponse = FileResponse(default_storage.open(nom, 'rb'), content_type=content_type)
+    reponse['Content-Disposition'] = f'attachment; filename="{nom_fichier}"'
+    reponse['Accept-Ranges'] = 'bytes'
+    reponse['ETag'] = etag
+    reponse['Last-Modified'] = http_date(modifie)
+    reponse['Cache-Control'] = 'private, no-cache'
+    return reponse
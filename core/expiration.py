@@ -0,0 +1,52 @@
+"""
+Expiration des abonnements échus.
+
+`expirer_abonnements` passe à EXPIRE les abonnements présentiels et désactive les
+abonnements clients dont la date de fin est dépassée, par lots : les identifiants d'un
+lot sont lus sur l'index (statut/actif, date_fin), puis un seul UPDATE conditionnel
+les modifie. Chaque lot est consigné dans ExpirationAbonnement.
+
+Sans effet sur les lignes déjà expirées : peut être relancé à volonté
+(`python manage.py expirer_abonnements`, ou en boucle avec --intervalle).
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from . import checkin
+from .models import AbonnementClient, AbonnementClientPresentiel, ExpirationAbonnement
+
+# modèle -> (filtre des lignes encore actives, modification appliquée à l'échéance)
+REGLES = [
+    (AbonnementClientPresentiel, {'statut__in': ['EN_COURS', 'TERMINE']}, {'statut': 'EXPIRE'}),
+    (AbonnementClient, {'actif': True}, {'actif': False}),
+]
+
+
+def _expirer_lot(modele, actifs, modification, aujourd_hui, taille_lot):
+    echus = modele.objects.filter(date_fin__lt=aujourd_hui, **actifs)
+    ids = list(echus.order_by('date_fin', 'id').values_list('id', flat=True)[:taille_lot])
+    if not ids:
+        return 0
+    with transaction.atomic():
+        # Conditions répétées dans l'UPDATE : une ligne modifiée entre-temps n'est pas touchée
+        nombre = echus.filter(id__in=ids).update(**modification)
+        ExpirationAbonnement.objects.create(modele=modele.__name__, nombre=nombre, identifiants=ids)
+    # L'UPDATE ne déclenche pas post_save : les adhésions expirées sortent du cache du contrôle d'accès
+    for pk in ids:
+        checkin.invalider(modele.__name__, pk)
+    return nombre
+
+
+def expirer_abonnements(aujourd_hui=None, taille_lot=1000):
+    """Expire tous les abonnements échus avant `aujourd_hui`. Retourne {nom du modèle: nombre expiré}."""
+    aujourd_hui = aujourd_hui or timezone.localdate()
+    resultat = {}
+    for modele, actifs, modification in REGLES:
+        total = 0
+        while True:
+            nombre = _expirer_lot(modele, actifs, modification, aujourd_hui, taille_lot)
+            total += nombre
+            if nombre < taille_lot:
+                break
+        resultat[modele.__name__] = total
+    return resultat
@@ -0,0 +1,143 @@
+"""
+Exports comptables (paiements, tranches, charges, abonnements présentiels).
+
+Les lignes sont lues avec values_list().iterator(chunk_size=EXPORT_CHUNK_SIZE) : aucune
+instance de modèle n'est construite et la mémoire ne dépend pas du nombre de lignes.
+Le CSV est produit au fil de l'eau (StreamingHttpResponse, voir ExportView). Le format
+XLSX n'est proposé que si openpyxl est installé ; le classeur est écrit en mode
+write_only dans un fichier temporaire avant d'être servi.
+"""
+import csv
+import tempfile
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+
+from .models import Paiement, PaiementTranche, Charge, AbonnementClientPresentiel
+
+try:
+    from openpyxl import Workbook
+except ImportError:  # dépendance optionnelle
+    Workbook = None
+
+# nom de l'export -> (modèle, champ de date filtré et trié, colonnes (en-tête, champ))
+EXPORTS = {
+    'paiements': (Paiement, 'date_paiement', [
+        ('id', 'id'),
+        ('date_paiement', 'date_paiement'),
+        ('client_nom', 'client__nom'),
+        ('client_prenom', 'client__prenom'),
+        ('client_email', 'client__email'),
+        ('montant', 'montant'),
+        ('status', 'status'),
+        ('mode_paiement', 'mode_paiement'),
+        ('abonnement', 'abonnement__nom'),
+        ('seance_id', 'seance_id'),
+        ('reservation_id', 'reservation_id'),
+    ]),
+    'tranches': (PaiementTranche, 'date_paiement', [
+        ('id', 'id'),
+        ('date_paiement', 'date_paiement'),
+        ('abonnement_presentiel_id', 'abonnement_presentiel_id'),
+        ('client_nom', 'abonnement_presentiel__client_nom'),
+        ('client_prenom', 'abonnement_presentiel__client_prenom'),
+        ('abonnement', 'abonnement_presentiel__abonnement__nom'),
+        ('montant', 'montant'),
+        ('mode_paiement', 'mode_paiement'),
+        ('employe_email', 'employe__email'),
+    ]),
+    'charges': (Charge, 'date', [
+        ('id', 'id'),
+        ('date', 'date'),
+        ('titre', 'titre'),
+        ('montant', 'montant'),
+        ('description', 'description'),
+    ]),
+    'abonnements-presentiels': (AbonnementClientPresentiel, 'date_debut', [
+        ('id', 'id'),
+        ('date_debut', 'date_debut'),
+        ('date_fin', 'date_fin'),
+        ('client_nom', 'client_nom'),
+        ('client_prenom', 'client_prenom'),
+        ('abonnement', 'abonnement__nom'),
+        ('montant_total', 'montant_total'),
+        ('montant_paye', 'montant_paye'),
+        ('statut_paiement', 'statut_paiement'),
+        ('statut', 'statut'),
+    ]),
+}
+
+
+def xlsx_disponible():
+    return Workbook is not None
+
+
+def _taille_lot():
+    return getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+
+
+def _filtre_dates(modele, champ, debut, fin):
+    """Bornes incluses ; sur un DateTimeField, converties en instants locaux pour rester sur l'index."""
+    if isinstance(modele._meta.get_field(champ), models.DateTimeField):
+        debut = debut and timezone.make_aware(datetime.combine(debut, time.min))
+        fin = fin and timezone.make_aware(datetime.combine(fin + timedelta(days=1), time.min))
+        bornes = {f'{champ}__gte': debut, f'{champ}__lt': fin}
+    else:
+        bornes = {f'{champ}__gte': debut, f'{champ}__lte': fin}
+    return {cle: valeur for cle, valeur in bornes.items() if valeur is not None}
+
+
+# Début de cellule interprété comme une formule par les tableurs (injection CSV)
+FORMULE = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _valeur(valeur):
+    if valeur is None:
+        return ''
+    if isinstance(valeur, datetime):
+        return timezone.localtime(valeur).strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(valeur, str) and valeur.startswith(FORMULE):
+        # Noms, e-mails, descriptions saisis librement : affichés comme texte
+        return f"'{valeur}"
+    return valeur
+
+
+def lignes(nom, debut=None, fin=None, using=None):
+    """En-têtes puis lignes de l'export `nom` sur [debut, fin] (dates, bornes incluses), lues sur `using`."""
+    modele, champ, colonnes = EXPORTS[nom]
+    yield [entete for entete, _champ in colonnes]
+    requete = (
+        modele.objects.using(using).filter(**_filtre_dates(modele, champ, debut, fin))
+        .order_by(champ, 'id')
+        .values_list(*[champ_ for _entete, champ_ in colonnes])
+    )
+    for ligne in requete.iterator(chunk_size=_taille_lot()):
+        yield [_valeur(valeur) for valeur in ligne]
+
+
+class _Tampon:
+    """Pseudo-fichier : csv.writer retourne directement la ligne formatée."""
+
+    def write(self, valeur):
+        return valeur
+
+
+def flux_csv(nom, debut=None, fin=None, using=None):
+    """Lignes CSV (str) de l'export, une à une."""
+    ecrivain = csv.writer(_Tampon())
+    for ligne in lignes(nom, debut, fin, using):
+        yield ecrivain.writerow(ligne)
+
+
+def fichier_xlsx(nom, debut=None, fin=None):
+    """Classeur XLSX de l'export dans un fichier temporaire (ouvert, positionné au début)."""
+    classeur = Workbook(write_only=True)
+    feuille = classeur.create_sheet(title=nom[:31])
+    for ligne in lignes(nom, debut, fin):
+        feuille.append(ligne)
+    fichier = tempfile.TemporaryFile()
+    classeur.save(fichier)
+    fichier.seek(0)
+    return fichier
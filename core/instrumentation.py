@@ -0,0 +1,128 @@
+"""
+Instrumentation des requêtes : temps total, temps et nombre de requêtes SQL,
+temps de rendu PDF et temps de sérialisation.
+
+Le middleware publie ces mesures dans l'en-tête `Server-Timing`, écrit une ligne de
+log structurée par requête (logger `core.perf`) et signale en WARNING les requêtes
+qui dépassent PERF_QUERY_BUDGET requêtes SQL ou PERF_LATENCY_BUDGET_MS millisecondes.
+"""
+import contextvars
+import logging
+from contextlib import ExitStack, contextmanager
+from time import perf_counter
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('core.perf')
+
+# Mesures de la requête en cours (None hors requête : worker, commandes, shell)
+_mesures = contextvars.ContextVar('core_perf_mesures', default=None)
+_profondeur_serializer = contextvars.ContextVar('core_perf_serializer_depth', default=0)
+
+
+def _nouvelles_mesures():
+    return {'db': 0.0, 'queries': 0, 'pdf': 0.0, 'serializer': 0.0}
+
+
+@contextmanager
+def mesurer(nom):
+    """Ajoute la durée du bloc à la mesure `nom` de la requête en cours (sans effet hors requête)."""
+    mesures = _mesures.get()
+    if mesures is None:
+        yield
+        return
+    debut = perf_counter()
+    try:
+        yield
+    finally:
+        mesures[nom] = mesures.get(nom, 0.0) + perf_counter() - debut
+
+
+class TimedSerializerMixin:
+    """Comptabilise le temps de sérialisation ; les serializers imbriqués ne sont comptés qu'une fois."""
+
+    def to_representation(self, instance):
+        mesures = _mesures.get()
+        if mesures is None or _profondeur_serializer.get():
+            return super().to_representation(instance)
+        token = _profondeur_serializer.set(1)
+        debut = perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            mesures['serializer'] += perf_counter() - debut
+            _profondeur_serializer.reset(token)
+
+
+class PerformanceMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mesures = _nouvelles_mesures()
+        token = _mesures.set(mesures)
+        debut = perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(self._compteur_sql(mesures)))
+                response = self.get_response(request)
+        finally:
+            total = perf_counter() - debut
+            _mesures.reset(token)
+
+        self._publier(request, response, total, mesures)
+        return response
+
+    @staticmethod
+    def _compteur_sql(mesures):
+        def wrapper(execute, sql, params, many, context):
+            debut = perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                mesures['db'] += perf_counter() - debut
+                mesures['queries'] += 1
+        return wrapper
+
+    def _publier(self, request, response, total, mesures):
+        total_ms = total * 1000
+        db_ms = mesures['db'] * 1000
+        pdf_ms = mesures['pdf'] * 1000
+        serializer_ms = mesures['serializer'] * 1000
+
+        if getattr(settings, 'PERF_SERVER_TIMING', True):
+            response['Server-Timing'] = ', '.join([
+                f'total;dur={total_ms:.1f}',
+                f'db;dur={db_ms:.1f};desc="{mesures["queries"]} queries"',
+                f'pdf;dur={pdf_ms:.1f}',
+                f'serializer;dur={serializer_ms:.1f}',
+            ])
+
+        budget_queries = getattr(settings, 'PERF_QUERY_BUDGET', None)
+        budget_ms = getattr(settings, 'PERF_LATENCY_BUDGET_MS', None)
+        hors_budget = (
+            (budget_queries is not None and mesures['queries'] > budget_queries)
+            or (budget_ms is not None and total_ms > budget_ms)
+        )
+        niveau = logging.WARNING if hors_budget else logging.INFO
+        if not logger.isEnabledFor(niveau):
+            return
+
+        perf = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total_ms, 1),
+            'db_ms': round(db_ms, 1),
+            'queries': mesures['queries'],
+            'pdf_ms': round(pdf_ms, 1),
+            'serializer_ms': round(serializer_ms, 1),
+            'over_budget': hors_budget,
+        }
+        logger.log(
+            niveau,
+            ' '.join(f'{cle}={valeur}' for cle, valeur in perf.items()),
+            extra={'perf': perf}
+        )
@@ -0,0 +1,217 @@
+"""
+File d'attente locale (en base) pour la génération des documents PDF.
+
+Les vues créent le Ticket immédiatement avec le statut EN_ATTENTE via
+`planifier_ticket`, puis le worker (`python manage.py pdf_worker`) rend le PDF
+et passe le ticket à PRET. Aucun rendu ReportLab n'a lieu pendant la requête.
+
+Les billets de réservation sont planifiés « à la demande » (`differe=True`) : le
+ticket conserve ses données de rendu et le PDF n'est construit qu'au premier
+téléchargement (`materialiser_ticket`) ; les premiers appels simultanés
+n'entraînent qu'un seul rendu.
+
+Un paiement n'a qu'un seul document : son reçu, rendu une fois, sert à la fois de
+Ticket et de Facture (`assurer_recu`, appelé après commit pour tout paiement PAYE).
+"""
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import (
+    Ticket, TacheDocument, Facture, Paiement, Reservation, Seance,
+    AbonnementClient, AbonnementClientPresentiel
+)
+from .utils import generer_facture_pdf
+
+# Modèles acceptés comme source d'un rendu de ticket
+SOURCES = {
+    'Paiement': Paiement,
+    'Reservation': Reservation,
+    'Seance': Seance,
+    'AbonnementClient': AbonnementClient,
+    'AbonnementClientPresentiel': AbonnementClientPresentiel,
+}
+
+
+# Verrous du rendu à la demande, répartis par ticket : coalescent les appels d'un même processus
+_VERROUS = [threading.Lock() for _ in range(64)]
+
+
+def _max_tentatives():
+    return getattr(settings, 'PDF_JOBS_MAX_ATTEMPTS', 3)
+
+
+def _bail_rendu():
+    """Durée après laquelle un rendu à la demande interrompu peut être repris par un autre appel."""
+    return timedelta(seconds=getattr(settings, 'PDF_LAZY_LEASE_SECONDS', 60))
+
+
+def planifier_ticket(paiement, source, type_ticket, differe=False):
+    """
+    Crée le ticket du paiement en attente de rendu et la tâche associée.
+    source : objet dont le contenu est imprimé sur le ticket (Reservation, Seance, AbonnementClient, ...)
+    differe : aucune tâche n'est créée, le PDF sera rendu au premier téléchargement (statut A_LA_DEMANDE).
+    Retourne le Ticket (statut EN_ATTENTE ou A_LA_DEMANDE, sans fichier).
+    """
+    nom_modele = type(source).__name__
+    if nom_modele not in SOURCES:
+        raise ValueError(f"Source de ticket non prise en charge: {nom_modele}")
+    statut = 'A_LA_DEMANDE' if differe else 'EN_ATTENTE'
+    # Un seul ticket par paiement : un reçu déjà planifié (voir assurer_recu) est repris
+    ticket = Ticket.objects.filter(paiement=paiement).first()
+    if ticket is None:
+        ticket = Ticket.objects.create(
+            paiement=paiement, type_ticket=type_ticket, statut=statut,
+            source_modele=nom_modele, source_id=source.pk
+        )
+    else:
+        ticket.type_ticket, ticket.statut, ticket.fichier_pdf = type_ticket, statut, ''
+        ticket.source_modele, ticket.source_id, ticket.rendu_demande_le = nom_modele, source.pk, None
+        ticket.save(update_fields=['type_ticket', 'statut', 'fichier_pdf', 'source_modele', 'source_id',
+                                   'rendu_demande_le'])
+    if differe:
+        TacheDocument.objects.filter(ticket=ticket, statut='EN_ATTENTE').delete()
+        return ticket
+    # ... avec une seule tâche en attente : la dernière source demandée l'emporte
+    if not TacheDocument.objects.filter(ticket=ticket, statut='EN_ATTENTE').update(
+            source_modele=nom_modele, source_id=source.pk):
+        TacheDocument.objects.create(
+            ticket=ticket,
+            source_modele=nom_modele,
+            source_id=source.pk
+        )
+    return ticket
+
+
+def assurer_recu(paiement):
+    """
+    Garantit le document unique d'un paiement PAYE : planifie son ticket s'il n'en a
+    pas encore, et crée sa Facture adossée au même fichier. Idempotent.
+    """
+    ticket = Ticket.objects.filter(paiement=paiement).first()
+    if ticket is None:
+        type_ticket = 'ABONNEMENT' if paiement.abonnement_id else 'SEANCE'
+        ticket = planifier_ticket(paiement, paiement, type_ticket=type_ticket)
+    if not Facture.objects.filter(paiement=paiement).exists():
+        Facture.objects.create(
+            paiement=paiement,
+            fichier_pdf=ticket.fichier_pdf.name if ticket.est_pret else '',
+            seance_id=paiement.seance_id,
+            reservation_id=paiement.reservation_id,
+        )
+
+
+def _rendre(ticket, source_modele, source_id):
+    """Rend le PDF du ticket à partir de sa source et le passe à PRET."""
+    source = SOURCES[source_modele].objects.get(pk=source_id)
+    ticket.fichier_pdf = generer_facture_pdf(source, ticket.paiement, type_ticket=ticket.type_ticket)
+    ticket.statut = 'PRET'
+    ticket.rendu_demande_le = None
+    ticket.save(update_fields=['fichier_pdf', 'statut', 'rendu_demande_le'])
+    # La facture du paiement pointe sur le même fichier
+    Facture.objects.filter(paiement_id=ticket.paiement_id).update(fichier_pdf=ticket.fichier_pdf.name)
+
+
+def executer_tache(tache):
+    """Rend le PDF d'une tâche déjà réservée (statut EN_COURS) et met à jour le ticket."""
+    ticket = tache.ticket
+    try:
+        _rendre(ticket, tache.source_modele, tache.source_id)
+        tache.statut = 'TERMINEE'
+        tache.erreur = ''
+    except Exception as e:
+        tache.erreur = f"{type(e).__name__}: {e}"
+        # Source disparue : inutile de réessayer
+        definitif = isinstance(e, ObjectDoesNotExist)
+        if definitif or tache.tentatives >= _max_tentatives():
+            tache.statut = 'ECHEC'
+            Ticket.objects.filter(pk=ticket.pk).update(statut='ECHEC')
+        else:
+            tache.statut = 'EN_ATTENTE'
+    tache.date_traitement = timezone.now()
+    tache.save(update_fields=['statut', 'erreur', 'date_traitement'])
+    return tache.statut == 'TERMINEE'
+
+
+def materialiser_ticket(ticket, attente=30):
+    """
+    Rend à la demande le PDF d'un ticket A_LA_DEMANDE et retourne le ticket à jour.
+
+    Un seul appel gagne le rendu (UPDATE conditionnel qui pose un bail) ; les autres
+    attendent son résultat au plus `attente` secondes. Un bail expiré (rendu interrompu)
+    peut être repris. Les tickets PRET ou confiés au worker sont retournés tels quels.
+    """
+    if ticket.statut != 'A_LA_DEMANDE':
+        return ticket
+    with _VERROUS[ticket.pk % len(_VERROUS)]:
+        maintenant = timezone.now()
+        gagne = Ticket.objects.filter(
+            Q(statut='A_LA_DEMANDE') | Q(statut='EN_ATTENTE', rendu_demande_le__lt=maintenant - _bail_rendu()),
+            pk=ticket.pk,
+            source_id__isnull=False,
+        ).update(statut='EN_ATTENTE', rendu_demande_le=maintenant) == 1
+        if gagne:
+            ticket.refresh_from_db()
+            try:
+                _rendre(ticket, ticket.source_modele, ticket.source_id)
+            except ObjectDoesNotExist:
+                # Source disparue : le ticket ne pourra jamais être rendu
+                Ticket.objects.filter(pk=ticket.pk).update(statut='ECHEC', rendu_demande_le=None)
+                ticket.statut = 'ECHEC'
+            except Exception:
+                # Échec passager : un prochain téléchargement retentera le rendu
+                Ticket.objects.filter(pk=ticket.pk).update(statut='A_LA_DEMANDE', rendu_demande_le=None)
+                raise
+            return ticket
+
+    # Rendu en cours dans une autre requête (ou un autre processus) : on attend son résultat
+    limite = time.monotonic() + attente
+    ticket.refresh_from_db()
+    while ticket.statut == 'EN_ATTENTE' and ticket.rendu_demande_le and time.monotonic() < limite:
+        time.sleep(0.05)
+        ticket.refresh_from_db()
+    return ticket
+
+
+def reserver_tache(tache_id):
+    """Passe une tâche EN_ATTENTE à EN_COURS ; un seul worker peut gagner la réservation."""
+    return TacheDocument.objects.filter(pk=tache_id, statut='EN_ATTENTE').update(
+        statut='EN_COURS',
+        tentatives=F('tentatives') + 1,
+        date_traitement=timezone.now()
+    ) == 1
+
+
+def liberer_taches_bloquees(delai=timedelta(minutes=10)):
+    """Remet en file les tâches restées EN_COURS après l'arrêt brutal d'un worker."""
+    return TacheDocument.objects.filter(
+        statut='EN_COURS',
+        date_traitement__lt=timezone.now() - delai
+    ).update(statut='EN_ATTENTE')
+
+
+def traiter_taches(limite=50):
+    """
+    Traite au plus `limite` tâches en attente, les plus anciennes d'abord.
+    Retourne (nombre traité, nombre en échec).
+    """
+    ids = list(
+        TacheDocument.objects.filter(statut='EN_ATTENTE')
+        .order_by('date_creation', 'id')
+        .values_list('id', flat=True)[:limite]
+    )
+    traitees, echecs = 0, 0
+    for tache_id in ids:
+        if not reserver_tache(tache_id):
+            continue  # déjà prise par un autre worker
+        tache = TacheDocument.objects.select_related('ticket__paiement').get(pk=tache_id)
+        if executer_tache(tache):
+            traitees += 1
+        else:
+            echecs += 1
+    return traitees, echecs
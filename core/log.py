@@ -0,0 +1,57 @@
+"""
+Journalisation structurée de l'application.
+
+- `JsonFormatter` : une ligne JSON par événement, avec les champs passés via `extra=`.
+- `DebugSamplingFilter` : ne conserve qu'une fraction (LOG_DEBUG_SAMPLE_RATE) des
+  événements DEBUG, pour pouvoir activer les points de diagnostic en production.
+- `niveaux_par_module` : lit les niveaux par module depuis une chaîne
+  "core.views=DEBUG,core.perf=WARNING" (variable d'environnement LOG_LEVELS).
+
+Les points de diagnostic utilisent `logger.debug("...", arg)` : tant que le niveau DEBUG
+n'est pas activé pour le module, ni le message ni ses arguments ne sont formatés.
+"""
+import json
+import logging
+import random
+
+# Attributs standards d'un LogRecord, exclus des champs "extra"
+_ATTRIBUTS_STANDARDS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        evenement = {
+            'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for cle, valeur in vars(record).items():
+            if cle not in _ATTRIBUTS_STANDARDS and not cle.startswith('_'):
+                evenement[cle] = valeur
+        if record.exc_info:
+            evenement['exception'] = self.formatException(record.exc_info)
+        return json.dumps(evenement, default=str, ensure_ascii=False)
+
+
+class DebugSamplingFilter(logging.Filter):
+    """Laisse passer tous les événements INFO et plus, et une fraction `rate` des événements DEBUG."""
+
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.rate = float(rate)
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.rate >= 1:
+            return True
+        return random.random() < self.rate
+
+
+def niveaux_par_module(valeur, niveau_defaut='INFO'):
+    """Convertit "core.views=DEBUG,core.perf=WARNING" en configuration `loggers` pour dictConfig."""
+    loggers = {'core': {'level': niveau_defaut}}
+    for element in filter(None, (e.strip() for e in (valeur or '').split(','))):
+        nom, _, niveau = element.partition('=')
+        if nom and niveau:
+            loggers[nom.strip()] = {'level': niveau.strip().upper()}
+    return loggers
@@ -0,0 +1,58 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+
+from core.models import Reservation, User
+
+
+class Command(BaseCommand):
+    help = 'Rattache les réservations existantes à leur client (champ client) à partir de nom_client'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Nombre de réservations traitées par lot')
+        parser.add_argument('--dry-run', action='store_true', help='Afficher le résultat sans rien modifier')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        dry_run = options['dry_run']
+
+        # nom_client a toujours été construit comme "prenom nom"
+        clients_par_nom = defaultdict(list)
+        for user_id, prenom, nom in User.objects.filter(role='CLIENT').values_list('id', 'prenom', 'nom').iterator():
+            clients_par_nom[f"{prenom} {nom}"].append(user_id)
+
+        rattachees, ambigues, inconnues = 0, 0, 0
+        dernier_id = 0
+        while True:
+            lot = list(
+                Reservation.objects.filter(client__isnull=True, pk__gt=dernier_id)
+                .order_by('pk')
+                .values_list('pk', 'nom_client')[:chunk_size]
+            )
+            if not lot:
+                break
+            dernier_id = lot[-1][0]
+
+            par_client = defaultdict(list)
+            for reservation_id, nom_client in lot:
+                candidats = clients_par_nom.get(nom_client, [])
+                if len(candidats) == 1:
+                    par_client[candidats[0]].append(reservation_id)
+                elif candidats:
+                    ambigues += 1
+                else:
+                    inconnues += 1
+
+            for client_id, ids in par_client.items():
+                if not dry_run:
+                    Reservation.objects.filter(pk__in=ids, client__isnull=True).update(client_id=client_id)
+                rattachees += len(ids)
+
+        prefixe = '[dry-run] ' if dry_run else ''
+        self.stdout.write(self.style.SUCCESS(f'{prefixe}{rattachees} réservation(s) rattachée(s) à leur client.'))
+        if ambigues:
+            self.stdout.write(self.style.WARNING(
+                f'{ambigues} réservation(s) ignorée(s) : plusieurs clients portent le même nom.'
+            ))
+        if inconnues:
+            self.stdout.write(self.style.WARNING(f'{inconnues} réservation(s) sans client correspondant.'))
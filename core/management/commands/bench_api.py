@@ -0,0 +1,56 @@
+import json
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from core.bench import SCENARIOS, executer, peupler
+
+
+class Command(BaseCommand):
+    help = "Mesure latence, requêtes SQL et rendu PDF des endpoints critiques sur une base jetable"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=10000, help='Nombre de clients créés')
+        parser.add_argument('--paiements', type=int, default=100000, help='Nombre de paiements créés')
+        parser.add_argument('--repetitions', type=int, default=20, help='Appels par scénario')
+        parser.add_argument('--scenario', action='append', dest='scenarios',
+                            help=f"Scénario à exécuter (répétable) : {', '.join(s[0] for s in SCENARIOS)}, pdf_worker")
+        parser.add_argument('--output', default='bench_results.json', help='Fichier de résultats JSON')
+        parser.add_argument('--strict', action='store_true',
+                            help='Échouer si un scénario dépasse son budget de requêtes SQL')
+
+    def handle(self, *args, **options):
+        # Base de test créée puis détruite : les données réelles ne sont jamais touchées (ni lues via la
+        # copie de reporting, désactivée)
+        setup_test_environment()
+        ancien_nom = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media, REPORTING_DATABASE=None):
+                self.stdout.write(f"Peuplement : {options['clients']} clients, {options['paiements']} paiements...")
+                comptes = peupler(clients=options['clients'], paiements=options['paiements'])
+                resultats = executer(comptes, repetitions=options['repetitions'], scenarios=options['scenarios'])
+        finally:
+            connection.creation.destroy_test_db(ancien_nom, verbosity=0)
+            teardown_test_environment()
+
+        with open(options['output'], 'w') as fichier:
+            json.dump({
+                'clients': options['clients'],
+                'paiements': options['paiements'],
+                'repetitions': options['repetitions'],
+                'results': resultats,
+            }, fichier, indent=2)
+
+        for r in resultats:
+            ligne = (f"{r['scenario']:<30} p50={r['p50_ms']:>8.1f}ms p95={r['p95_ms']:>8.1f}ms "
+                     f"queries={r['queries']:>3}/{r['query_budget']} pdf={r['pdf_ms']:.1f}ms")
+            if r['peak_kb'] is not None:
+                ligne += f" mem={r['peak_kb']:.0f}KiB"
+            self.stdout.write(self.style.ERROR(ligne) if r['over_budget'] else ligne)
+        self.stdout.write(self.style.SUCCESS(f"Résultats écrits dans {options['output']}"))
+
+        hors_budget = [r['scenario'] for r in resultats if r['over_budget']]
+        if hors_budget and options['strict']:
+            raise CommandError(f"Budget de requêtes dépassé : {', '.join(hors_budget)}")
@@ -0,0 +1,31 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from core.bench_sqlite import mesurer, profils
+
+
+class Command(BaseCommand):
+    help = "Mesure le débit d'écriture SQLite avec N workers concurrents, avant/après les réglages de production"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--travailleurs', type=int, nargs='+', default=[1, 4, 8],
+                            help='Nombres de processus concurrents à mesurer')
+        parser.add_argument('--transactions', type=int, default=200, help='Transactions par processus')
+        parser.add_argument('--output', help='Fichier de résultats JSON')
+
+    def handle(self, *args, **options):
+        resultats = []
+        for travailleurs in options['travailleurs']:
+            for profil in profils():
+                r = mesurer(profil, travailleurs=travailleurs, transactions=options['transactions'])
+                resultats.append(r)
+                ligne = (f"{r['profil']:<11} workers={r['travailleurs']:>3} débit={r['debit_tps']:>8.1f} tx/s "
+                         f"p50={r['p50_ms'] or 0:>7.2f}ms p95={r['p95_ms'] or 0:>8.2f}ms "
+                         f"erreurs={r['erreurs']}/{r['transactions']}")
+                self.stdout.write(self.style.ERROR(ligne) if r['erreurs'] else ligne)
+
+        if options['output']:
+            with open(options['output'], 'w') as fichier:
+                json.dump(resultats, fichier, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Résultats écrits dans {options['output']}"))
@@ -0,0 +1,31 @@
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.expiration import expirer_abonnements
+
+
+class Command(BaseCommand):
+    help = 'Expire les abonnements (présentiels et clients) dont la date de fin est dépassée'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lot', type=int, default=1000, help='Nombre d\'abonnements modifiés par UPDATE')
+        parser.add_argument('--date', help='Date de référence YYYY-MM-DD (défaut : aujourd\'hui)')
+        parser.add_argument('--intervalle', type=float,
+                            help='Relancer le balayage toutes les N secondes au lieu de quitter')
+
+    def handle(self, *args, **options):
+        try:
+            date_reference = datetime.strptime(options['date'], '%Y-%m-%d').date() if options['date'] else None
+        except ValueError:
+            raise CommandError('--date doit être au format YYYY-MM-DD')
+
+        while True:
+            resultat = expirer_abonnements(date_reference, taille_lot=options['lot'])
+            for modele, nombre in resultat.items():
+                if nombre:
+                    self.stdout.write(f'{modele} : {nombre} abonnement(s) expiré(s).')
+            if not options['intervalle']:
+                break
+            time.sleep(options['intervalle'])
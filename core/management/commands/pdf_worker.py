@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.jobs import traiter_taches, liberer_taches_bloquees
+
+
+class Command(BaseCommand):
+    help = 'Génère en tâche de fond les tickets PDF en attente'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Vider la file puis quitter')
+        parser.add_argument('--batch', type=int, default=50, help='Nombre de tâches traitées par passage')
+        parser.add_argument('--sleep', type=float, default=1.0, help='Pause (secondes) quand la file est vide')
+
+    def handle(self, *args, **options):
+        liberees = liberer_taches_bloquees()
+        if liberees:
+            self.stdout.write(self.style.WARNING(f'{liberees} tâche(s) bloquée(s) remise(s) en file.'))
+
+        while True:
+            traitees, echecs = traiter_taches(limite=options['batch'])
+            if traitees or echecs:
+                self.stdout.write(f'{traitees} ticket(s) généré(s), {echecs} échec(s).')
+            if not traitees and not echecs:
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
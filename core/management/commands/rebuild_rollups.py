@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.reporting import reconstruire_agregats
+
+
+class Command(BaseCommand):
+    help = 'Recalcule entièrement les agrégats journaliers du rapport financier'
+
+    def handle(self, *args, **options):
+        nombre = reconstruire_agregats()
+        self.stdout.write(self.style.SUCCESS(f'{nombre} ligne(s) d\'agrégat recalculée(s).'))
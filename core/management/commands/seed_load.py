@@ -0,0 +1,62 @@
+from datetime import datetime
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.jobs import traiter_taches
+from core.models import User
+from core.seed import generer
+
+
+class Command(BaseCommand):
+    help = "Génère un jeu de données synthétique volumineux pour les essais de charge (déterministe pour une graine)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=1000, help='Nombre de clients')
+        parser.add_argument('--employes', type=int, default=10, help="Nombre d'employés (comptes EMPLOYE)")
+        parser.add_argument('--personnel', type=int, default=20, help='Nombre de membres du personnel')
+        parser.add_argument('--paiements', type=int, default=10000, help='Nombre de paiements')
+        parser.add_argument('--seances', type=int, help='Nombre de séances (défaut : paiements / 10)')
+        parser.add_argument('--reservations', type=int, help='Nombre de réservations (défaut : paiements / 2)')
+        parser.add_argument('--presentiels', type=int, help='Abonnements présentiels (défaut : clients / 10)')
+        parser.add_argument('--charges', type=int, help='Nombre de charges (défaut : 2 par jour)')
+        parser.add_argument('--jours', type=int, default=365, help="Profondeur de l'historique en jours")
+        parser.add_argument('--jours-presences', type=int, default=90, help='Jours de présences du personnel')
+        parser.add_argument('--graine', type=int, default=42, help='Graine du générateur aléatoire')
+        parser.add_argument('--date', help="Date de référence YYYY-MM-DD des données générées (défaut : aujourd'hui)")
+        parser.add_argument('--lot', type=int, default=2000, help='Lignes par bulk_create')
+        parser.add_argument('--domaine', default='load.local', help='Domaine des adresses e-mail créées')
+        parser.add_argument('--pdf', action='store_true',
+                            help='Rendre les tickets PDF (par défaut : rendus au premier téléchargement)')
+
+    def handle(self, *args, **options):
+        try:
+            date_reference = datetime.strptime(options['date'], '%Y-%m-%d').date() if options['date'] else None
+        except ValueError:
+            raise CommandError('--date doit être au format YYYY-MM-DD')
+        if User.objects.filter(email__endswith=f"@{options['domaine']}").exists():
+            raise CommandError(f"Des comptes @{options['domaine']} existent déjà : utilisez un autre --domaine")
+
+        debut = perf_counter()
+        # Une seule transaction : pas de jeu de données à moitié créé en cas d'erreur
+        with transaction.atomic():
+            comptes = generer(
+                clients=options['clients'], employes=options['employes'], personnel=options['personnel'],
+                paiements=options['paiements'], seances=options['seances'],
+                reservations=options['reservations'], presentiels=options['presentiels'],
+                charges=options['charges'], jours=options['jours'], jours_presences=options['jours_presences'],
+                graine=options['graine'], pdf=options['pdf'], domaine=options['domaine'],
+                date_reference=date_reference, taille_lot=options['lot'], journal=self.stdout.write,
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"{sum(comptes.values())} lignes créées en {perf_counter() - debut:.1f}s."))
+
+        if options['pdf']:
+            total = 0
+            while True:
+                traitees, echecs = traiter_taches(limite=50)
+                total += traitees
+                if not traitees and not echecs:
+                    break
+            self.stdout.write(f'{total} ticket(s) PDF rendu(s).')
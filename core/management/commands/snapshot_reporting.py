@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.routers import copier_instantane
+
+
+class Command(BaseCommand):
+    help = 'Copie la base principale dans la base de reporting (REPORTING_DATABASE)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--intervalle', type=float,
+                            help='Recopier toutes les N secondes au lieu de quitter')
+
+    def handle(self, *args, **options):
+        while True:
+            debut = time.perf_counter()
+            try:
+                chemin = copier_instantane()
+            except ValueError as e:
+                raise CommandError(str(e))
+            self.stdout.write(f'Copie de reporting écrite dans {chemin} ({time.perf_counter() - debut:.2f}s).')
+            if not options['intervalle']:
+                break
+            time.sleep(options['intervalle'])
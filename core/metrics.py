@@ -0,0 +1,77 @@
+"""
+Compteurs de supervision (cache des PDF, ...).
+
+Les valeurs sont stockées en base (CompteurMetrique) pour additionner les
+processus web et le worker PDF ; elles sont exposées aux administrateurs par
+l'endpoint `/metrics/`.
+
+`incrementer` ne fait qu'ajouter au compteur du processus : les totaux sont écrits
+en base au plus toutes les METRICS_FLUSH_SECONDS (et à la lecture de `valeurs`,
+à l'arrêt du processus), pour ne pas prendre le verrou d'écriture SQLite à chaque
+rendu de PDF.
+"""
+import atexit
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, transaction
+from django.db.models import F
+
+from .models import CompteurMetrique
+
+_verrou = threading.Lock()
+_en_attente = Counter()
+_dernier_envoi = time.monotonic()
+
+
+def _intervalle():
+    return getattr(settings, 'METRICS_FLUSH_SECONDS', 10)
+
+
+def incrementer(nom, n=1):
+    with _verrou:
+        _en_attente[nom] += n
+        echu = time.monotonic() - _dernier_envoi >= _intervalle()
+    if echu:
+        vider()
+
+
+def _ajouter(nom, n):
+    compteurs = CompteurMetrique.objects.filter(nom=nom)
+    if compteurs.update(valeur=F('valeur') + n):
+        return
+    try:
+        with transaction.atomic():
+            CompteurMetrique.objects.create(nom=nom, valeur=n)
+    except IntegrityError:
+        # Compteur créé entre-temps par un autre processus
+        compteurs.update(valeur=F('valeur') + n)
+
+
+def vider():
+    """Écrit en base les compteurs accumulés par ce processus."""
+    global _dernier_envoi
+    with _verrou:
+        lot = dict(_en_attente)
+        _en_attente.clear()
+        _dernier_envoi = time.monotonic()
+    if not lot:
+        return
+    try:
+        with transaction.atomic():
+            for nom, n in lot.items():
+                _ajouter(nom, n)
+    except DatabaseError:
+        # Base occupée ou indisponible : nouvel essai au prochain envoi
+        with _verrou:
+            _en_attente.update(lot)
+
+
+def valeurs():
+    vider()
+    return dict(CompteurMetrique.objects.order_by('nom').values_list('nom', 'valeur'))
+
+
+atexit.register(vider)
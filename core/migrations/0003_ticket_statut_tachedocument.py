@@ -0,0 +1,41 @@
+# Generated by Django 5.1.8 on 2026-10-18 01:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_reservation_montant_paye_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='statut',
+            field=models.CharField(choices=[('EN_ATTENTE', 'En attente'), ('PRET', 'Prêt'), ('ECHEC', 'Échec')], default='PRET', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='ticket',
+            name='fichier_pdf',
+            field=models.FileField(blank=True, upload_to='tickets/'),
+        ),
+        migrations.CreateModel(
+            name='TacheDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_modele', models.CharField(max_length=50)),
+                ('source_id', models.PositiveBigIntegerField()),
+                ('statut', models.CharField(choices=[('EN_ATTENTE', 'En attente'), ('EN_COURS', 'En cours'), ('TERMINEE', 'Terminée'), ('ECHEC', 'Échec')], default='EN_ATTENTE', max_length=20)),
+                ('tentatives', models.PositiveSmallIntegerField(default=0)),
+                ('erreur', models.TextField(blank=True)),
+                ('date_creation', models.DateTimeField(auto_now_add=True)),
+                ('date_traitement', models.DateTimeField(blank=True, null=True)),
+                ('ticket', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='taches', to='core.ticket')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['statut', 'date_creation'], name='tache_statut_date_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.1.8 on 2026-10-18 01:57
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def construire_agregats(apps, schema_editor):
+    # Copie figée de core.reporting.reconstruire_agregats (modèles historiques uniquement)
+    Agregat = apps.get_model('core', 'AgregatFinancier')
+    Paiement = apps.get_model('core', 'Paiement')
+    Charge = apps.get_model('core', 'Charge')
+
+    payes = Paiement.objects.filter(status='PAYE').annotate(jour=TruncDate('date_paiement')).order_by()
+    lignes = []
+    for row in payes.values('jour').annotate(montant=Sum('montant'), nombre=Count('id')):
+        lignes.append(Agregat(date=row['jour'], dimension='REVENU', cle='',
+                              montant=row['montant'], nombre=row['nombre']))
+    for row in payes.values('jour', 'mode_paiement').annotate(montant=Sum('montant'), nombre=Count('id')):
+        lignes.append(Agregat(date=row['jour'], dimension='MODE_PAIEMENT', cle=row['mode_paiement'],
+                              montant=row['montant'], nombre=row['nombre']))
+    for row in payes.filter(abonnement__isnull=False).values('jour', 'abonnement').annotate(
+            montant=Sum('montant'), nombre=Count('id')):
+        lignes.append(Agregat(date=row['jour'], dimension='ABONNEMENT', cle=str(row['abonnement']),
+                              montant=row['montant'], nombre=row['nombre']))
+    for row in payes.filter(seance__isnull=False).values('jour').annotate(
+            montant=Sum('montant'), nombre=Count('id'), heures=Sum('seance__nombre_heures')):
+        lignes.append(Agregat(date=row['jour'], dimension='SEANCE', cle='',
+                              montant=row['montant'], nombre=row['nombre'], heures=row['heures'] or 0))
+    for row in Charge.objects.order_by().values('date').annotate(montant=Sum('montant'), nombre=Count('id')):
+        lignes.append(Agregat(date=row['date'], dimension='CHARGE', cle='',
+                              montant=row['montant'], nombre=row['nombre']))
+    Agregat.objects.bulk_create(lignes, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_ticket_statut_tachedocument'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AgregatFinancier',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('dimension', models.CharField(choices=[('REVENU', 'Revenus'), ('MODE_PAIEMENT', 'Revenus par mode de paiement'), ('ABONNEMENT', 'Revenus par abonnement'), ('SEANCE', 'Séances'), ('CHARGE', 'Charges')], max_length=20)),
+                ('cle', models.CharField(blank=True, default='', max_length=50)),
+                ('montant', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('nombre', models.IntegerField(default=0)),
+                ('heures', models.IntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['dimension', 'date'], name='agregat_dimension_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('date', 'dimension', 'cle'), name='agregat_unique_jour_dimension')],
+            },
+        ),
+        migrations.RunPython(construire_agregats, migrations.RunPython.noop),
+    ]
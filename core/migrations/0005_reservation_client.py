@@ -0,0 +1,24 @@
+# Generated by Django 5.1.8 on 2026-10-18 01:58
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_agregatfinancier'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reservation',
+            name='client',
+            field=models.ForeignKey(blank=True, limit_choices_to={'role': 'CLIENT'}, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reservations', to=settings.AUTH_USER_MODEL, verbose_name='Client'),
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['client', 'statut', 'created_at'], name='reservation_client_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.8 on 2026-10-18 02:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_reservation_client'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='paiement',
+            index=models.Index(fields=['date_paiement', 'id'], name='paiement_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paiementtranche',
+            index=models.Index(fields=['date_paiement', 'id'], name='tranche_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='presencepersonnel',
+            index=models.Index(fields=['date_jour', 'id'], name='presence_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['created_at', 'id'], name='reservation_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['date_generation', 'id'], name='ticket_date_id_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.8 on 2026-10-18 02:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompteurMetrique',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nom', models.CharField(max_length=100, unique=True)),
+                ('valeur', models.BigIntegerField(default=0)),
+                ('date_maj', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
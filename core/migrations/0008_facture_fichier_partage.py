@@ -0,0 +1,18 @@
+# Generated by Django 5.1.8 on 2026-10-18 02:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_compteurmetrique'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='facture',
+            name='fichier_pdf',
+            field=models.FileField(blank=True, upload_to='factures/'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.8 on 2026-10-18 02:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_facture_fichier_partage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='rendu_demande_le',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='source_id',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='source_modele',
+            field=models.CharField(blank=True, max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='ticket',
+            name='statut',
+            field=models.CharField(choices=[('A_LA_DEMANDE', 'À la demande'), ('EN_ATTENTE', 'En attente'), ('PRET', 'Prêt'), ('ECHEC', 'Échec')], default='PRET', max_length=20),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.1.8 on 2026-10-18 02:25
+
+import django.db.models.deletion
+import re
+
+from django.db import migrations, models
+
+
+def rattacher_abonnements(apps, schema_editor):
+    """Réservations d'abonnement existantes : abonnement déduit une fois de la description ou du montant."""
+    Abonnement = apps.get_model('core', 'Abonnement')
+    Reservation = apps.get_model('core', 'Reservation')
+    catalogue = list(Abonnement.objects.order_by('id'))
+    reservations = Reservation.objects.filter(type_reservation='ABONNEMENT', abonnement__isnull=True)
+    for reservation in reservations.iterator():
+        abonnement = None
+        correspondance = re.search(r'Abonnement\s+([\w\- ]+)', reservation.description or '')
+        if correspondance:
+            nom = correspondance.group(1).strip().lower()
+            abonnement = next((a for a in catalogue if nom in a.nom.lower()), None)
+        elif reservation.montant:
+            montant = float(reservation.montant)
+            abonnement = next((a for a in catalogue if montant * 0.9 <= float(a.prix) <= montant * 1.1), None)
+        if abonnement:
+            Reservation.objects.filter(pk=reservation.pk).update(abonnement=abonnement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_ticket_a_la_demande'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reservation',
+            name='abonnement',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reservations', to='core.abonnement', verbose_name='Abonnement'),
+        ),
+        migrations.RunPython(rattacher_abonnements, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.1.8 on 2026-10-18 02:30
+
+import logging
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+logger = logging.getLogger('core.migrations')
+
+
+def dedoublonner_presences(apps, schema_editor):
+    """
+    Avant les contraintes d'unicité : garde la saisie la plus récente de chaque personne pour un jour.
+    Chaque ligne supprimée est journalisée (logger core.migrations) avec son contenu, pour pouvoir la ressaisir.
+    """
+    PresencePersonnel = apps.get_model('core', 'PresencePersonnel')
+    for champ in ('personnel', 'employe'):
+        doublons = (
+            PresencePersonnel.objects.filter(**{f'{champ}__isnull': False})
+            .values(champ, 'date_jour')
+            .annotate(nombre=Count('id'), dernier=Max('id'))
+            .filter(nombre__gt=1)
+        )
+        for doublon in doublons.iterator():
+            supprimees = PresencePersonnel.objects.filter(
+                **{champ: doublon[champ], 'date_jour': doublon['date_jour']}
+            ).exclude(id=doublon['dernier'])
+            for presence in supprimees.values('id', 'statut', 'heure_arrivee'):
+                logger.warning(
+                    "Présence en double supprimée : id=%s %s=%s date_jour=%s statut=%s heure_arrivee=%s (conservée : id=%s)",
+                    presence['id'], champ, doublon[champ], doublon['date_jour'], presence['statut'],
+                    presence['heure_arrivee'], doublon['dernier'],
+                )
+            supprimees.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_reservation_abonnement'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedoublonner_presences, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='presencepersonnel',
+            constraint=models.UniqueConstraint(fields=('personnel', 'date_jour'), name='presence_personnel_jour_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='presencepersonnel',
+            constraint=models.UniqueConstraint(fields=('employe', 'date_jour'), name='presence_employe_jour_uniq'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.8 on 2026-10-18 02:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_presence_unique_jour'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='presencepersonnel',
+            index=models.Index(fields=['date_jour', 'personnel'], name='presence_jour_personnel_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.8 on 2026-10-18 02:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_presence_jour_personnel_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExpirationAbonnement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_execution', models.DateTimeField(auto_now_add=True)),
+                ('modele', models.CharField(max_length=50)),
+                ('nombre', models.PositiveIntegerField()),
+                ('identifiants', models.JSONField(default=list)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='abonnementclient',
+            index=models.Index(fields=['actif', 'date_fin'], name='abonnement_client_expir_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='abonnementclientpresentiel',
+            index=models.Index(fields=['statut', 'date_fin'], name='presentiel_expiration_idx'),
+        ),
+    ]
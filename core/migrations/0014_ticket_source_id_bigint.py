@@ -0,0 +1,18 @@
+# Generated by Django 5.1.8 on 2026-10-18 03:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_expiration_abonnements'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ticket',
+            name='source_id',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -1,5 +1,7 @@
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin, BaseUserManager
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models import Case, F, Q, Value, When
 from django.utils import timezone
 from django.conf import settings
 import uuid
@@ -45,6 +47,14 @@ class User(AbstractBaseUser, PermissionsMixin):
     def __str__(self):
         return f"{self.prenom} {self.nom} ({self.role})"
 
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        # Utilisateur construit depuis le jeton (core.authentication) : le premier champ
+        # différé lu charge tout le profil en une requête, pas un champ à la fois
+        differes = self.get_deferred_fields()
+        if getattr(self, '_depuis_jeton', False) and fields is not None and set(fields) <= differes:
+            fields = list(differes)
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+
 
 class Abonnement(models.Model):
     nom = models.CharField(max_length=100)
@@ -92,6 +102,32 @@ class Seance(models.Model):
         return f"{self.client_prenom} {self.client_nom} - {self.date_jour} ({self.nombre_heures}h) - {self.montant_paye} FCFA"
 
 
+class ReservationQuerySet(models.QuerySet):
+    def avec_paiements(self):
+        """
+        Précalcule en bloc ce que ReservationSerializer affiche pour chaque réservation :
+        - `total_paye` : somme des paiements PAYE (sous-requête Sum)
+        - `paiements_tries` : paiements du plus récent au plus ancien, avec leur ticket
+        Évite les 2 requêtes par réservation lors de la sérialisation d'une liste.
+        """
+        total_paye = (
+            Paiement.objects.filter(reservation=models.OuterRef('pk'), status='PAYE')
+            .order_by()
+            .values('reservation')
+            .annotate(total=models.Sum('montant'))
+            .values('total')
+        )
+        return self.annotate(
+            total_paye=models.Subquery(total_paye, output_field=models.DecimalField(max_digits=12, decimal_places=2))
+        ).prefetch_related(
+            models.Prefetch(
+                'paiement_set',
+                queryset=Paiement.objects.select_related('ticket').order_by('-date_paiement', '-id'),
+                to_attr='paiements_tries'
+            )
+        )
+
+
 class Reservation(models.Model):
     TYPE_CHOICES = [
         ('SEANCE', 'Séance'),
@@ -106,11 +142,29 @@ class Reservation(models.Model):
     ]
     
     nom_client = models.CharField(max_length=255, verbose_name='Nom du client')
+    client = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        limit_choices_to={'role': 'CLIENT'},
+        related_name='reservations',
+        verbose_name='Client'
+    )
     type_reservation = models.CharField(
         max_length=20, 
         choices=TYPE_CHOICES,
         verbose_name='Type de réservation'
     )
+    # Abonnement réservé (type ABONNEMENT), fixé à la création
+    abonnement = models.ForeignKey(
+        'Abonnement',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='reservations',
+        verbose_name='Abonnement'
+    )
     montant = models.DecimalField(
         max_digits=10, 
         decimal_places=2,
@@ -136,12 +190,18 @@ class Reservation(models.Model):
     created_at = models.DateTimeField(default=timezone.now, verbose_name='Date de création')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='Date de modification')
 
+    objects = ReservationQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.nom_client} - {self.get_type_reservation_display()} - {self.montant} FCFA"
 
     class Meta:
         verbose_name = 'Réservation'
         verbose_name_plural = 'Réservations'
+        indexes = [
+            models.Index(fields=['client', 'statut', 'created_at'], name='reservation_client_idx'),
+            models.Index(fields=['created_at', 'id'], name='reservation_date_id_idx'),
+        ]
 
 
 class Paiement(models.Model):
@@ -163,18 +223,75 @@ class Paiement(models.Model):
     def __str__(self):
         return f"{self.client} - {self.montant} FCFA - {self.status}"
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['date_paiement', 'id'], name='paiement_date_id_idx'),
+        ]
+
 
 class Ticket(models.Model):
     """Remplace Facture - maintenant utilisé comme ticket de paiement"""
+    STATUT_CHOICES = [
+        ('A_LA_DEMANDE', 'À la demande'),
+        ('EN_ATTENTE', 'En attente'),
+        ('PRET', 'Prêt'),
+        ('ECHEC', 'Échec'),
+    ]
+
     paiement = models.OneToOneField(Paiement, on_delete=models.CASCADE)
     uuid = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
     date_generation = models.DateTimeField(auto_now_add=True)
-    fichier_pdf = models.FileField(upload_to='tickets/')
+    fichier_pdf = models.FileField(upload_to='tickets/', blank=True)
     type_ticket = models.CharField(max_length=20, choices=[('ABONNEMENT', 'Abonnement'), ('SEANCE', 'Séance')])
+    # Le PDF est généré en tâche de fond (voir core.jobs) : le ticket reste EN_ATTENTE jusqu'au rendu.
+    # A_LA_DEMANDE : aucun rendu planifié, le PDF est construit au premier téléchargement.
+    statut = models.CharField(max_length=20, choices=STATUT_CHOICES, default='PRET')
+    # Données de rendu : objet imprimé sur le ticket (voir core.jobs.SOURCES)
+    source_modele = models.CharField(max_length=50, blank=True)
+    source_id = models.PositiveBigIntegerField(null=True, blank=True)
+    # Début du rendu à la demande en cours (bail : voir core.jobs.materialiser_ticket)
+    rendu_demande_le = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return f"Ticket #{self.uuid} - {self.type_ticket}"
 
+    @property
+    def est_pret(self):
+        return self.statut == 'PRET' and bool(self.fichier_pdf)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['date_generation', 'id'], name='ticket_date_id_idx'),
+        ]
+
+
+class TacheDocument(models.Model):
+    """File d'attente des PDF à générer hors du cycle requête/réponse (traitée par `manage.py pdf_worker`)"""
+    STATUT_CHOICES = [
+        ('EN_ATTENTE', 'En attente'),
+        ('EN_COURS', 'En cours'),
+        ('TERMINEE', 'Terminée'),
+        ('ECHEC', 'Échec'),
+    ]
+
+    ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE, related_name='taches')
+    # Objet à partir duquel le PDF est rendu (Reservation, Seance, AbonnementClient, ...)
+    source_modele = models.CharField(max_length=50)
+    source_id = models.PositiveBigIntegerField()
+    statut = models.CharField(max_length=20, choices=STATUT_CHOICES, default='EN_ATTENTE')
+    tentatives = models.PositiveSmallIntegerField(default=0)
+    erreur = models.TextField(blank=True)
+    date_creation = models.DateTimeField(auto_now_add=True)
+    date_traitement = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Tâche #{self.id} - Ticket {self.ticket_id} - {self.statut}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['statut', 'date_creation'], name='tache_statut_date_idx'),
+        ]
+
 
 class Charge(models.Model):
     titre = models.CharField(max_length=100)
@@ -186,6 +303,49 @@ class Charge(models.Model):
         return self.titre
 
 
+class AgregatFinancier(models.Model):
+    """
+    Agrégat journalier alimentant le rapport financier, tenu à jour de façon incrémentale
+    par les signaux de Paiement et Charge (voir core.reporting).
+    """
+    DIMENSION_CHOICES = [
+        ('REVENU', 'Revenus'),
+        ('MODE_PAIEMENT', 'Revenus par mode de paiement'),
+        ('ABONNEMENT', 'Revenus par abonnement'),
+        ('SEANCE', 'Séances'),
+        ('CHARGE', 'Charges'),
+    ]
+
+    date = models.DateField()
+    dimension = models.CharField(max_length=20, choices=DIMENSION_CHOICES)
+    # Valeur de la dimension : mode de paiement, id d'abonnement ou chaîne vide
+    cle = models.CharField(max_length=50, blank=True, default='')
+    montant = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    nombre = models.IntegerField(default=0)
+    heures = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.date} - {self.dimension} {self.cle} - {self.montant} FCFA"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'dimension', 'cle'], name='agregat_unique_jour_dimension'),
+        ]
+        indexes = [
+            models.Index(fields=['dimension', 'date'], name='agregat_dimension_date_idx'),
+        ]
+
+
+class CompteurMetrique(models.Model):
+    """Compteur partagé entre les processus web et le worker PDF (voir core.metrics)."""
+    nom = models.CharField(max_length=100, unique=True)
+    valeur = models.BigIntegerField(default=0)
+    date_maj = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.nom} = {self.valeur}"
+
+
 class PresencePersonnel(models.Model):
     personnel = models.ForeignKey(Personnel, on_delete=models.CASCADE, null=True, blank=True)
     employe = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, limit_choices_to={'role': 'EMPLOYE'})
@@ -200,6 +360,18 @@ class PresencePersonnel(models.Model):
             return f"{self.employe} - {self.date_jour} - {self.statut}"
         return f"Présence - {self.date_jour} - {self.statut}"
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['date_jour', 'id'], name='presence_date_id_idx'),
+            # Statistiques de présence par période (core.presences)
+            models.Index(fields=['date_jour', 'personnel'], name='presence_jour_personnel_idx'),
+        ]
+        # Une présence par personne et par jour (cible des upserts de PresencePersonnelViewSet.bulk)
+        constraints = [
+            models.UniqueConstraint(fields=['personnel', 'date_jour'], name='presence_personnel_jour_uniq'),
+            models.UniqueConstraint(fields=['employe', 'date_jour'], name='presence_employe_jour_uniq'),
+        ]
+
 
 class AbonnementClient(models.Model):
     client = models.ForeignKey(User, on_delete=models.CASCADE, limit_choices_to={'role': 'CLIENT'})
@@ -212,6 +384,12 @@ class AbonnementClient(models.Model):
     def __str__(self):
         return f"{self.client} - {self.abonnement} ({self.date_debut} - {self.date_fin})"
 
+    class Meta:
+        indexes = [
+            # Balayage des abonnements échus (core.expiration)
+            models.Index(fields=['actif', 'date_fin'], name='abonnement_client_expir_idx'),
+        ]
+
 
 class AbonnementClientPresentiel(models.Model):
     """Modèle pour gérer les abonnements clients en présentiel avec paiement en plusieurs tranches"""
@@ -278,6 +456,42 @@ class AbonnementClientPresentiel(models.Model):
         
         super().save(*args, **kwargs)
 
+    def crediter(self, montant):
+        """
+        Ajoute `montant` au montant payé en un seul UPDATE conditionnel (incrément F(),
+        statuts recalculés dans la même requête), sans lecture préalable : deux caisses
+        qui encaissent en même temps ne peuvent pas perdre de paiement.
+        Retourne False, sans rien modifier, si le montant total serait dépassé.
+        """
+        nouveau_montant = F('montant_paye') + montant
+        termine = Q(montant_total__lte=nouveau_montant)
+        lignes = type(self).objects.filter(
+            pk=self.pk, montant_paye__lte=F('montant_total') - montant
+        ).update(
+            montant_paye=nouveau_montant,
+            statut_paiement=Case(
+                When(termine, then=Value('PAIEMENT_TERMINE')),
+                default=Value('PAIEMENT_INACHEVE'),
+            ),
+            statut=Case(
+                When(date_fin__lt=timezone.now().date(), then=Value('EXPIRE')),
+                When(termine, then=Value('EN_COURS')),
+                default=F('statut'),
+            ),
+        )
+        if lignes:
+            from . import checkin  # import local : checkin importe les modèles
+            self.refresh_from_db(fields=['montant_paye', 'statut_paiement', 'statut'])
+            # UPDATE direct, sans post_save : le cache du contrôle d'accès est prévenu ici
+            checkin.invalider(type(self).__name__, self.pk)
+        return bool(lignes)
+
+    class Meta:
+        indexes = [
+            # Balayage des abonnements échus (core.expiration)
+            models.Index(fields=['statut', 'date_fin'], name='presentiel_expiration_idx'),
+        ]
+
 
 class HistoriquePaiement(models.Model):
     """Modèle pour tracer l'historique des paiements d'un abonnement présentiel"""
@@ -303,21 +517,42 @@ class PaiementTranche(models.Model):
         return f"Tranche {self.id} - {self.montant} FCFA - {self.date_paiement.strftime('%d/%m/%Y')}"
     
     def save(self, *args, **kwargs):
-        # Mettre à jour le montant payé de l'abonnement
-        if not self.pk:  # Nouveau paiement
-            self.abonnement_presentiel.montant_paye += self.montant
-            self.abonnement_presentiel.save()
-        super().save(*args, **kwargs)
+        if self.pk:
+            super().save(*args, **kwargs)
+            return
+        # Nouveau paiement : la tranche et l'incrément du montant payé sont enregistrés ensemble
+        with transaction.atomic():
+            if not self.abonnement_presentiel.crediter(self.montant):
+                raise ValidationError('Le montant dépasse le reste à payer de l\'abonnement.')
+            super().save(*args, **kwargs)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['date_paiement', 'id'], name='tranche_date_id_idx'),
+        ]
 
 
 class Facture(models.Model):
     paiement = models.OneToOneField('Paiement', on_delete=models.CASCADE, related_name='facture')
     uuid = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
     date_generation = models.DateTimeField(auto_now_add=True)
-    fichier_pdf = models.FileField(upload_to='factures/')
+    # Même fichier que le ticket du paiement (voir core.jobs.assurer_recu)
+    fichier_pdf = models.FileField(upload_to='factures/', blank=True)
     seance = models.ForeignKey('Seance', on_delete=models.SET_NULL, null=True, blank=True, related_name='factures')
     abonnement = models.ForeignKey('AbonnementClient', on_delete=models.SET_NULL, null=True, blank=True, related_name='factures')
     reservation = models.ForeignKey('Reservation', on_delete=models.SET_NULL, null=True, blank=True, related_name='factures')
 
     def __str__(self):
         return f"Facture #{self.uuid} - Paiement: {self.paiement.id}"
+
+
+class ExpirationAbonnement(models.Model):
+    """Journal des passages du balayage des abonnements échus (voir core.expiration) : un lot par ligne."""
+    date_execution = models.DateTimeField(auto_now_add=True)
+    modele = models.CharField(max_length=50)
+    nombre = models.PositiveIntegerField()
+    # Identifiants des abonnements expirés par ce lot
+    identifiants = models.JSONField(default=list)
+
+    def __str__(self):
+        return f"{self.date_execution:%d/%m/%Y %H:%M} - {self.modele} : {self.nombre} expiré(s)"
@@ -0,0 +1,121 @@
+"""
+Pagination par curseur (keyset) pour les listes volumineuses.
+
+Les éléments sont triés du plus récent au plus ancien sur (champ date, id) ; le curseur
+encode la position du dernier élément affiché, et la page suivante est lue avec
+`WHERE (date, id) < (d, i) ORDER BY date DESC, id DESC LIMIT n`, qui suit l'index
+(date, id). Aucun `COUNT(*)` n'est exécuté : la réponse contient `next`, `previous`
+et `results`.
+
+La vue indique le champ de tri via l'attribut `pagination_date_field`.
+"""
+import base64
+import binascii
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    page_size = 20
+    max_page_size = 100
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    date_field = 'id'
+    invalid_cursor_message = 'Curseur invalide.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.date_field = getattr(view, 'pagination_date_field', self.date_field)
+        self.taille = self.get_page_size(request)
+
+        champ = self.date_field
+        position = self.decode_cursor(request, queryset.model)
+        if position is None:
+            queryset = queryset.order_by(f'-{champ}', '-id')
+            arriere = False
+        else:
+            valeur, ident, arriere = position
+            if arriere:
+                queryset = queryset.filter(
+                    Q(**{f'{champ}__gt': valeur}) | Q(**{champ: valeur, 'id__gt': ident})
+                ).order_by(champ, 'id')
+            else:
+                queryset = queryset.filter(
+                    Q(**{f'{champ}__lt': valeur}) | Q(**{champ: valeur, 'id__lt': ident})
+                ).order_by(f'-{champ}', '-id')
+
+        resultats = list(queryset[:self.taille + 1])
+        encore = len(resultats) > self.taille
+        resultats = resultats[:self.taille]
+        if arriere:
+            resultats.reverse()
+            self.has_next, self.has_previous = True, encore
+        else:
+            self.has_next, self.has_previous = encore, position is not None
+
+        self.page = resultats
+        return resultats
+
+    def get_page_size(self, request):
+        try:
+            taille = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(taille, 1), self.max_page_size)
+
+    def decode_cursor(self, request, model):
+        encode = request.query_params.get(self.cursor_query_param)
+        if not encode:
+            return None
+        try:
+            donnees = json.loads(base64.urlsafe_b64decode(encode.encode('ascii')))
+            valeur = model._meta.get_field(self.date_field).to_python(donnees['v'])
+            return valeur, int(donnees['id']), bool(donnees.get('r'))
+        except (binascii.Error, ValueError, TypeError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, instance, arriere=False):
+        valeur = getattr(instance, self.date_field)
+        donnees = {'v': valeur.isoformat() if hasattr(valeur, 'isoformat') else valeur, 'id': instance.id}
+        if arriere:
+            donnees['r'] = 1
+        encode = base64.urlsafe_b64encode(json.dumps(donnees).encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encode)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1])
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], arriere=True)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,135 @@
+"""
+Statistiques de présence du personnel.
+
+Les comptes (présences, absences, retards) sont agrégés en base, par personne et par
+jour, sur l'index (date_jour, personnel). Un mois clos ne change plus en temps normal :
+son résultat est mis en cache (PRESENCE_CACHE_MOIS_CLOS) et invalidé à chaque écriture
+d'une présence de ce mois (voir core.signals et PresenceLotSerializer).
+
+L'invalidation passe par le cache Django : avec un cache par processus (LocMemCache,
+par défaut), les autres processus ne la voient pas et gardent leur résultat au plus
+PRESENCE_CACHE_TTL_SECONDS secondes. Un cache partagé (CACHES, Redis/Memcached)
+rend l'invalidation immédiate partout.
+"""
+from datetime import date, timedelta
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .models import PresencePersonnel
+from .routers import base_courante
+
+
+def _ttl():
+    return getattr(settings, 'PRESENCE_CACHE_TTL_SECONDS', 300)
+
+
+def _cle_version(annee, mois):
+    return f'presences:{annee:04d}-{mois:02d}:version'
+
+
+def invalider_mois(jour):
+    """Oublie le résultat en cache du mois de `jour` (date, ou chaîne YYYY-MM-DD avant enregistrement)."""
+    jour = PresencePersonnel._meta.get_field('date_jour').to_python(jour)
+    cache.set(_cle_version(jour.year, jour.month), uuid4().hex, _ttl())
+
+
+def _fin_de_mois(jour):
+    suivant = (jour.replace(day=1) + timedelta(days=32)).replace(day=1)
+    return suivant - timedelta(days=1)
+
+
+def _calculer(debut, fin, heure_limite):
+    presences = PresencePersonnel.objects.filter(date_jour__gte=debut, date_jour__lte=fin)
+    comptes = {
+        'presents': Count('id', filter=Q(statut='PRESENT')),
+        'absents': Count('id', filter=Q(statut='ABSENT')),
+        'retards': Count('id', filter=Q(statut='PRESENT', heure_arrivee__gt=heure_limite)),
+    }
+    par_personne = [
+        {
+            'personnel_id': row['personnel'],
+            'employe_id': row['employe'],
+            'nom': row['personnel__nom'] or row['employe__nom'],
+            'prenom': row['personnel__prenom'] or row['employe__prenom'],
+            'presents': row['presents'],
+            'absents': row['absents'],
+            'retards': row['retards'],
+        }
+        for row in presences.values(
+            'personnel', 'employe', 'personnel__nom', 'personnel__prenom', 'employe__nom', 'employe__prenom'
+        ).annotate(**comptes).order_by('personnel', 'employe')
+    ]
+    par_jour = [
+        {
+            'date_jour': row['date_jour'].isoformat(),
+            'presents': row['presents'],
+            'absents': row['absents'],
+            'retards': row['retards'],
+        }
+        for row in presences.values('date_jour').annotate(**comptes).order_by('date_jour')
+    ]
+    return {'par_personne': par_personne, 'par_jour': par_jour}
+
+
+def _mois_clos(annee, mois, heure_limite):
+    """Résultat d'un mois entièrement écoulé, depuis le cache s'il est à jour."""
+    debut = date(annee, mois, 1)
+    version = cache.get(_cle_version(annee, mois)) or ''
+    cle = f'presences:{annee:04d}-{mois:02d}:{heure_limite.strftime("%H%M")}:{version}'
+    resultat = cache.get(cle)
+    if resultat is None:
+        resultat = _calculer(debut, _fin_de_mois(debut), heure_limite)
+        # Calculé sur la copie de reporting : peut précéder la dernière modification du mois
+        if base_courante() in (None, DEFAULT_DB_ALIAS):
+            cache.set(cle, resultat, _ttl())
+    return resultat
+
+
+def _tranches(debut, fin):
+    """Découpe [debut, fin] en (debut, fin, mois_clos) : mois complets déjà écoulés, et le reste."""
+    debut_mois_courant = timezone.localdate().replace(day=1)
+    tranches, jour = [], debut
+    while jour <= fin:
+        fin_tranche = min(_fin_de_mois(jour), fin)
+        complet = jour.day == 1 and fin_tranche == _fin_de_mois(jour)
+        tranches.append((jour, fin_tranche, complet and fin_tranche < debut_mois_courant))
+        jour = fin_tranche + timedelta(days=1)
+    return tranches
+
+
+def statistiques_presences(debut, fin, heure_limite):
+    """
+    Présences sur [debut, fin] (bornes incluses) : comptes par personne et par jour.
+    Un retard est une présence dont l'heure d'arrivée dépasse `heure_limite`.
+    """
+    avec_cache = getattr(settings, 'PRESENCE_CACHE_MOIS_CLOS', True)
+    par_personne, par_jour = {}, []
+    for debut_tranche, fin_tranche, clos in _tranches(debut, fin):
+        if clos and avec_cache:
+            resultat = _mois_clos(debut_tranche.year, debut_tranche.month, heure_limite)
+        else:
+            resultat = _calculer(debut_tranche, fin_tranche, heure_limite)
+        for ligne in resultat['par_personne']:
+            cle = (ligne['personnel_id'], ligne['employe_id'])
+            if cle in par_personne:
+                for compte in ('presents', 'absents', 'retards'):
+                    par_personne[cle][compte] += ligne[compte]
+            else:
+                par_personne[cle] = dict(ligne)
+        par_jour.extend(resultat['par_jour'])
+
+    return {
+        'from': debut.isoformat(),
+        'to': fin.isoformat(),
+        'heure_limite': heure_limite.strftime('%H:%M'),
+        'par_personne': list(par_personne.values()),
+        'par_jour': par_jour,
+        'totaux': {
+            compte: sum(ligne[compte] for ligne in par_jour) for compte in ('presents', 'absents', 'retards')
+        },
+    }
@@ -0,0 +1,184 @@
+"""
+Agrégats financiers journaliers (table AgregatFinancier).
+
+Chaque écriture de Paiement ou de Charge applique un delta sur les lignes du jour
+concerné (voir core.signals) ; le rapport financier ne lit que cette table, quel que
+soit le volume de paiements. `python manage.py rebuild_rollups` recalcule tout.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Sum, Count, F
+from django.db.models.functions import TruncDate, TruncMonth
+from django.utils import timezone
+
+from .models import AgregatFinancier, Abonnement, Seance, Paiement, Charge
+
+
+def contributions_paiement(paiement):
+    """Lignes (date, dimension, cle) -> (montant, nombre, heures) apportées par un paiement."""
+    lignes = {}
+    if paiement.status != 'PAYE' or paiement.date_paiement is None:
+        return lignes
+    jour = timezone.localdate(paiement.date_paiement)
+    montant = Decimal(str(paiement.montant))
+    lignes[(jour, 'REVENU', '')] = (montant, 1, 0)
+    lignes[(jour, 'MODE_PAIEMENT', paiement.mode_paiement)] = (montant, 1, 0)
+    if paiement.abonnement_id:
+        lignes[(jour, 'ABONNEMENT', str(paiement.abonnement_id))] = (montant, 1, 0)
+    if paiement.seance_id:
+        heures = Seance.objects.filter(pk=paiement.seance_id).values_list('nombre_heures', flat=True).first() or 0
+        lignes[(jour, 'SEANCE', '')] = (montant, 1, heures)
+    return lignes
+
+
+def contributions_charge(charge):
+    if charge.date is None:
+        return {}
+    return {(charge.date, 'CHARGE', ''): (Decimal(str(charge.montant)), 1, 0)}
+
+
+def appliquer_delta(anciennes, nouvelles):
+    """Retire les contributions `anciennes` et ajoute les `nouvelles` dans la table d'agrégats."""
+    deltas = defaultdict(lambda: [Decimal('0'), 0, 0])
+    for signe, lignes in ((-1, anciennes), (1, nouvelles)):
+        for cle, (montant, nombre, heures) in lignes.items():
+            deltas[cle][0] += signe * montant
+            deltas[cle][1] += signe * nombre
+            deltas[cle][2] += signe * heures
+
+    for (jour, dimension, valeur), (montant, nombre, heures) in deltas.items():
+        if not montant and not nombre and not heures:
+            continue
+        _incrementer(jour, dimension, valeur, montant, nombre, heures)
+
+
+def _incrementer(jour, dimension, valeur, montant, nombre, heures):
+    lignes = AgregatFinancier.objects.filter(date=jour, dimension=dimension, cle=valeur)
+    increments = {
+        'montant': F('montant') + montant,
+        'nombre': F('nombre') + nombre,
+        'heures': F('heures') + heures,
+    }
+    if lignes.update(**increments):
+        return
+    try:
+        with transaction.atomic():
+            AgregatFinancier.objects.create(
+                date=jour, dimension=dimension, cle=valeur,
+                montant=montant, nombre=nombre, heures=heures
+            )
+    except IntegrityError:
+        # Ligne créée entre-temps par une écriture concurrente
+        lignes.update(**increments)
+
+
+def reconstruire_agregats():
+    """
+    Recalcule toute la table d'agrégats depuis Paiement et Charge.
+    Retourne le nombre de lignes créées.
+    """
+    payes = Paiement.objects.filter(status='PAYE').annotate(jour=TruncDate('date_paiement')).order_by()
+    lignes = []
+    for row in payes.values('jour').annotate(montant=Sum('montant'), nombre=Count('id')):
+        lignes.append(AgregatFinancier(date=row['jour'], dimension='REVENU', cle='',
+                                        montant=row['montant'], nombre=row['nombre']))
+    for row in payes.values('jour', 'mode_paiement').annotate(montant=Sum('montant'), nombre=Count('id')):
+        lignes.append(AgregatFinancier(date=row['jour'], dimension='MODE_PAIEMENT', cle=row['mode_paiement'],
+                                        montant=row['montant'], nombre=row['nombre']))
+    for row in payes.filter(abonnement__isnull=False).values('jour', 'abonnement').annotate(
+            montant=Sum('montant'), nombre=Count('id')):
+        lignes.append(AgregatFinancier(date=row['jour'], dimension='ABONNEMENT', cle=str(row['abonnement']),
+                                        montant=row['montant'], nombre=row['nombre']))
+    for row in payes.filter(seance__isnull=False).values('jour').annotate(
+            montant=Sum('montant'), nombre=Count('id'), heures=Sum('seance__nombre_heures')):
+        lignes.append(AgregatFinancier(date=row['jour'], dimension='SEANCE', cle='',
+                                        montant=row['montant'], nombre=row['nombre'], heures=row['heures'] or 0))
+    for row in Charge.objects.order_by().values('date').annotate(montant=Sum('montant'), nombre=Count('id')):
+        lignes.append(AgregatFinancier(date=row['date'], dimension='CHARGE', cle='',
+                                        montant=row['montant'], nombre=row['nombre']))
+
+    with transaction.atomic():
+        AgregatFinancier.objects.all().delete()
+        AgregatFinancier.objects.bulk_create(lignes, batch_size=500)
+    return len(lignes)
+
+
+def rapport_financier(debut=None, fin=None):
+    """Construit le rapport financier sur [debut, fin] (bornes incluses, optionnelles)."""
+    agregats = AgregatFinancier.objects.all()
+    if debut:
+        agregats = agregats.filter(date__gte=debut)
+    if fin:
+        agregats = agregats.filter(date__lte=fin)
+
+    totaux = {
+        row['dimension']: row['montant']
+        for row in agregats.filter(dimension__in=['REVENU', 'CHARGE'])
+        .values('dimension').annotate(montant=Sum('montant')).order_by()
+    }
+    total_revenue = totaux.get('REVENU') or Decimal('0')
+    total_expenses = totaux.get('CHARGE') or Decimal('0')
+
+    mois = defaultdict(lambda: {'revenue': Decimal('0'), 'expenses': Decimal('0')})
+    for row in (agregats.filter(dimension__in=['REVENU', 'CHARGE'])
+                .annotate(mois=TruncMonth('date')).values('mois', 'dimension')
+                .annotate(montant=Sum('montant')).order_by('mois')):
+        cle = 'revenue' if row['dimension'] == 'REVENU' else 'expenses'
+        mois[row['mois']][cle] = row['montant']
+    monthly_stats = [
+        {
+            'month': m.strftime('%Y-%m'),
+            'revenue': v['revenue'],
+            'expenses': v['expenses'],
+            'profit': v['revenue'] - v['expenses'],
+        }
+        for m, v in sorted(mois.items())
+    ]
+
+    par_abonnement = list(
+        agregats.filter(dimension='ABONNEMENT').values('cle')
+        .annotate(montant=Sum('montant'), nombre=Sum('nombre')).order_by('-montant')
+    )
+    noms = dict(Abonnement.objects.filter(
+        id__in=[int(row['cle']) for row in par_abonnement]
+    ).values_list('id', 'nom'))
+    subscription_stats = [
+        {
+            'abonnement_id': int(row['cle']),
+            'abonnement_nom': noms.get(int(row['cle']), 'Abonnement supprimé'),
+            'revenue': row['montant'],
+            'count': row['nombre'],
+        }
+        for row in par_abonnement
+    ]
+
+    session_stats = [
+        {
+            'month': row['mois'].strftime('%Y-%m'),
+            'sessions': row['nombre'],
+            'hours': row['heures'],
+            'revenue': row['montant'],
+        }
+        for row in agregats.filter(dimension='SEANCE').annotate(mois=TruncMonth('date'))
+        .values('mois').annotate(montant=Sum('montant'), nombre=Sum('nombre'), heures=Sum('heures'))
+        .order_by('mois')
+    ]
+
+    payment_mode_stats = [
+        {'mode_paiement': row['cle'], 'revenue': row['montant'], 'count': row['nombre']}
+        for row in agregats.filter(dimension='MODE_PAIEMENT').values('cle')
+        .annotate(montant=Sum('montant'), nombre=Sum('nombre')).order_by('cle')
+    ]
+
+    return {
+        'total_revenue': total_revenue,
+        'total_expenses': total_expenses,
+        'total_charges': total_expenses,
+        'profit': total_revenue - total_expenses,
+        'monthly_stats': monthly_stats,
+        'subscription_stats': subscription_stats,
+        'session_stats': session_stats,
+        'payment_mode_stats': payment_mode_stats,
+    }
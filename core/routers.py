@@ -0,0 +1,127 @@
+"""
+Lectures des rapports sur une base secondaire (REPORTING_DATABASE).
+
+Les rapports (rapport financier, exports, statistiques de présence) agrègent beaucoup de
+lignes : exécutés dans `lecture_rapports()` (ou `sur_rapports()`), ils lisent la base de
+reporting au lieu de la base principale où la caisse enregistre les paiements.
+
+La base de reporting est typiquement une copie SQLite rafraîchie par
+`python manage.py snapshot_reporting --intervalle 60` (voir `copier_instantane`).
+Elle n'est utilisée que si elle est assez récente (REPORTING_MAX_STALENESS_SECONDS,
+date de modification du fichier) ; sinon, ou si elle est absente ou en erreur, la
+lecture se fait sur la base principale. Une base secondaire d'un autre moteur (réplique
+PostgreSQL, ...) est considérée comme à jour.
+
+Les écritures vont toujours à la base principale (ReportingRouter).
+"""
+import contextvars
+import logging
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+# Alias des lectures de rapports en cours (None hors lecture_rapports : routage par défaut)
+_base_lecture = contextvars.ContextVar('core_base_rapports', default=None)
+
+
+def _alias():
+    alias = getattr(settings, 'REPORTING_DATABASE', None)
+    return alias if alias in settings.DATABASES else None
+
+
+def _fraicheur_max():
+    return getattr(settings, 'REPORTING_MAX_STALENESS_SECONDS', 300)
+
+
+def base_rapports(max_staleness=None):
+    """Alias pour une lecture de rapport : la base de reporting si elle est utilisable, sinon la principale."""
+    alias = _alias()
+    if alias is None:
+        return DEFAULT_DB_ALIAS
+    connexion = connections[alias]
+    if connexion.vendor != 'sqlite':
+        return alias
+    try:
+        etat = os.stat(connexion.settings_dict['NAME'])
+    except (OSError, TypeError, ValueError):
+        return DEFAULT_DB_ALIAS
+    if time.time() - etat.st_mtime > (_fraicheur_max() if max_staleness is None else max_staleness):
+        return DEFAULT_DB_ALIAS
+    # Copie remplacée depuis l'ouverture de la connexion (persistante) : la rouvrir sur le nouveau fichier
+    if getattr(connexion, '_instantane', None) != (etat.st_ino, etat.st_mtime):
+        connexion.close()
+        connexion._instantane = (etat.st_ino, etat.st_mtime)
+    return alias
+
+
+def base_courante():
+    """Alias des lectures de rapports en cours, ou None."""
+    return _base_lecture.get()
+
+
+@contextmanager
+def lecture_rapports(max_staleness=None):
+    """Les lectures du bloc vont à la base de reporting (voir base_rapports). Produit l'alias retenu."""
+    token = _base_lecture.set(base_rapports(max_staleness))
+    try:
+        yield _base_lecture.get()
+    finally:
+        _base_lecture.reset(token)
+
+
+def sur_rapports(fonction, *args, **kwargs):
+    """Exécute `fonction` dans lecture_rapports() ; de nouveau sur la base principale si la copie échoue."""
+    with lecture_rapports() as alias:
+        if alias == DEFAULT_DB_ALIAS:
+            return fonction(*args, **kwargs)
+        try:
+            return fonction(*args, **kwargs)
+        except DatabaseError:
+            logger.warning("Base de reporting %s en erreur : lecture sur la base principale", alias, exc_info=True)
+    return fonction(*args, **kwargs)
+
+
+def copier_instantane():
+    """
+    Copie la base principale dans le fichier de la base de reporting (API de sauvegarde
+    SQLite, sans bloquer les écritures en WAL), puis remplace l'ancien fichier d'un coup.
+    À appeler hors transaction sur la base principale. Retourne le chemin de la copie.
+    """
+    alias = _alias()
+    source = connections[DEFAULT_DB_ALIAS]
+    if alias is None or source.vendor != 'sqlite' or connections[alias].vendor != 'sqlite':
+        raise ValueError('La copie de reporting nécessite deux bases SQLite (REPORTING_DATABASE)')
+    cible = str(connections[alias].settings_dict['NAME'])
+    temporaire = f'{cible}.tmp'
+    source.ensure_connection()
+    destination = sqlite3.connect(temporaire)
+    try:
+        source.connection.backup(destination)
+        # Copie en lecture seule : pas de fichiers -wal/-shm à côté
+        destination.execute('PRAGMA journal_mode=DELETE')
+    finally:
+        destination.close()
+    os.replace(temporaire, cible)
+    return cible
+
+
+class ReportingRouter:
+    def db_for_read(self, model, **hints):
+        return _base_lecture.get()
+
+    def db_for_write(self, model, **hints):
+        # Y compris pour un objet lu sur la base de reporting
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # La base de reporting est une copie : son schéma vient de la base principale
+        return False if db == _alias() else None
@@ -0,0 +1,331 @@
+"""
+Jeu de données synthétique pour les essais de charge.
+
+`generer()` crée clients, employés, personnel, abonnements, séances, réservations,
+paiements (avec tickets et factures), abonnements présentiels et leurs tranches,
+charges et présences, en bulk_create par lots : les objets sont produits au fil de
+l'eau et insérés un lot à la fois. Restent en mémoire les identifiants créés et les
+liens paiement -> réservation/séance/reçu, de l'ordre de quelques entiers par paiement.
+
+Les répartitions imitent l'exploitation réelle : quelques clients fidèles paient
+beaucoup, l'activité croît vers les dates récentes et se concentre aux heures de
+pointe (matin et fin de journée), la plupart des paiements aboutissent.
+Tout est tiré d'un random.Random(graine) et daté par rapport à la fin de la journée
+`date_reference` (aujourd'hui par défaut) : une même graine et une même date de
+référence donnent les mêmes données.
+
+Aucun PDF n'est rendu : les tickets sont créés « à la demande » (rendus au premier
+téléchargement). Avec `pdf=True`, ils sont mis en file pour le worker (core.jobs).
+
+Utilisé par `python manage.py seed_load` et par le banc de mesure (core.bench).
+"""
+import random
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from . import catalogue
+from .models import (
+    User, Abonnement, Personnel, Seance, Reservation, Paiement, Ticket, Facture, TacheDocument,
+    AbonnementClientPresentiel, PaiementTranche, HistoriquePaiement, Charge, PresencePersonnel
+)
+from .presences import invalider_mois
+from .reporting import reconstruire_agregats
+
+TAILLE_LOT = 2000
+
+ABONNEMENTS = [
+    ('Mensuel', '15000', 30),
+    ('Trimestriel', '40000', 90),
+    ('Semestriel', '75000', 180),
+    ('Annuel', '150000', 365),
+]
+# Répartitions (valeur, poids)
+STATUTS_PAIEMENT = {'PAYE': 92, 'EN_ATTENTE': 5, 'ECHEC': 3}
+MODES_PAIEMENT = {'ESPECE': 60, 'CARTE': 30, 'CHEQUE': 10}
+TYPES_RESERVATION = {'SEANCE': 70, 'ABONNEMENT': 30}
+TARIFS_SEANCE = {2000: 60, 5000: 30, 10000: 10}
+# Fréquentation par heure d'ouverture (6h-21h) : pointes le matin et en fin de journée
+HEURES = {6: 4, 7: 9, 8: 8, 9: 5, 10: 3, 11: 3, 12: 5, 13: 4, 14: 2, 15: 2, 16: 4, 17: 9, 18: 11, 19: 9, 20: 5, 21: 2}
+CATEGORIES_PERSONNEL = {'COACH': 50, 'MENAGE': 25, 'AIDE_SOIGNANT': 10, 'AUTRE': 15}
+
+
+@contextmanager
+def dates_libres(*champs):
+    """Désactive temporairement auto_now_add pour dater librement les lignes créées."""
+    for champ in champs:
+        champ.auto_now_add = False
+    try:
+        yield
+    finally:
+        for champ in champs:
+            champ.auto_now_add = True
+
+
+class _Tirage:
+    """Tirages pondérés sur un random.Random."""
+
+    def __init__(self, graine, maintenant, jours):
+        self.rng = random.Random(graine)
+        self.maintenant = maintenant
+        self.jours = jours
+
+    def parmi(self, poids):
+        return self.rng.choices(list(poids), weights=list(poids.values()))[0]
+
+    def fidele(self, ids):
+        """Identifiant tiré avec une forte préférence pour le début de la liste (clients fidèles)."""
+        return ids[int(len(ids) * self.rng.random() ** 2)]
+
+    def jour(self):
+        """Nombre de jours dans le passé, plus souvent récent que lointain (activité en croissance)."""
+        return int(self.rng.triangular(0, self.jours, 0))
+
+    def instant(self, jours_avant=None):
+        """Date et heure d'ouverture, `jours_avant` jours avant maintenant (tiré si absent)."""
+        jours_avant = self.jour() if jours_avant is None else jours_avant
+        jour = (self.maintenant - timedelta(days=jours_avant)).date()
+        heure = time(self.parmi(HEURES), self.rng.randrange(60))
+        return min(timezone.make_aware(datetime.combine(jour, heure)), self.maintenant)
+
+
+def _uuid(domaine, graine, nature, numero):
+    """UUID stable pour une graine, distinct d'un jeu (domaine) à l'autre dans la même base."""
+    return uuid.uuid5(uuid.NAMESPACE_DNS, f'{nature}-{numero}.{graine}.{domaine}')
+
+
+def _lots(objets, taille_lot):
+    objets = iter(objets)
+    while lot := list(islice(objets, taille_lot)):
+        yield lot
+
+
+def _inserer(modele, objets, taille_lot):
+    """bulk_create de `objets` (itérable, consommé lot par lot). Retourne les ids créés, par ordre de création."""
+    dernier = modele.objects.aggregate(dernier=Max('id'))['dernier'] or 0
+    for lot in _lots(objets, taille_lot):
+        with transaction.atomic():
+            modele.objects.bulk_create(lot)
+    return list(modele.objects.filter(id__gt=dernier).order_by('id').values_list('id', flat=True))
+
+
+def _tranches(tirage, montant):
+    """Découpe `montant` en 1 à 3 tranches arrondies à 500."""
+    nombre = tirage.rng.choice([1, 1, 2, 3])
+    tranches, reste = [], montant
+    for _ in range(nombre - 1):
+        tranche = (reste * Decimal(tirage.rng.uniform(0.3, 0.6)) / 500).quantize(Decimal('1')) * 500
+        if 0 < tranche < reste:
+            tranches.append(tranche)
+            reste -= tranche
+    return tranches + [reste]
+
+
+def generer(clients=1000, employes=10, personnel=20, seances=None, reservations=None, paiements=10000,
+            presentiels=None, charges=None, jours=365, jours_presences=90, graine=42, pdf=False,
+            statuts_paiement=None, domaine='load.local', date_reference=None, taille_lot=TAILLE_LOT,
+            journal=None):
+    """
+    Crée le jeu de données et retourne {nom du modèle: nombre de lignes créées}.
+
+    seances, reservations, presentiels, charges : proportionnels aux paiements et
+    aux clients si absents. Les réservations et les séances sont réglées par les
+    premiers paiements. Les comptes créés ont des adresses en @`domaine`, sans mot
+    de passe utilisable. `journal(message)` reçoit l'avancement.
+    """
+    seances = seances if seances is not None else paiements // 10
+    reservations = reservations if reservations is not None else paiements // 2
+    presentiels = presentiels if presentiels is not None else clients // 10
+    charges = charges if charges is not None else jours * 2
+    statuts_paiement = statuts_paiement or STATUTS_PAIEMENT
+    journal = journal or (lambda message: None)
+    aujourd_hui = date_reference or timezone.localdate()
+    maintenant = timezone.make_aware(datetime.combine(aujourd_hui, time.max))
+    tirage = _Tirage(graine, maintenant, jours)
+    rng = tirage.rng
+    comptes = {}
+
+    def inserer(modele, objets):
+        ids = _inserer(modele, objets, taille_lot)
+        comptes[modele.__name__] = comptes.get(modele.__name__, 0) + len(ids)
+        journal(f'{modele.__name__} : {len(ids)}')
+        return ids
+
+    # Comptes et catalogue
+    employe_ids = inserer(User, (
+        User(email=f'employe{i}@{domaine}', nom=f'Employe{i}', prenom='Staff', role='EMPLOYE', password='!')
+        for i in range(employes)
+    ))
+    client_ids = inserer(User, (
+        User(email=f'client{i}@{domaine}', nom=f'Nom{i}', prenom=f'Prenom{i}', role='CLIENT', password='!',
+             telephone=f'07{rng.randrange(10 ** 8):08d}', date_joined=tirage.instant())
+        for i in range(clients)
+    ))
+    personnel_ids = inserer(Personnel, (
+        Personnel(nom=f'Personnel{i}', prenom='Staff', categorie=tirage.parmi(CATEGORIES_PERSONNEL),
+                  date_emploi=aujourd_hui - timedelta(days=rng.randrange(jours, jours * 3)))
+        for i in range(personnel)
+    ))
+    coach_ids = list(Personnel.objects.filter(id__in=personnel_ids, categorie='COACH').values_list('id', flat=True))
+    abonnement_ids = inserer(Abonnement, (
+        Abonnement(nom=nom, description=f'Abonnement {nom}', prix=Decimal(prix), duree_jours=duree)
+        for nom, prix, duree in ABONNEMENTS
+    ))
+    prix = dict(Abonnement.objects.filter(id__in=abonnement_ids).values_list('id', 'prix'))
+    durees = dict(Abonnement.objects.filter(id__in=abonnement_ids).values_list('id', 'duree_jours'))
+
+    # Ce que règle chaque paiement, tiré avant les réservations et séances pour les dater ensemble
+    reglements = []  # (statut, montant, abonnement_id, date)
+    for _ in range(paiements):
+        abonnement_id = rng.choice(abonnement_ids) if rng.random() < 0.3 else None
+        montant = prix[abonnement_id] if abonnement_id else Decimal(tirage.parmi(TARIFS_SEANCE))
+        reglements.append((tirage.parmi(statuts_paiement), montant, abonnement_id, tirage.instant()))
+
+    seance_ids = inserer(Seance, (
+        Seance(client_nom=f'Nom{i}', client_prenom=f'Prenom{i}', date_jour=reglements[i][3].date(),
+               nombre_heures=rng.choice([1, 1, 1, 2]), montant_paye=reglements[i][1],
+               coach_id=rng.choice(coach_ids) if coach_ids else None)
+        for i in range(min(seances, paiements))
+    ))
+
+    def reservation(i):
+        statut, montant, abonnement_id, date = reglements[i] if i < paiements else ('EN_ATTENTE', None, None, None)
+        type_reservation = 'ABONNEMENT' if abonnement_id else tirage.parmi(TYPES_RESERVATION)
+        if montant is None:
+            abonnement_id = rng.choice(abonnement_ids) if type_reservation == 'ABONNEMENT' else None
+            montant = prix[abonnement_id] if abonnement_id else Decimal(tirage.parmi(TARIFS_SEANCE))
+        client_id = tirage.fidele(client_ids) if client_ids else None
+        return Reservation(
+            nom_client=f'Client {client_id}', client_id=client_id, type_reservation=type_reservation,
+            abonnement_id=abonnement_id, montant=montant, montant_paye=montant if statut == 'PAYE' else 0,
+            statut={'PAYE': 'CONFIRMEE', 'ECHEC': 'ANNULEE'}.get(statut, 'EN_ATTENTE'),
+            created_at=date or tirage.instant()
+        )
+
+    # Les premiers paiements règlent les séances, les suivants les réservations
+    reservation_ids = inserer(Reservation, (reservation(len(seance_ids) + i) for i in range(reservations)))
+
+    date_paiement = Paiement._meta.get_field('date_paiement')
+    with dates_libres(date_paiement):
+        paiement_ids = inserer(Paiement, (
+            Paiement(
+                client_id=tirage.fidele(client_ids) if client_ids else None,
+                seance_id=seance_ids[i] if i < len(seance_ids) else None,
+                reservation_id=(reservation_ids[i - len(seance_ids)]
+                                if 0 <= i - len(seance_ids) < len(reservation_ids) else None),
+                abonnement_id=abonnement_id, montant=montant, status=statut,
+                mode_paiement=tirage.parmi(MODES_PAIEMENT), date_paiement=date
+            ) for i, (statut, montant, abonnement_id, date) in enumerate(reglements)
+        ))
+
+    # Reçus des paiements aboutis : ticket et facture, sans rendu PDF
+    def source(i):
+        if i < len(seance_ids):
+            return 'Seance', seance_ids[i]
+        if i - len(seance_ids) < len(reservation_ids):
+            return 'Reservation', reservation_ids[i - len(seance_ids)]
+        return 'Paiement', paiement_ids[i]
+
+    recus = [  # (paiement, type de ticket, modèle source, id source)
+        (paiement_id, 'ABONNEMENT' if reglements[i][2] else 'SEANCE', *source(i))
+        for i, paiement_id in enumerate(paiement_ids) if reglements[i][0] == 'PAYE'
+    ]
+    del reglements
+    ticket_ids = inserer(Ticket, (
+        Ticket(paiement_id=paiement_id, uuid=_uuid(domaine, graine, 'ticket', numero), type_ticket=type_ticket,
+               statut='EN_ATTENTE' if pdf else 'A_LA_DEMANDE', source_modele=modele, source_id=source_id)
+        for numero, (paiement_id, type_ticket, modele, source_id) in enumerate(recus)
+    ))
+    inserer(Facture, (
+        Facture(paiement_id=paiement_id, uuid=_uuid(domaine, graine, 'facture', numero),
+                seance_id=source_id if modele == 'Seance' else None,
+                reservation_id=source_id if modele == 'Reservation' else None)
+        for numero, (paiement_id, _type_ticket, modele, source_id) in enumerate(recus)
+    ))
+    if pdf:
+        inserer(TacheDocument, (
+            TacheDocument(ticket_id=ticket_id, source_modele=modele, source_id=source_id)
+            for ticket_id, (_paiement_id, _type_ticket, modele, source_id) in zip(ticket_ids, recus)
+        ))
+    del recus
+
+    # Abonnements présentiels réglés en tranches (avec leur historique)
+    ventes = []  # (montant payé, date de début, employé)
+    def presentiel(i):
+        abonnement_id = rng.choice(abonnement_ids)
+        date_debut = aujourd_hui - timedelta(days=tirage.jour())
+        date_fin = date_debut + timedelta(days=durees[abonnement_id])
+        total = prix[abonnement_id]
+        paye = total if rng.random() < 0.7 else (total * Decimal(rng.uniform(0.2, 0.8)) / 500).quantize(Decimal('1')) * 500
+        employe_id = rng.choice(employe_ids) if employe_ids else None
+        ventes.append((paye, date_debut, employe_id))
+        termine = paye >= total
+        return AbonnementClientPresentiel(
+            client_id=tirage.fidele(client_ids) if client_ids and rng.random() < 0.5 else None,
+            client_nom=f'Nom{i}', client_prenom=f'Prenom{i}', abonnement_id=abonnement_id,
+            date_debut=date_debut, date_fin=date_fin, montant_total=total, montant_paye=paye,
+            statut_paiement='PAIEMENT_TERMINE' if termine else 'PAIEMENT_INACHEVE',
+            statut='EXPIRE' if date_fin < aujourd_hui else 'EN_COURS', employe_creation_id=employe_id,
+            date_creation=tirage.instant((aujourd_hui - date_debut).days)
+        )
+
+    with dates_libres(AbonnementClientPresentiel._meta.get_field('date_creation')):
+        presentiel_ids = inserer(AbonnementClientPresentiel, (presentiel(i) for i in range(presentiels)))
+
+    versements = []  # (presentiel, montant, cumul, date, employé)
+    for presentiel_id, (paye, date_debut, employe_id) in zip(presentiel_ids, ventes):
+        cumul = Decimal('0')
+        for numero, montant in enumerate(_tranches(tirage, paye)):
+            cumul += montant
+            jours_avant = max((aujourd_hui - date_debut).days - numero * 15, 0)
+            versements.append((presentiel_id, montant, cumul, tirage.instant(jours_avant), employe_id))
+    del ventes
+    with dates_libres(PaiementTranche._meta.get_field('date_paiement')):
+        inserer(PaiementTranche, (
+            PaiementTranche(abonnement_presentiel_id=presentiel_id, montant=montant, date_paiement=date,
+                            mode_paiement=tirage.parmi(MODES_PAIEMENT), employe_id=employe_id)
+            for presentiel_id, montant, _cumul, date, employe_id in versements
+        ))
+    with dates_libres(HistoriquePaiement._meta.get_field('date_modification')):
+        inserer(HistoriquePaiement, (
+            HistoriquePaiement(abonnement_presentiel_id=presentiel_id, montant_ajoute=montant,
+                               montant_total_apres=cumul, date_modification=date, employe_id=employe_id)
+            for presentiel_id, montant, cumul, date, employe_id in versements
+        ))
+    del versements
+
+    inserer(Charge, (
+        Charge(titre=f'Charge {i}', montant=Decimal(rng.choice([5000, 10000, 25000, 50000, 150000])),
+               date=aujourd_hui - timedelta(days=rng.randrange(jours)), description='Jeu de données de charge')
+        for i in range(charges)
+    ))
+
+    # Une présence par personne et par jour ouvré sur les derniers jours : arrivées autour de 8h15
+    def presence(jour, personnel_id=None, employe_id=None):
+        present = rng.random() < 0.93
+        minutes = min(max(int(rng.gauss(8 * 60 + 15, 15)), 6 * 60), 11 * 60)
+        return PresencePersonnel(personnel_id=personnel_id, employe_id=employe_id, date_jour=jour,
+                                 statut='PRESENT' if present else 'ABSENT',
+                                 heure_arrivee=time(minutes // 60, minutes % 60) if present else None)
+
+    jours_ouvres = [aujourd_hui - timedelta(days=n) for n in range(1, jours_presences + 1)
+                    if (aujourd_hui - timedelta(days=n)).weekday() < 6]
+    inserer(PresencePersonnel, (
+        presence(jour, **{champ: identifiant})
+        for jour in jours_ouvres
+        for champ, ids in (('personnel_id', personnel_ids), ('employe_id', employe_ids))
+        for identifiant in ids
+    ))
+
+    # bulk_create ne déclenche pas les signaux : caches et agrégats sont remis à jour en une fois
+    for jour in {jour.replace(day=1) for jour in jours_ouvres}:
+        invalider_mois(jour)
+    reconstruire_agregats()
+    transaction.on_commit(catalogue.invalider)
+    return comptes
@@ -1,3 +1,5 @@
+import logging
+
 from rest_framework import serializers
 from .models import User
 from django.contrib.auth import authenticate
@@ -5,8 +7,15 @@ from .models import AbonnementClient, AbonnementClientPresentiel, PaiementTranch
 from .models import Ticket
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.urls import reverse
+from .instrumentation import TimedSerializerMixin
+from . import authentication, catalogue
+from .presences import invalider_mois
+
+logger = logging.getLogger(__name__)
 
-class UserRegisterSerializer(serializers.ModelSerializer):
+class UserRegisterSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
     telephone = serializers.CharField(required=False, allow_blank=True, allow_null=True)
     role = serializers.ChoiceField(choices=User.ROLE_CHOICES, default='CLIENT', required=False)
@@ -27,7 +36,7 @@ class UserRegisterSerializer(serializers.ModelSerializer):
         )
         return user
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     current_password = serializers.CharField(write_only=True, required=False, allow_blank=True)
     new_password = serializers.CharField(write_only=True, required=False, allow_blank=True)
     
@@ -86,23 +95,40 @@ from .models import (
     Ticket, Charge, PresencePersonnel, User, Personnel
 )
 
-class AbonnementSerializer(serializers.ModelSerializer):
+class AbonnementSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Abonnement
         fields = '__all__'
 
-class PersonnelSerializer(serializers.ModelSerializer):
+class PersonnelSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Personnel
         fields = '__all__'
 
-class PersonnelSimpleSerializer(serializers.ModelSerializer):
+class PersonnelSimpleSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Personnel
         fields = ['id', 'nom', 'prenom', 'categorie']
         read_only_fields = ['id', 'nom', 'prenom', 'categorie']
 
-class SeanceSerializer(serializers.ModelSerializer):
+def url_ticket(ticket, request=None):
+    """
+    URL du PDF d'un ticket : le fichier s'il est rendu, l'endpoint de téléchargement
+    (rendu au premier appel) pour un ticket à la demande, sinon None.
+    """
+    if ticket.est_pret:
+        url = ticket.fichier_pdf.url
+    elif ticket.statut == 'A_LA_DEMANDE':
+        url = reverse('ticket-pdf', args=[ticket.pk])
+    else:
+        return None
+    if request is not None:
+        return request.build_absolute_uri(url)
+    # fallback
+    return url
+
+
+class SeanceSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     ticket_url = serializers.SerializerMethodField()
     coach = PersonnelSimpleSerializer(read_only=True)
     coach_id = serializers.PrimaryKeyRelatedField(
@@ -124,18 +150,13 @@ class SeanceSerializer(serializers.ModelSerializer):
     def get_ticket_url(self, obj):
         try:
             paiement = obj.paiement_set.first()
-            if paiement and hasattr(paiement, 'ticket') and paiement.ticket:
-                request = self.context.get('request')
-                url = paiement.ticket.fichier_pdf.url
-                if request is not None:
-                    return request.build_absolute_uri(url)
-                # fallback
-                return f"{settings.MEDIA_URL}{url}"
+            if paiement and hasattr(paiement, 'ticket'):
+                return url_ticket(paiement.ticket, self.context.get('request'))
         except:
             pass
         return None
 
-class ReservationSerializer(serializers.ModelSerializer):
+class ReservationSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     ticket_url = serializers.SerializerMethodField()
     montant_total_paye = serializers.SerializerMethodField()
     montant_paye = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
@@ -144,22 +165,25 @@ class ReservationSerializer(serializers.ModelSerializer):
     class Meta:
         model = Reservation
         fields = [
-            'id', 'nom_client', 'type_reservation', 'montant', 'montant_paye', 'montant_total_paye', 'statut', 'description', 
-            'created_at', 'updated_at', 'ticket_url'
+            'id', 'nom_client', 'client', 'type_reservation', 'abonnement', 'montant', 'montant_paye', 'montant_total_paye',
+            'statut', 'description', 'created_at', 'updated_at', 'ticket_url'
         ]
-        read_only_fields = ['id', 'statut', 'ticket_url', 'created_at', 'updated_at', 'montant_total_paye']
+        read_only_fields = ['id', 'client', 'statut', 'ticket_url', 'created_at', 'updated_at', 'montant_total_paye']
         
     def get_ticket_url(self, obj):
         try:
             # Chercher le ticket du dernier paiement PAYE lié à cette réservation
-            paiement = Paiement.objects.filter(reservation=obj, status='PAYE').order_by('-date_paiement', '-id').first()
-            if paiement and hasattr(paiement, 'ticket') and paiement.ticket:
-                request = self.context.get('request')
-                url = paiement.ticket.fichier_pdf.url
-                if request is not None:
-                    return request.build_absolute_uri(url)
-                # fallback
-                return f"{settings.MEDIA_URL}{url}"
+            if hasattr(obj, 'paiements_tries'):
+                # Préchargé par Reservation.objects.avec_paiements()
+                paiements = obj.paiements_tries
+            else:
+                paiements = Paiement.objects.filter(reservation=obj).select_related('ticket').order_by('-date_paiement', '-id')
+            # Ticket du dernier paiement PAYE, à défaut le billet de réservation (paiement en attente)
+            avec_ticket = [p for p in paiements if hasattr(p, 'ticket')]
+            payes = [p for p in avec_ticket if p.status == 'PAYE']
+            paiement = (payes or avec_ticket or [None])[0]
+            if paiement:
+                return url_ticket(paiement.ticket, self.context.get('request'))
         except:
             pass
         return None
@@ -168,13 +192,17 @@ class ReservationSerializer(serializers.ModelSerializer):
         """Calcule le montant total payé pour cette réservation"""
         from django.db.models import Sum
         try:
-            total = Paiement.objects.filter(
-                reservation=obj,
-                status='PAYE'
-            ).aggregate(total=Sum('montant'))['total'] or 0
+            if hasattr(obj, 'total_paye'):
+                # Annoté par Reservation.objects.avec_paiements()
+                total = obj.total_paye or 0
+            else:
+                total = Paiement.objects.filter(
+                    reservation=obj,
+                    status='PAYE'
+                ).aggregate(total=Sum('montant'))['total'] or 0
             return str(float(total)) if total else "0"
-        except Exception as e:
-            print(f"Erreur dans get_montant_total_paye: {e}")
+        except Exception:
+            logger.exception("Erreur dans get_montant_total_paye (réservation %s)", obj.pk)
             return "0"
         
     def validate(self, data):
@@ -195,10 +223,14 @@ class ReservationSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError({
                 'montant': 'Le montant ne peut pas être négatif.'
             })
+
+        # Réservation d'abonnement sans abonnement indiqué : déduit une fois pour toutes de la description
+        if self.instance is None and data['type_reservation'] == 'ABONNEMENT' and not data.get('abonnement'):
+            data['abonnement'] = catalogue.deviner(data.get('description'), data['montant'])
             
         return data
 
-class PaiementSerializer(serializers.ModelSerializer):
+class PaiementSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     client = serializers.StringRelatedField(read_only=True)
     abonnement = serializers.StringRelatedField(read_only=True)
     seance = serializers.StringRelatedField(read_only=True)
@@ -208,12 +240,12 @@ class PaiementSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ['client', 'date_paiement']
 
-class TicketSerializer(serializers.ModelSerializer):
+class TicketSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Ticket
         fields = '__all__'
 
-class ChargeSerializer(serializers.ModelSerializer):
+class ChargeSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Charge
         fields = '__all__'
@@ -224,7 +256,7 @@ class BlankableTimeField(serializers.TimeField):
             return None
         return super().to_internal_value(value)
 
-class PresencePersonnelSerializer(serializers.ModelSerializer):
+class PresencePersonnelSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     personnel = PersonnelSerializer(read_only=True)
     personnel_id = serializers.PrimaryKeyRelatedField(
         queryset=Personnel.objects.all(), 
@@ -246,15 +278,13 @@ class PresencePersonnelSerializer(serializers.ModelSerializer):
     class Meta:
         model = PresencePersonnel
         fields = ['id', 'personnel', 'personnel_id', 'employe', 'employe_id', 'statut', 'heure_arrivee', 'date_jour']
+        # Les contraintes (personne, date_jour) portent sur des champs optionnels : doublon vérifié à l'écriture
+        validators = []
 
     def validate(self, data):
-        print("=== DEBUG VALIDATION ===")
-        print("Data received:", data)
+        logger.debug("Validation présence: %s", data)
         
-        # Vérifier qu'au moins un personnel ou employé est spécifié
-        if not data.get('personnel') and not data.get('employe'):
-            # Si aucun n'est spécifié, on va utiliser l'utilisateur connecté dans create()
-            print("No personnel or employe specified, will use current user")
+        # Si ni personnel ni employé n'est spécifié, on utilisera l'utilisateur connecté dans create()
         
         # Vérifier que date_jour est fourni
         if not data.get('date_jour'):
@@ -265,46 +295,120 @@ class PresencePersonnelSerializer(serializers.ModelSerializer):
         # Si le statut est ABSENT, on force heure_arrivee à None
         if data.get('statut') == 'ABSENT':
             data['heure_arrivee'] = None
-            print("Status is ABSENT, setting heure_arrivee to None")
         
         # Si heure_arrivee est une chaîne vide, absente ou non conforme, on la met à None
         if not data.get('heure_arrivee') or data.get('heure_arrivee') in ['', None]:
             data['heure_arrivee'] = None
-            print("Setting heure_arrivee to None")
         
-        print("Validated data:", data)
         return data
 
     def create(self, validated_data):
-        print("=== DEBUG SERIALIZER CREATE ===")
-        print("Validated data before:", validated_data)
-        
         # Récupérer l'utilisateur depuis le contexte de la requête
         request = self.context.get('request')
-        print("Request user:", request.user if request else "No request")
         
         if request and request.user and request.user.role == 'EMPLOYE':
             # Si c'est un employé et qu'aucun personnel ou employe n'est spécifié, 
             # c'est l'employé qui marque sa propre présence
             if not validated_data.get('personnel') and not validated_data.get('employe'):
-                print("Setting employe to current user:", request.user)
                 validated_data['employe'] = request.user
         
-        print("Validated data after:", validated_data)
+        logger.debug("Création de présence: %s", validated_data)
         
         try:
-            instance = super().create(validated_data)
-            print("Instance created successfully:", instance)
-            return instance
-        except Exception as e:
-            print("=== ERROR IN SERIALIZER CREATE ===")
-            print("Error type:", type(e))
-            print("Error message:", str(e))
-            import traceback
-            print("Traceback:", traceback.format_exc())
+            with transaction.atomic():
+                return super().create(validated_data)
+        except IntegrityError:
+            raise serializers.ValidationError({'date_jour': 'Présence déjà enregistrée pour ce jour.'})
+        except Exception:
+            logger.exception("Erreur lors de la création de la présence")
             raise
 
-class AbonnementClientSerializer(serializers.ModelSerializer):
+    def update(self, instance, validated_data):
+        # Déplacer une présence sur un (personne, date_jour) déjà saisi viole la même contrainte
+        try:
+            with transaction.atomic():
+                return super().update(instance, validated_data)
+        except IntegrityError:
+            raise serializers.ValidationError({'date_jour': 'Présence déjà enregistrée pour ce jour.'})
+
+
+class PresenceLigneSerializer(serializers.Serializer):
+    """Une ligne de la feuille de présence : exactement un de personnel_id / employe_id."""
+    personnel_id = serializers.IntegerField(required=False, allow_null=True)
+    employe_id = serializers.IntegerField(required=False, allow_null=True)
+    statut = serializers.ChoiceField(choices=["PRESENT", "ABSENT"], default="PRESENT")
+    heure_arrivee = BlankableTimeField(required=False, allow_null=True)
+
+    def validate(self, data):
+        if bool(data.get('personnel_id')) == bool(data.get('employe_id')):
+            raise serializers.ValidationError('Indiquer soit personnel_id, soit employe_id.')
+        # Même règle que PresencePersonnelSerializer : pas d'heure d'arrivée pour une absence
+        if data['statut'] == 'ABSENT' or not data.get('heure_arrivee'):
+            data['heure_arrivee'] = None
+        return data
+
+
+class PresenceLotSerializer(serializers.Serializer):
+    """
+    Feuille de présence d'une journée, enregistrée en une fois.
+    Les identifiants sont vérifiés en une requête par type de personne, puis les lignes
+    sont écrites par bulk_create en upsert sur (personne, date_jour) : renvoyer la même
+    feuille met à jour les présences existantes sans créer de doublons.
+    """
+    date_jour = serializers.DateField()
+    presences = PresenceLigneSerializer(many=True, allow_empty=False)
+
+    def validate_presences(self, lignes):
+        personnels = set(Personnel.objects.filter(
+            id__in=[l['personnel_id'] for l in lignes if l.get('personnel_id')]
+        ).values_list('id', flat=True))
+        employes = set(User.objects.filter(
+            role='EMPLOYE', id__in=[l['employe_id'] for l in lignes if l.get('employe_id')]
+        ).values_list('id', flat=True))
+
+        erreurs, vus = [], set()
+        for ligne in lignes:
+            champ = 'personnel_id' if ligne.get('personnel_id') else 'employe_id'
+            connus = personnels if champ == 'personnel_id' else employes
+            if ligne[champ] not in connus:
+                erreurs.append({champ: f"Identifiant inconnu : {ligne[champ]}."})
+            elif (champ, ligne[champ]) in vus:
+                erreurs.append({champ: 'Personne présente deux fois dans la feuille.'})
+            else:
+                erreurs.append({})
+            vus.add((champ, ligne[champ]))
+        if any(erreurs):
+            raise serializers.ValidationError(erreurs)
+        return lignes
+
+    def create(self, validated_data):
+        date_jour = validated_data['date_jour']
+        par_champ = {'personnel': [], 'employe': []}
+        for ligne in validated_data['presences']:
+            champ = 'personnel' if ligne.get('personnel_id') else 'employe'
+            par_champ[champ].append(PresencePersonnel(
+                date_jour=date_jour, statut=ligne['statut'], heure_arrivee=ligne['heure_arrivee'],
+                **{f'{champ}_id': ligne[f'{champ}_id']}
+            ))
+        with transaction.atomic():
+            for champ, presences in par_champ.items():
+                if presences:
+                    PresencePersonnel.objects.bulk_create(
+                        presences,
+                        update_conflicts=True,
+                        unique_fields=[champ, 'date_jour'],
+                        update_fields=['statut', 'heure_arrivee'],
+                    )
+        invalider_mois(date_jour)
+        return {
+            'date_jour': date_jour,
+            'enregistrees': sum(len(presences) for presences in par_champ.values()),
+        }
+
+    def to_representation(self, instance):
+        return {'date_jour': instance['date_jour'].isoformat(), 'enregistrees': instance['enregistrees']}
+
+class AbonnementClientSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     client_nom = serializers.CharField(source='client.nom', read_only=True)
     client_prenom = serializers.CharField(source='client.prenom', read_only=True)
     abonnement_nom = serializers.CharField(source='abonnement.nom', read_only=True)
@@ -312,7 +416,7 @@ class AbonnementClientSerializer(serializers.ModelSerializer):
         model = AbonnementClient
         fields = ['id', 'client', 'client_nom', 'client_prenom', 'abonnement', 'abonnement_nom', 'date_debut', 'date_fin', 'actif', 'paiement']
 
-class PaiementTrancheSerializer(serializers.ModelSerializer):
+class PaiementTrancheSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     employe_nom = serializers.CharField(source='employe.nom', read_only=True)
     employe_prenom = serializers.CharField(source='employe.prenom', read_only=True)
     
@@ -321,7 +425,7 @@ class PaiementTrancheSerializer(serializers.ModelSerializer):
         fields = ['id', 'abonnement_presentiel', 'montant', 'date_paiement', 'mode_paiement', 'employe', 'employe_nom', 'employe_prenom']
         read_only_fields = ['date_paiement']
 
-class HistoriquePaiementSerializer(serializers.ModelSerializer):
+class HistoriquePaiementSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     client_nom = serializers.CharField(source='abonnement_presentiel.client_nom', read_only=True)
     client_prenom = serializers.CharField(source='abonnement_presentiel.client_prenom', read_only=True)
     
@@ -330,7 +434,7 @@ class HistoriquePaiementSerializer(serializers.ModelSerializer):
         fields = ['id', 'abonnement_presentiel', 'montant_ajoute', 'montant_total_apres', 'date_modification', 'client_nom', 'client_prenom']
         read_only_fields = ['date_modification']
 
-class AbonnementClientPresentielSerializer(serializers.ModelSerializer):
+class AbonnementClientPresentielSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     abonnement_nom = serializers.CharField(source='abonnement.nom', read_only=True)
     abonnement_prix = serializers.DecimalField(source='abonnement.prix', read_only=True, max_digits=10, decimal_places=2)
     employe_nom = serializers.CharField(source='employe_creation.nom', read_only=True)
@@ -355,20 +459,27 @@ class AbonnementClientPresentielSerializer(serializers.ModelSerializer):
                 request = self.context.get('request')
                 if request is not None:
                     # Construire l'URL absolue
-                    url = request.build_absolute_uri(obj.facture_pdf.url)
-                    print(f"Generated URL: {url}")
-                    return url
+                    return request.build_absolute_uri(obj.facture_pdf.url)
                 else:
                     # Fallback si pas de request
-                    url = f"{settings.MEDIA_URL}{obj.facture_pdf.name}"
-                    print(f"Fallback URL: {url}")
-                    return url
-            except Exception as e:
-                print(f"Error generating URL: {e}")
+                    return f"{settings.MEDIA_URL}{obj.facture_pdf.name}"
+            except Exception:
+                logger.warning("URL de facture invalide pour l'abonnement présentiel %s", obj.pk, exc_info=True)
                 # Retourner l'URL relative en dernier recours
                 return obj.facture_pdf.url
         return None
 
+class AbonnementClientPresentielResumeSerializer(AbonnementClientPresentielSerializer):
+    """Version légère pour les listes (?resume=1) : sans tranches ni historique des paiements."""
+    paiements_tranches = None
+    historique_paiements = None
+
+    class Meta(AbonnementClientPresentielSerializer.Meta):
+        fields = [
+            field for field in AbonnementClientPresentielSerializer.Meta.fields
+            if field not in ('paiements_tranches', 'historique_paiements')
+        ]
+
 class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
     @classmethod
     def get_token(cls, user):
@@ -379,4 +490,7 @@ class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
 
     def validate(self, attrs):
         attrs['username'] = attrs.get('email')
-        return super().validate(attrs)
+        data = super().validate(attrs)
+        # Utilisateur tout juste lu en base : son état sert aux premières requêtes (core.authentication)
+        authentication.memoriser(self.user)
+        return data
@@ -1,22 +1,102 @@
-from xhtml2pdf import pisa
-from django.template.loader import render_to_string
-from django.core.files.base import ContentFile
-from io import BytesIO
-from .models import Paiement, Facture
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_save, pre_save, post_delete
 from django.dispatch import receiver
+from .models import (
+    User, Paiement, Charge, Abonnement, PresencePersonnel, AbonnementClient, AbonnementClientPresentiel
+)
+from . import authentication, catalogue, checkin
+from .presences import invalider_mois
+from .jobs import assurer_recu
+from .reporting import contributions_paiement, contributions_charge, appliquer_delta
 
 @receiver(post_save, sender=Paiement)
-def create_facture_after_paiement(sender, instance, created, **kwargs):
-    if instance.status == 'PAYE' and created:
-        if not hasattr(instance, 'facture'):
-            facture = Facture.objects.create(paiement=instance)
-            html = render_to_string("facture_template.html", {
-                "paiement": instance,
-                "uuid": facture.uuid
-            })
-            output = BytesIO()
-            pisa.CreatePDF(src=html, dest=output)
-            filename = f"facture_{facture.uuid}.pdf"
-            facture.fichier_pdf.save(filename, ContentFile(output.getvalue()))
-            facture.save()
+def planifier_recu_apres_paiement(sender, instance, **kwargs):
+    # Aucun rendu ici : le reçu (ticket + facture) est planifié après commit et rendu par le worker,
+    # à la création d'un paiement PAYE ou à son passage à PAYE (status_avant, voir plus bas)
+    if instance.status == 'PAYE' and getattr(instance, '_status_avant', None) != 'PAYE':
+        transaction.on_commit(lambda: assurer_recu(instance))
+
+
+# ---------- Agrégats du rapport financier ----------
+@receiver(pre_save, sender=Paiement)
+def memoriser_paiement_avant_modification(sender, instance, **kwargs):
+    ancien = Paiement.objects.filter(pk=instance.pk).first() if instance.pk else None
+    instance._contributions_avant = contributions_paiement(ancien) if ancien else {}
+    instance._status_avant = ancien.status if ancien else None
+
+
+@receiver(post_save, sender=Paiement)
+def agreger_paiement(sender, instance, **kwargs):
+    appliquer_delta(getattr(instance, '_contributions_avant', {}), contributions_paiement(instance))
+    instance._contributions_avant = contributions_paiement(instance)
+
+
+@receiver(post_delete, sender=Paiement)
+def desagreger_paiement(sender, instance, **kwargs):
+    appliquer_delta(contributions_paiement(instance), {})
+
+
+@receiver(pre_save, sender=Charge)
+def memoriser_charge_avant_modification(sender, instance, **kwargs):
+    ancienne = Charge.objects.filter(pk=instance.pk).first() if instance.pk else None
+    instance._contributions_avant = contributions_charge(ancienne) if ancienne else {}
+
+
+@receiver(post_save, sender=Charge)
+def agreger_charge(sender, instance, **kwargs):
+    appliquer_delta(getattr(instance, '_contributions_avant', {}), contributions_charge(instance))
+    instance._contributions_avant = contributions_charge(instance)
+
+
+@receiver(post_delete, sender=Charge)
+def desagreger_charge(sender, instance, **kwargs):
+    appliquer_delta(contributions_charge(instance), {})
+
+
+# ---------- Catalogue des abonnements (cache mémoire) ----------
+@receiver(post_save, sender=Abonnement)
+@receiver(post_delete, sender=Abonnement)
+def invalider_catalogue(sender, instance, **kwargs):
+    # Après commit : un rechargement avant ne doit pas mettre en mémoire des lignes annulées ensuite
+    transaction.on_commit(catalogue.invalider)
+
+
+# ---------- Statistiques de présence (cache des mois clos) ----------
+@receiver(pre_save, sender=PresencePersonnel)
+def memoriser_jour_presence(sender, instance, **kwargs):
+    instance._jour_avant = (
+        PresencePersonnel.objects.filter(pk=instance.pk).values_list('date_jour', flat=True).first()
+        if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=PresencePersonnel)
+@receiver(post_delete, sender=PresencePersonnel)
+def invalider_statistiques_presence(sender, instance, **kwargs):
+    for jour in {instance.date_jour, getattr(instance, '_jour_avant', None)} - {None}:
+        invalider_mois(jour)
+
+
+# ---------- Contrôle d'accès (cache des adhésions valides) ----------
+@receiver(post_save, sender=Paiement)
+@receiver(post_delete, sender=Paiement)
+@receiver(post_save, sender=AbonnementClient)
+@receiver(post_delete, sender=AbonnementClient)
+@receiver(post_save, sender=AbonnementClientPresentiel)
+@receiver(post_delete, sender=AbonnementClientPresentiel)
+def invalider_checkin(sender, instance, **kwargs):
+    checkin.invalider(sender.__name__, instance.pk)
+
+
+# ---------- Authentification (état des utilisateurs en cache) ----------
+@receiver(post_save, sender=User)
+def memoriser_utilisateur(sender, instance, created, update_fields=None, **kwargs):
+    # Un nouvel utilisateur n'a encore aucun jeton ; last_login seul ne change pas les droits
+    if created or (update_fields is not None and not set(update_fields) & set(authentication.CHAMPS)):
+        return
+    authentication.memoriser(instance)
+
+
+@receiver(post_delete, sender=User)
+def revoquer_utilisateur(sender, instance, **kwargs):
+    authentication.revoquer(instance.pk)
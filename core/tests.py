@@ -1,10 +1,18 @@
 import pytest
 import json
+import logging
+from io import StringIO
+import os
+import time
 import uuid
 from decimal import Decimal
 from datetime import datetime, timedelta
 from unittest.mock import patch, MagicMock
 
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 from rest_framework import status
@@ -12,8 +20,14 @@ from rest_framework.test import APIClient
 
 from .models import (
     User, Abonnement, Seance, Reservation,
-    Paiement, Facture, Charge, PresencePersonnel
+    Paiement, Facture, Charge, PresencePersonnel,
+    Ticket, TacheDocument, AgregatFinancier, Personnel,
+    AbonnementClient, AbonnementClientPresentiel, PaiementTranche, HistoriquePaiement,
+    ExpirationAbonnement
 )
+from .jobs import planifier_ticket, traiter_taches
+from .reporting import reconstruire_agregats
+from .log import JsonFormatter, DebugSamplingFilter, niveaux_par_module
 
 
 # ---------------------- Fixtures ----------------------
@@ -93,6 +107,18 @@ def authenticated_client_client(api_client, client_user):
     return api_client
 
 
+@pytest.fixture(autouse=True)
+def caches_vides():
+    """
+    Caches de processus vidés avant chaque test : le catalogue n'est invalidé qu'après commit,
+    et l'état d'autorisation est indexé par id d'utilisateur, réutilisé d'un test à l'autre.
+    """
+    from django.core.cache import cache
+    from . import catalogue
+    catalogue.invalider()
+    cache.clear()
+
+
 @pytest.fixture
 def abonnement():
     return Abonnement.objects.create(
@@ -163,6 +189,34 @@ def presence_personnel(employee_user):
     )
 
 
+@pytest.fixture
+def member_user():
+    return User.objects.create_user(
+        email='member@example.com',
+        password='password123',
+        nom='Member',
+        prenom='Gym',
+        role='CLIENT'
+    )
+
+
+@pytest.fixture
+def authenticated_member_client(api_client, member_user):
+    url = reverse('token_obtain_pair')
+    response = api_client.post(
+        url, {'email': member_user.email, 'password': 'password123'}, format='json'
+    )
+    token = response.data['access']
+    api_client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+    return api_client
+
+
+@pytest.fixture
+def media_root(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    return tmp_path
+
+
 # ---------------------- Authentication Tests ----------------------
 
 @pytest.mark.django_db
@@ -671,4 +725,1541 @@ class TestFinancialReport:
     def test_financial_report_access_client_forbidden(self, authenticated_client_client):
         url = reverse('financial-report')
         response = authenticated_client_client.get(url)
-        assert response.status_code == status.HTTP_403_FORBIDDEN
\ No newline at end of file
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+
+# ---------------------- Ticket PDF Queue Tests ----------------------
+
+@pytest.mark.django_db
+class TestTicketQueue:
+    def test_seance_directe_returns_pending_ticket(self, authenticated_employee_client, media_root):
+        url = reverse('seance-directe')
+        data = {'date_jour': '2025-07-10', 'client_nom': 'Doe', 'client_prenom': 'John',
+                'nombre_heures': 2, 'montant_paye': '3000.00'}
+        with patch('core.jobs.generer_facture_pdf') as mock_render:
+            response = authenticated_employee_client.post(url, data, format='json')
+        assert response.status_code == status.HTTP_201_CREATED
+        mock_render.assert_not_called()
+        assert response.data['ticket_statut'] == 'EN_ATTENTE'
+        assert response.data['ticket_pdf_url'] is None
+        ticket = Ticket.objects.get(id=response.data['ticket_id'])
+        assert not ticket.fichier_pdf
+        assert TacheDocument.objects.filter(ticket=ticket, statut='EN_ATTENTE').count() == 1
+
+    def test_worker_renders_pending_ticket(self, authenticated_employee_client, media_root):
+        url = reverse('seance-directe')
+        data = {'date_jour': '2025-07-10', 'client_nom': 'Doe', 'client_prenom': 'John',
+                'nombre_heures': 1, 'montant_paye': '1500.00'}
+        response = authenticated_employee_client.post(url, data, format='json')
+        ticket_id = response.data['ticket_id']
+
+        assert traiter_taches() == (1, 0)
+
+        ticket = Ticket.objects.get(id=ticket_id)
+        assert ticket.statut == 'PRET'
+        assert ticket.fichier_pdf.name.startswith('tickets/ticket_seance_')
+        assert (media_root / ticket.fichier_pdf.name).exists()
+        assert TacheDocument.objects.get(ticket=ticket).statut == 'TERMINEE'
+        # Un second passage ne retraite rien
+        assert traiter_taches() == (0, 0)
+
+        response = authenticated_employee_client.get(reverse('seance-list'))
+        seance = response.data['results'][0]
+        assert seance['ticket_url'].endswith(ticket.fichier_pdf.url)
+
+    def test_worker_marks_ticket_failed_when_source_is_gone(self, employee_user, media_root):
+        seance = Seance.objects.create(client_nom='Doe', client_prenom='Jane', montant_paye=Decimal('1000'))
+        paiement = Paiement.objects.create(seance=seance, montant=Decimal('1000'), status='EN_ATTENTE')
+        ticket = planifier_ticket(paiement, seance, type_ticket='SEANCE')
+        Seance.objects.filter(pk=seance.pk).delete()
+
+        assert traiter_taches() == (0, 1)
+        ticket.refresh_from_db()
+        assert ticket.statut == 'ECHEC'
+        tache = TacheDocument.objects.get(ticket=ticket)
+        assert tache.statut == 'ECHEC'
+        assert 'DoesNotExist' in tache.erreur
+
+    def test_worker_retries_then_gives_up(self, settings, media_root):
+        settings.PDF_JOBS_MAX_ATTEMPTS = 2
+        seance = Seance.objects.create(client_nom='Doe', client_prenom='Jane', montant_paye=Decimal('1000'))
+        paiement = Paiement.objects.create(seance=seance, montant=Decimal('1000'), status='EN_ATTENTE')
+        ticket = planifier_ticket(paiement, seance, type_ticket='SEANCE')
+
+        with patch('core.jobs.generer_facture_pdf', side_effect=RuntimeError('boom')):
+            traiter_taches()
+            assert TacheDocument.objects.get(ticket=ticket).statut == 'EN_ATTENTE'
+            traiter_taches()
+        tache = TacheDocument.objects.get(ticket=ticket)
+        assert tache.statut == 'ECHEC'
+        assert tache.tentatives == 2
+        ticket.refresh_from_db()
+        assert ticket.statut == 'ECHEC'
+
+
+# ---------------------- Reservation List Query Tests ----------------------
+
+def _create_paid_reservations(count):
+    for i in range(count):
+        reservation = Reservation.objects.create(
+            nom_client=f'Client {i}', type_reservation='SEANCE', montant=Decimal('2000')
+        )
+        Paiement.objects.create(reservation=reservation, montant=Decimal('500'), status='PAYE')
+        dernier = Paiement.objects.create(reservation=reservation, montant=Decimal('1500'), status='PAYE')
+        Ticket.objects.create(paiement=dernier, type_ticket='SEANCE', fichier_pdf=f'tickets/ticket_{i}.pdf')
+
+
+@pytest.mark.django_db
+class TestReservationListQueries:
+    def _count_list_queries(self, client):
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get(reverse('reservation-list'))
+        assert response.status_code == status.HTTP_200_OK
+        return len(ctx.captured_queries), response
+
+    def test_query_count_is_constant(self, authenticated_employee_client, media_root):
+        _create_paid_reservations(2)
+        small, response = self._count_list_queries(authenticated_employee_client)
+        assert len(response.data['results']) == 2
+
+        _create_paid_reservations(5)
+        large, response = self._count_list_queries(authenticated_employee_client)
+        assert len(response.data['results']) == 7
+        assert small == large
+
+    def test_precomputed_values_match(self, authenticated_employee_client, media_root):
+        _create_paid_reservations(1)
+        reservation = Reservation.objects.get()
+        Paiement.objects.create(reservation=reservation, montant=Decimal('999'), status='EN_ATTENTE')
+
+        response = authenticated_employee_client.get(reverse('reservation-list'))
+        item = response.data['results'][0]
+        assert item['montant_total_paye'] == '2000.0'
+        assert item['ticket_url'].endswith('/media/tickets/ticket_0.pdf')
+
+
+# ---------------------- Financial Rollup Tests ----------------------
+
+def _rollup_snapshot():
+    return sorted(AgregatFinancier.objects.values_list('date', 'dimension', 'cle', 'montant', 'nombre', 'heures'))
+
+
+@pytest.mark.django_db
+class TestFinancialRollup:
+    @pytest.fixture
+    def seed(self, abonnement, media_root):
+        seance = Seance.objects.create(client_nom='Doe', client_prenom='John', nombre_heures=2, montant_paye=Decimal('3000'))
+        Paiement.objects.create(seance=seance, montant=Decimal('3000'), status='PAYE')
+        Paiement.objects.create(abonnement=abonnement, montant=Decimal('50'), status='PAYE', mode_paiement='CARTE')
+        Paiement.objects.create(abonnement=abonnement, montant=Decimal('999'), status='EN_ATTENTE')
+        Charge.objects.create(titre='Loyer', montant=Decimal('1000'), date=timezone.now().date())
+        return seance
+
+    def test_rollup_updated_incrementally(self, seed, abonnement):
+        today = timezone.localdate()
+        assert AgregatFinancier.objects.get(date=today, dimension='REVENU').montant == Decimal('3050')
+        assert AgregatFinancier.objects.get(date=today, dimension='MODE_PAIEMENT', cle='CARTE').montant == Decimal('50')
+        assert AgregatFinancier.objects.get(date=today, dimension='ABONNEMENT', cle=str(abonnement.id)).nombre == 1
+        seances = AgregatFinancier.objects.get(date=today, dimension='SEANCE')
+        assert (seances.montant, seances.nombre, seances.heures) == (Decimal('3000'), 1, 2)
+        assert AgregatFinancier.objects.get(date=today, dimension='CHARGE').montant == Decimal('1000')
+
+        en_attente = Paiement.objects.get(status='EN_ATTENTE')
+        en_attente.status = 'PAYE'
+        en_attente.save()
+        assert AgregatFinancier.objects.get(date=today, dimension='REVENU').montant == Decimal('4049')
+
+        en_attente.delete()
+        Charge.objects.get().delete()
+        assert AgregatFinancier.objects.get(date=today, dimension='REVENU').montant == Decimal('3050')
+        assert AgregatFinancier.objects.get(date=today, dimension='CHARGE').montant == Decimal('0')
+
+    def test_rebuild_matches_incremental(self, seed):
+        incremental = [row for row in _rollup_snapshot() if row[4]]
+        reconstruire_agregats()
+        assert _rollup_snapshot() == incremental
+
+    def test_financial_report_reads_rollup(self, seed, abonnement, authenticated_admin_client):
+        url = reverse('financial-report')
+        with CaptureQueriesContext(connection) as ctx:
+            response = authenticated_admin_client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        assert not any('core_paiement' in q['sql'] for q in ctx.captured_queries)
+        data = response.data
+        assert data['total_revenue'] == Decimal('3050')
+        assert data['total_expenses'] == Decimal('1000')
+        assert data['profit'] == Decimal('2050')
+        month = timezone.localdate().strftime('%Y-%m')
+        assert data['monthly_stats'] == [
+            {'month': month, 'revenue': Decimal('3050'), 'expenses': Decimal('1000'), 'profit': Decimal('2050')}
+        ]
+        assert data['subscription_stats'][0]['abonnement_nom'] == abonnement.nom
+        assert data['session_stats'][0]['hours'] == 2
+
+    def test_financial_report_date_range(self, seed, authenticated_admin_client):
+        url = reverse('financial-report')
+        tomorrow = (timezone.localdate() + timedelta(days=1)).isoformat()
+        response = authenticated_admin_client.get(url, {'from': tomorrow})
+        assert response.data['total_revenue'] == 0
+        assert response.data['monthly_stats'] == []
+
+        response = authenticated_admin_client.get(url, {'from': 'not-a-date'})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+# ---------------------- Reservation Client Link Tests ----------------------
+
+@pytest.mark.django_db
+class TestReservationClientLink:
+    def test_create_links_reservation_to_client(self, authenticated_member_client, member_user, media_root):
+        url = reverse('reservation-list')
+        data = {'type_reservation': 'SEANCE', 'montant': '0', 'description': 'Séance libre'}
+        response = authenticated_member_client.post(url, data, format='json')
+        assert response.status_code == status.HTTP_201_CREATED
+        reservation = Reservation.objects.get(id=response.data['id'])
+        assert reservation.client == member_user
+        assert reservation.nom_client == 'Gym Member'
+
+    def test_client_listing_survives_name_change(self, authenticated_member_client, member_user):
+        Reservation.objects.create(client=member_user, nom_client='Gym Member', type_reservation='SEANCE', montant=0)
+        # Homonyme non rattaché : ne doit pas apparaître
+        Reservation.objects.create(nom_client='Gym Member', type_reservation='SEANCE', montant=0)
+        User.objects.filter(pk=member_user.pk).update(nom='Renamed')
+
+        response = authenticated_member_client.get(reverse('reservation-list'))
+        assert response.status_code == status.HTTP_200_OK
+        assert [r['client'] for r in response.data['results']] == [member_user.id]
+
+    def test_client_cannot_delete_other_reservation(self, authenticated_member_client, member_user):
+        autre = Reservation.objects.create(nom_client='Gym Member', type_reservation='SEANCE', montant=0)
+        url = reverse('reservation-detail', args=[autre.id])
+        response = authenticated_member_client.delete(url)
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+        assert Reservation.objects.filter(id=autre.id).exists()
+
+    def test_backfill_links_unambiguous_names(self, member_user):
+        User.objects.create_user(email='twin1@example.com', password='x', nom='Twin', prenom='Same', role='CLIENT')
+        User.objects.create_user(email='twin2@example.com', password='x', nom='Twin', prenom='Same', role='CLIENT')
+        mine = [Reservation.objects.create(nom_client='Gym Member', type_reservation='SEANCE', montant=0) for _ in range(3)]
+        twin = Reservation.objects.create(nom_client='Same Twin', type_reservation='SEANCE', montant=0)
+        stranger = Reservation.objects.create(nom_client='Nobody', type_reservation='SEANCE', montant=0)
+
+        call_command('backfill_reservation_clients', '--chunk-size', '2', stdout=StringIO())
+
+        assert all(r.client_id == member_user.id for r in Reservation.objects.filter(pk__in=[r.pk for r in mine]))
+        twin.refresh_from_db()
+        stranger.refresh_from_db()
+        assert twin.client_id is None
+        assert stranger.client_id is None
+
+
+# ---------------------- Reservation Validation Tests ----------------------
+
+@pytest.mark.django_db
+class TestValiderReservationSeance:
+    def _valider(self, client, reservation, donnees=None):
+        url = reverse('valider-reservation-seance', args=[reservation.id])
+        return client.post(url, donnees or {}, format='json')
+
+    def test_amount_defaults_to_reservation_amount(self, authenticated_employee_client, member_user):
+        reservation = Reservation.objects.create(client=member_user, nom_client='Gym Member', type_reservation='SEANCE',
+                                                 montant=Decimal('1500'), statut='EN_ATTENTE')
+        response = self._valider(authenticated_employee_client, reservation)
+        assert response.status_code == status.HTTP_200_OK
+        paiement = Paiement.objects.get(reservation=reservation)
+        assert paiement.montant == Decimal('1500')
+        assert paiement.client == member_user
+        assert paiement.seance is None
+        reservation.refresh_from_db()
+        assert reservation.statut == 'CONFIRMEE'
+        assert reservation.montant_paye == Decimal('1500')
+
+    def test_amount_from_request(self, authenticated_employee_client, member_user):
+        reservation = Reservation.objects.create(client=member_user, nom_client='Gym Member', type_reservation='SEANCE',
+                                                 montant=Decimal('1500'), statut='EN_ATTENTE')
+        response = self._valider(authenticated_employee_client, reservation, {'montant': '1200'})
+        assert response.status_code == status.HTTP_200_OK
+        assert Paiement.objects.get(reservation=reservation).montant == Decimal('1200')
+        reservation.refresh_from_db()
+        assert reservation.montant == reservation.montant_paye == Decimal('1200')
+
+
+# ---------------------- Performance Instrumentation Tests ----------------------
+
+@pytest.mark.django_db
+class TestPerformanceMiddleware:
+    def test_server_timing_header(self, authenticated_employee_client):
+        Reservation.objects.create(nom_client='A B', type_reservation='SEANCE', montant=0)
+        response = authenticated_employee_client.get(reverse('reservation-list'))
+        timing = response['Server-Timing']
+        for metric in ('total;dur=', 'db;dur=', 'pdf;dur=', 'serializer;dur='):
+            assert metric in timing
+        assert 'queries"' in timing
+
+    def test_structured_log_line(self, authenticated_employee_client, caplog):
+        with caplog.at_level(logging.INFO, logger='core.perf'):
+            authenticated_employee_client.get(reverse('reservation-list'))
+        record = [r for r in caplog.records if r.name == 'core.perf'][-1]
+        assert record.perf['path'] == '/api/reservations/'
+        assert record.perf['status'] == 200
+        assert record.perf['queries'] >= 1
+        assert record.perf['over_budget'] is False
+
+    def test_over_budget_request_is_flagged(self, authenticated_employee_client, settings, caplog):
+        settings.PERF_QUERY_BUDGET = 0
+        with caplog.at_level(logging.INFO, logger='core.perf'):
+            authenticated_employee_client.get(reverse('reservation-list'))
+        record = [r for r in caplog.records if r.name == 'core.perf'][-1]
+        assert record.levelno == logging.WARNING
+        assert record.perf['over_budget'] is True
+
+
+# ---------------------- Structured Logging Tests ----------------------
+
+class TestStructuredLogging:
+    def _record(self, niveau=logging.INFO, **extra):
+        record = logging.LogRecord('core.views', niveau, __file__, 1, 'Réservation %s', (42,), None)
+        record.__dict__.update(extra)
+        return record
+
+    def test_json_formatter_includes_extra_fields(self):
+        ligne = json.loads(JsonFormatter().format(self._record(perf={'queries': 3})))
+        assert ligne['level'] == 'INFO'
+        assert ligne['logger'] == 'core.views'
+        assert ligne['message'] == 'Réservation 42'
+        assert ligne['perf'] == {'queries': 3}
+        assert 'args' not in ligne
+
+    def test_debug_sampling(self):
+        filtre = DebugSamplingFilter(rate=0)
+        assert filtre.filter(self._record(logging.DEBUG)) is False
+        assert filtre.filter(self._record(logging.INFO)) is True
+        assert DebugSamplingFilter(rate=1).filter(self._record(logging.DEBUG)) is True
+
+    def test_per_module_levels(self):
+        loggers = niveaux_par_module(' core.views=debug, core.perf=WARNING ,invalide', 'ERROR')
+        assert loggers == {
+            'core': {'level': 'ERROR'},
+            'core.views': {'level': 'DEBUG'},
+            'core.perf': {'level': 'WARNING'},
+        }
+
+
+
+# ---------------------- Keyset Pagination Tests ----------------------
+
+@pytest.mark.django_db
+class TestKeysetPagination:
+    @pytest.fixture
+    def reservations(self):
+        # Moitié des réservations à la même date pour vérifier le départage par id
+        instant = timezone.now()
+        return [
+            Reservation.objects.create(
+                nom_client=f'Client {i}', type_reservation='SEANCE', montant=0,
+                created_at=instant if i % 2 else instant - timedelta(minutes=i)
+            )
+            for i in range(25)
+        ]
+
+    def _parcourir(self, client, url):
+        ids, pages = [], 0
+        while url:
+            response = client.get(url)
+            assert response.status_code == status.HTTP_200_OK
+            assert 'count' not in response.data
+            ids += [item['id'] for item in response.data['results']]
+            url, pages = response.data['next'], pages + 1
+        return ids, pages
+
+    def test_walks_all_items_newest_first(self, authenticated_employee_client, reservations):
+        ids, pages = self._parcourir(authenticated_employee_client, reverse('reservation-list') + '?page_size=10')
+        attendus = [r.id for r in sorted(reservations, key=lambda r: (r.created_at, r.id), reverse=True)]
+        assert ids == attendus
+        assert pages == 3
+
+    def test_no_count_query(self, authenticated_employee_client, reservations):
+        with CaptureQueriesContext(connection) as ctx:
+            authenticated_employee_client.get(reverse('reservation-list'))
+        assert not any('COUNT(' in q['sql'].upper() for q in ctx.captured_queries)
+
+    def test_page_size_is_bounded(self, authenticated_employee_client, reservations, monkeypatch):
+        from .pagination import KeysetPagination
+        monkeypatch.setattr(KeysetPagination, 'max_page_size', 5)
+        response = authenticated_employee_client.get(reverse('reservation-list') + '?page_size=1000')
+        assert len(response.data['results']) == 5
+
+    def test_previous_link(self, authenticated_employee_client, reservations):
+        premiere = authenticated_employee_client.get(reverse('reservation-list') + '?page_size=10').data
+        assert premiere['previous'] is None
+        deuxieme = authenticated_employee_client.get(premiere['next']).data
+        retour = authenticated_employee_client.get(deuxieme['previous']).data
+        assert [i['id'] for i in retour['results']] == [i['id'] for i in premiere['results']]
+        assert retour['previous'] is None
+
+    def test_invalid_cursor(self, authenticated_employee_client, reservations):
+        response = authenticated_employee_client.get(reverse('reservation-list') + '?cursor=invalide')
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+# ---------------------- Presential Payment Concurrency Tests ----------------------
+
+def _en_parallele(preparer, agir, arguments):
+    """
+    Un thread par argument : `preparer(argument)`, puis `agir(resultat)` une fois tous les
+    threads prêts, réessayé tant que SQLite est verrouillé. Retourne les valeurs de `agir`.
+    """
+    from django.db import OperationalError, connections
+    import threading
+
+    depart = threading.Barrier(len(arguments))
+    resultats = []
+
+    def executer(argument):
+        objet = preparer(argument)
+        depart.wait()
+        try:
+            for _ in range(200):
+                try:
+                    resultats.append(agir(objet))
+                    return
+                except OperationalError:
+                    # SQLite en mémoire partagée : table verrouillée par un autre thread, on réessaie
+                    time.sleep(0.01)
+            raise AssertionError('Verrou SQLite jamais libéré')
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=executer, args=(argument,)) for argument in arguments]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return resultats
+
+
+def _payer_en_parallele(abonnement_id, montants):
+    """Enregistre une tranche par thread, tous démarrés ensemble ; retourne le nombre de refus."""
+    from django.core.exceptions import ValidationError
+
+    def preparer(montant):
+        # Instance lue avant le départ : un read-modify-write perdrait les paiements concurrents
+        return AbonnementClientPresentiel.objects.get(pk=abonnement_id), montant
+
+    def payer(objet):
+        abonnement, montant = objet
+        try:
+            PaiementTranche.objects.create(abonnement_presentiel=abonnement, montant=montant)
+        except ValidationError:
+            return False
+        return True
+
+    return _en_parallele(preparer, payer, montants).count(False)
+
+
+@pytest.mark.django_db(transaction=True)
+class TestPaiementPresentielConcurrent:
+    @pytest.fixture
+    def presentiel(self, abonnement):
+        abonnement.prix = Decimal('1000.00')
+        abonnement.save()
+        return AbonnementClientPresentiel.objects.create(
+            client_nom='Doe', client_prenom='John', abonnement=abonnement, date_debut=timezone.localdate()
+        )
+
+    def test_parallel_tranches_are_all_counted(self, presentiel):
+        refus = _payer_en_parallele(presentiel.pk, [Decimal('25.00')] * 8)
+        presentiel.refresh_from_db()
+        assert refus == 0
+        assert presentiel.montant_paye == Decimal('200.00')
+        assert presentiel.paiements_tranches.count() == 8
+        assert presentiel.statut_paiement == 'PAIEMENT_INACHEVE'
+
+    def test_total_is_never_exceeded(self, presentiel):
+        refus = _payer_en_parallele(presentiel.pk, [Decimal('300.00')] * 6)
+        presentiel.refresh_from_db()
+        assert refus == 3
+        assert presentiel.montant_paye == Decimal('900.00')
+        assert presentiel.paiements_tranches.count() == 3
+
+    def test_status_recomputed_in_same_update(self, presentiel):
+        with CaptureQueriesContext(connection) as ctx:
+            assert presentiel.crediter(Decimal('1000.00'))
+        assert sum(q['sql'].startswith('UPDATE') for q in ctx.captured_queries) == 1
+        assert presentiel.montant_paye == Decimal('1000.00')
+        assert presentiel.statut_paiement == 'PAIEMENT_TERMINE'
+        assert not presentiel.crediter(Decimal('0.01'))
+
+
+# ---------------------- PDF Render Cache Tests ----------------------
+
+@pytest.mark.django_db
+class TestPdfRenderCache:
+    @pytest.fixture
+    def seance_payee(self, media_root):
+        seance = Seance.objects.create(client_nom='Doe', client_prenom='John', nombre_heures=2, montant_paye=Decimal('3000'))
+        paiement = Paiement.objects.create(seance=seance, montant=Decimal('3000'), status='PAYE')
+        return seance, paiement
+
+    def test_identical_ticket_is_rendered_once(self, seance_payee, media_root):
+        from . import utils
+        seance, paiement = seance_payee
+        with patch('core.utils._mise_en_page', wraps=utils._mise_en_page) as mise_en_page:
+            premier = utils.generer_facture_pdf(seance, paiement, type_ticket='SEANCE')
+            second = utils.generer_facture_pdf(seance, paiement, type_ticket='SEANCE')
+        assert premier == second
+        assert mise_en_page.call_count == 1
+        assert (media_root / premier).read_bytes().startswith(b'%PDF')
+        assert len(list((media_root / 'tickets').iterdir())) == 1
+
+    def test_changed_content_is_rendered_again(self, seance_payee):
+        from .utils import generer_facture_pdf
+        seance, paiement = seance_payee
+        premier = generer_facture_pdf(seance, paiement, type_ticket='SEANCE')
+        seance.nombre_heures = 3
+        assert generer_facture_pdf(seance, paiement, type_ticket='SEANCE') != premier
+
+    def test_metrics_endpoint(self, seance_payee, authenticated_admin_client):
+        from . import metrics
+        from .utils import generer_facture_pdf
+        seance, paiement = seance_payee
+        metrics._en_attente.clear()
+        for _ in range(3):
+            generer_facture_pdf(seance, paiement, type_ticket='SEANCE')
+        response = authenticated_admin_client.get(reverse('metrics'))
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data == {'pdf_cache_hit': 2, 'pdf_cache_miss': 1}
+
+    def test_revalidation_reuses_layout(self, employee_user, media_root):
+        from pypdf import PdfReader
+        from rest_framework.test import APIRequestFactory, force_authenticate
+        from . import metrics, utils
+        from .views import ReservationViewSet
+        metrics._en_attente.clear()
+        reservation = Reservation.objects.create(nom_client='Doe', type_reservation='SEANCE', montant=0)
+        tickets = []
+        with patch('core.utils._mise_en_page', wraps=utils._mise_en_page) as mise_en_page:
+            for _ in range(2):
+                # Réservation remise en attente puis validée de nouveau : ancien ticket supprimé, nouvel uuid
+                Reservation.objects.filter(pk=reservation.pk).update(statut='EN_ATTENTE')
+                request = APIRequestFactory().post('/', {'montant': '1500'}, format='json')
+                force_authenticate(request, employee_user)
+                response = ReservationViewSet.as_view({'post': 'valider'})(request, pk=reservation.pk)
+                assert response.status_code == status.HTTP_200_OK
+                traiter_taches()
+                tickets.append(Ticket.objects.get(paiement__reservation=reservation))
+        assert mise_en_page.call_count == 1
+        assert metrics.valeurs() == {'pdf_cache_hit': 1, 'pdf_cache_miss': 1}
+        assert tickets[0].uuid != tickets[1].uuid
+        for ticket in tickets:
+            texte = PdfReader(media_root / ticket.fichier_pdf.name).pages[0].extract_text()
+            assert str(ticket.uuid) in texte
+
+    def test_counters_are_buffered(self, seance_payee, settings):
+        from . import metrics
+        from .models import CompteurMetrique
+        from .utils import generer_facture_pdf
+        seance, paiement = seance_payee
+        metrics._en_attente.clear()
+        settings.METRICS_FLUSH_SECONDS = 3600
+        generer_facture_pdf(seance, paiement, type_ticket='SEANCE')
+        with CaptureQueriesContext(connection) as ctx:
+            generer_facture_pdf(seance, paiement, type_ticket='SEANCE')
+        assert not any('core_compteurmetrique' in q['sql'] for q in ctx.captured_queries)
+        assert not CompteurMetrique.objects.exists()
+        assert metrics.valeurs() == {'pdf_cache_hit': 1, 'pdf_cache_miss': 1}
+
+
+# ---------------------- API Benchmark Tests ----------------------
+
+@pytest.mark.django_db
+class TestBenchApi:
+    def test_small_run_produces_results_for_every_scenario(self, media_root):
+        from .bench import SCENARIOS, executer, peupler
+        comptes = peupler(clients=20, paiements=60, presentiels=3, jours=30)
+        assert Paiement.objects.filter(status='PAYE').count() == 60
+        assert AgregatFinancier.objects.exists()
+
+        resultats = executer(comptes, repetitions=2)
+        par_nom = {r['scenario']: r for r in resultats}
+        assert set(par_nom) == {s[0] for s in SCENARIOS} | {'pdf_worker'}
+        for resultat in resultats:
+            assert resultat['runs'] >= 1
+            assert resultat['p95_ms'] >= resultat['p50_ms'] > 0
+            assert all(code < 400 for code in resultat['statuses'])
+        assert not par_nom['reservations_list']['over_budget']
+        assert not par_nom['paiements_list']['over_budget']
+        json.dumps(resultats)
+
+
+# ---------------------- Presential Subscription List Tests ----------------------
+
+@pytest.mark.django_db
+class TestAbonnementPresentielList:
+    def _creer(self, abonnement, employe, nombre):
+        for i in range(nombre):
+            presentiel = AbonnementClientPresentiel.objects.create(
+                client_nom=f'Nom{i}', client_prenom='Client', abonnement=abonnement,
+                date_debut=timezone.localdate(), employe_creation=employe
+            )
+            for _ in range(2):
+                PaiementTranche.objects.create(abonnement_presentiel=presentiel, montant=Decimal('10'), employe=employe)
+                HistoriquePaiement.objects.create(abonnement_presentiel=presentiel, montant_ajoute=Decimal('10'),
+                                                  montant_total_apres=Decimal('10'), employe=employe)
+
+    def _requetes(self, client, params=None):
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get(reverse('abonnementclientpresentiel-list'), params)
+        assert response.status_code == status.HTTP_200_OK
+        return len(ctx.captured_queries), response
+
+    def test_query_count_is_constant(self, authenticated_employee_client, employee_user, abonnement):
+        self._creer(abonnement, employee_user, 1)
+        petit, _ = self._requetes(authenticated_employee_client)
+        self._creer(abonnement, employee_user, 4)
+        grand, response = self._requetes(authenticated_employee_client)
+        assert petit == grand
+        item = response.data['results'][0]
+        assert len(item['paiements_tranches']) == 2
+        assert item['paiements_tranches'][0]['employe_nom'] == employee_user.nom
+        assert item['historique_paiements'][0]['client_prenom'] == 'Client'
+        assert item['employe_nom'] == employee_user.nom
+
+    def test_summary_mode_omits_histories(self, authenticated_employee_client, employee_user, abonnement):
+        self._creer(abonnement, employee_user, 3)
+        complet, _ = self._requetes(authenticated_employee_client)
+        resume, response = self._requetes(authenticated_employee_client, {'resume': 1})
+        item = response.data['results'][0]
+        assert 'paiements_tranches' not in item
+        assert 'historique_paiements' not in item
+        assert item['abonnement_nom'] == abonnement.nom
+        assert resume < complet
+
+
+# ---------------------- Unified Receipt Tests ----------------------
+
+@pytest.mark.django_db
+class TestRecuUnique:
+    def test_paid_payment_gets_one_deferred_receipt(self, media_root, django_capture_on_commit_callbacks):
+        with patch('core.jobs.generer_facture_pdf') as rendu:
+            with django_capture_on_commit_callbacks(execute=True):
+                paiement = Paiement.objects.create(montant=Decimal('2000'), status='PAYE')
+            rendu.assert_not_called()
+
+        ticket = Ticket.objects.get(paiement=paiement)
+        facture = Facture.objects.get(paiement=paiement)
+        assert ticket.statut == 'EN_ATTENTE'
+        assert not facture.fichier_pdf
+
+        assert traiter_taches() == (1, 0)
+        ticket.refresh_from_db()
+        facture.refresh_from_db()
+        assert ticket.est_pret
+        assert facture.fichier_pdf.name == ticket.fichier_pdf.name
+        # Mise en page partagée (clé de contenu) et sa copie portant le code d'entrée du ticket
+        fichiers = sorted(f.name for f in (media_root / 'tickets').iterdir())
+        assert len(fichiers) == 2 and ticket.fichier_pdf.name.endswith(f'{ticket.uuid.hex}.pdf')
+
+    def test_receipt_scheduled_only_when_payment_becomes_paid(self, django_capture_on_commit_callbacks):
+        with django_capture_on_commit_callbacks() as callbacks:
+            paiement = Paiement.objects.create(montant=Decimal('2000'), status='EN_ATTENTE')
+        assert callbacks == []
+        with patch('core.signals.assurer_recu') as assurer:
+            with django_capture_on_commit_callbacks(execute=True):
+                paiement.status = 'PAYE'
+                paiement.save()
+            assert assurer.call_count == 1
+            with django_capture_on_commit_callbacks(execute=True):
+                paiement.montant = Decimal('2500')
+                paiement.save()
+            assert assurer.call_count == 1
+
+    def test_view_ticket_and_receipt_share_one_render(self, authenticated_employee_client, media_root,
+                                                      django_capture_on_commit_callbacks):
+        from . import jobs
+        data = {'date_jour': '2025-07-10', 'client_nom': 'Doe', 'client_prenom': 'John',
+                'nombre_heures': 1, 'montant_paye': '1500.00'}
+        with django_capture_on_commit_callbacks(execute=True):
+            response = authenticated_employee_client.post(reverse('seance-directe'), data, format='json')
+        assert response.status_code == status.HTTP_201_CREATED
+
+        ticket = Ticket.objects.get(id=response.data['ticket_id'])
+        assert TacheDocument.objects.filter(ticket=ticket).count() == 1
+        assert TacheDocument.objects.get(ticket=ticket).source_modele == 'Seance'
+
+        with patch('core.jobs.generer_facture_pdf', wraps=jobs.generer_facture_pdf) as rendu:
+            traiter_taches()
+        assert rendu.call_count == 1
+        ticket.refresh_from_db()
+        assert Facture.objects.get(paiement=ticket.paiement).fichier_pdf.name == ticket.fichier_pdf.name
+
+
+# ---------------------- Lazy Ticket Tests ----------------------
+
+def _rendu_lent(source, paiement, type_ticket='SEANCE', dossier='tickets'):
+    time.sleep(0.2)
+    return f'{dossier}/ticket_{type_ticket.lower()}_{paiement.pk}.pdf'
+
+
+@pytest.mark.django_db
+class TestTicketALaDemande:
+    def _reserver(self, client):
+        data = {'type_reservation': 'SEANCE', 'montant': '2000', 'description': 'Séance libre'}
+        with patch('core.jobs.generer_facture_pdf') as rendu:
+            response = client.post(reverse('reservation-list'), data, format='json')
+            rendu.assert_not_called()
+        assert response.status_code == status.HTTP_201_CREATED
+        return Ticket.objects.get(paiement__reservation_id=response.data['id'])
+
+    def test_reservation_ticket_is_not_rendered_at_creation(self, authenticated_member_client, media_root):
+        ticket = self._reserver(authenticated_member_client)
+        assert ticket.statut == 'A_LA_DEMANDE'
+        assert (ticket.source_modele, ticket.type_ticket) == ('Reservation', 'SEANCE')
+        assert not ticket.fichier_pdf
+        assert not TacheDocument.objects.filter(ticket=ticket).exists()
+
+        response = authenticated_member_client.get(reverse('reservation-list'))
+        assert response.data['results'][0]['ticket_url'].endswith(reverse('ticket-pdf', args=[ticket.pk]))
+
+    def test_first_download_renders_once(self, authenticated_member_client, media_root):
+        from . import jobs
+        ticket = self._reserver(authenticated_member_client)
+        url = reverse('ticket-pdf', args=[ticket.pk])
+
+        with patch('core.jobs.generer_facture_pdf', wraps=jobs.generer_facture_pdf) as rendu:
+            premiere = authenticated_member_client.get(url)
+            seconde = authenticated_member_client.get(url)
+        assert rendu.call_count == 1
+        assert premiere.status_code == seconde.status_code == status.HTTP_200_OK
+        assert premiere['Content-Type'] == 'application/pdf'
+        assert b''.join(premiere.streaming_content).startswith(b'%PDF')
+        ticket.refresh_from_db()
+        assert ticket.est_pret
+        assert ticket.rendu_demande_le is None
+
+    def test_worker_ticket_is_not_rendered_by_download(self, authenticated_employee_client, employee_user, media_root):
+        seance = Seance.objects.create(client_nom='Doe', client_prenom='Jane', montant_paye=Decimal('1000'))
+        paiement = Paiement.objects.create(seance=seance, montant=Decimal('1000'), status='EN_ATTENTE')
+        ticket = planifier_ticket(paiement, seance, type_ticket='SEANCE')
+        with patch('core.jobs.generer_facture_pdf') as rendu:
+            response = authenticated_employee_client.get(reverse('ticket-pdf', args=[ticket.pk]))
+        rendu.assert_not_called()
+        assert response.status_code == status.HTTP_202_ACCEPTED
+        assert response.data['ticket_statut'] == 'EN_ATTENTE'
+
+    def test_failed_render_can_be_retried(self, authenticated_member_client, media_root):
+        from .jobs import materialiser_ticket
+        ticket = self._reserver(authenticated_member_client)
+        with patch('core.jobs.generer_facture_pdf', side_effect=RuntimeError('boom')):
+            with pytest.raises(RuntimeError):
+                materialiser_ticket(ticket)
+        ticket.refresh_from_db()
+        assert ticket.statut == 'A_LA_DEMANDE'
+        assert materialiser_ticket(ticket).est_pret
+
+    def test_client_cannot_download_other_ticket(self, authenticated_member_client, employee_user, media_root):
+        reservation = Reservation.objects.create(nom_client='Autre', type_reservation='SEANCE', montant=0)
+        paiement = Paiement.objects.create(reservation=reservation, montant=Decimal('0'), status='EN_ATTENTE')
+        ticket = planifier_ticket(paiement, reservation, type_ticket='SEANCE', differe=True)
+        response = authenticated_member_client.get(reverse('ticket-pdf', args=[ticket.pk]))
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db(transaction=True)
+class TestTicketALaDemandeConcurrent:
+    def test_concurrent_first_downloads_render_once(self, media_root):
+        from .jobs import materialiser_ticket
+
+        reservation = Reservation.objects.create(nom_client='Doe', type_reservation='SEANCE', montant=0)
+        paiement = Paiement.objects.create(reservation=reservation, montant=Decimal('0'), status='EN_ATTENTE')
+        ticket_id = planifier_ticket(paiement, reservation, type_ticket='SEANCE', differe=True).pk
+
+        with patch('core.jobs.generer_facture_pdf', side_effect=_rendu_lent) as rendu:
+            statuts = _en_parallele(
+                lambda _: Ticket.objects.get(pk=ticket_id),
+                lambda ticket: materialiser_ticket(ticket).statut,
+                range(6),
+            )
+        assert rendu.call_count == 1
+        assert statuts == ['PRET'] * 6
+
+
+# ---------------------- Document Download Tests ----------------------
+
+@pytest.mark.django_db
+class TestDocumentDownload:
+    @pytest.fixture
+    def facture(self, media_root):
+        (media_root / 'factures').mkdir()
+        (media_root / 'factures' / 'recu.pdf').write_bytes(b'%PDF-1.4 ' + b'x' * 991)
+        paiement = Paiement.objects.create(montant=Decimal('1000'), status='EN_ATTENTE')
+        return Facture.objects.create(paiement=paiement, fichier_pdf='factures/recu.pdf')
+
+    def _url(self, facture):
+        return reverse('document-telecharger', args=['facture', facture.pk])
+
+    def test_full_download_with_validators(self, authenticated_employee_client, facture):
+        response = authenticated_employee_client.get(self._url(facture))
+        assert response.status_code == status.HTTP_200_OK
+        assert b''.join(response.streaming_content).startswith(b'%PDF')
+        assert response['Accept-Ranges'] == 'bytes'
+        assert response['ETag'] and response['Last-Modified']
+        assert 'recu.pdf' in response['Content-Disposition']
+
+    def test_conditional_request_returns_304(self, authenticated_employee_client, facture):
+        etag = authenticated_employee_client.get(self._url(facture))['ETag']
+        response = authenticated_employee_client.get(self._url(facture), HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert not response.content
+
+    def test_range_request(self, authenticated_employee_client, facture):
+        response = authenticated_employee_client.get(self._url(facture), HTTP_RANGE='bytes=0-3')
+        assert response.status_code == status.HTTP_206_PARTIAL_CONTENT
+        assert response.content == b'%PDF'
+        assert response['Content-Range'] == 'bytes 0-3/1000'
+
+        response = authenticated_employee_client.get(self._url(facture), HTTP_RANGE='bytes=-10')
+        assert response['Content-Range'] == 'bytes 990-999/1000'
+
+        response = authenticated_employee_client.get(self._url(facture), HTTP_RANGE='bytes=5000-')
+        assert response.status_code == status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE
+        assert response['Content-Range'] == 'bytes */1000'
+
+    def test_stale_if_range_returns_full_file(self, authenticated_employee_client, facture):
+        response = authenticated_employee_client.get(self._url(facture), HTTP_RANGE='bytes=0-3',
+                                                     HTTP_IF_RANGE='"autre-version"')
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_offload_modes(self, authenticated_employee_client, facture, settings, media_root):
+        settings.DOCUMENTS_OFFLOAD = 'x-accel-redirect'
+        response = authenticated_employee_client.get(self._url(facture))
+        assert response['X-Accel-Redirect'] == '/protected-media/factures/recu.pdf'
+        assert not response.content
+
+        settings.DOCUMENTS_OFFLOAD = 'x-sendfile'
+        response = authenticated_employee_client.get(self._url(facture))
+        assert response['X-Sendfile'] == str(media_root / 'factures' / 'recu.pdf')
+
+    def test_client_only_gets_own_documents(self, authenticated_member_client, member_user, facture):
+        assert authenticated_member_client.get(self._url(facture)).status_code == status.HTTP_404_NOT_FOUND
+        Paiement.objects.filter(pk=facture.paiement_id).update(client=member_user)
+        assert authenticated_member_client.get(self._url(facture)).status_code == status.HTTP_200_OK
+
+
+# ---------------------- Subscription Catalogue Tests ----------------------
+
+@pytest.mark.django_db
+class TestReservationAbonnement:
+    def _valider(self, employee_user, reservation, montant):
+        # L'action du routeur est masquée par ValiderReservationSeanceView : appel direct du viewset
+        from rest_framework.test import APIRequestFactory, force_authenticate
+        from .views import ReservationViewSet
+        request = APIRequestFactory().post('/', {'montant': montant}, format='json')
+        force_authenticate(request, employee_user)
+        return ReservationViewSet.as_view({'post': 'valider'})(request, pk=reservation.pk)
+
+    def test_creation_stores_subscription(self, authenticated_member_client, abonnement, media_root):
+        data = {'type_reservation': 'ABONNEMENT', 'montant': '50', 'description': 'Abonnement Test'}
+        response = authenticated_member_client.post(reverse('reservation-list'), data, format='json')
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.data['abonnement'] == abonnement.id
+        assert Reservation.objects.get(id=response.data['id']).abonnement == abonnement
+
+    def test_validation_uses_stored_subscription(self, employee_user, abonnement, media_root):
+        from . import catalogue
+        reservation = Reservation.objects.create(nom_client='Doe', type_reservation='ABONNEMENT', montant=0,
+                                                 abonnement=abonnement, description='sans indice')
+        catalogue.abonnements()  # catalogue déjà chargé par une requête précédente
+        with CaptureQueriesContext(connection) as ctx:
+            response = self._valider(employee_user, reservation, '60')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert not [q for q in ctx.captured_queries if 'core_abonnement' in q['sql']]
+
+        response = self._valider(employee_user, reservation, '50')
+        assert response.status_code == status.HTTP_200_OK
+        reservation.refresh_from_db()
+        assert reservation.statut == 'CONFIRMEE'
+        assert reservation.montant == Decimal('50.00')
+
+    def test_catalogue_invalidated_on_write(self, abonnement, django_capture_on_commit_callbacks):
+        from . import catalogue
+        assert catalogue.abonnement(abonnement.pk).prix == Decimal('50.00')
+        with django_capture_on_commit_callbacks(execute=True):
+            abonnement.prix = Decimal('75.00')
+            abonnement.save()
+            # Pas encore commité : le catalogue garde l'ancienne version
+            assert catalogue.abonnement(abonnement.pk).prix == Decimal('50.00')
+        assert catalogue.abonnement(abonnement.pk).prix == Decimal('75.00')
+        pk = abonnement.pk
+        with django_capture_on_commit_callbacks(execute=True):
+            abonnement.delete()
+        assert catalogue.abonnement(pk) is None
+
+    def test_reload_after_concurrent_invalidation(self, abonnement):
+        from . import catalogue
+
+        class InvalideAvantVerrou:
+            # invalider() passe entre la lecture de la copie expirée et la prise du verrou
+            def __enter__(self):
+                catalogue._etat['abonnements'] = None
+
+            def __exit__(self, *exc):
+                return False
+
+        catalogue.abonnements()
+        catalogue._etat['charge_le'] = 0.0
+        with patch.object(catalogue, '_verrou', InvalideAvantVerrou()):
+            assert catalogue.abonnement(abonnement.pk).pk == abonnement.pk
+
+
+@pytest.mark.django_db
+class TestCatalogueConditionnel:
+    def test_list_revalidates_without_reading_catalogue(self, authenticated_admin_client, abonnement):
+        url = reverse('abonnement-list')
+        response = authenticated_admin_client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        assert [a['nom'] for a in response.data['results']] == ['Abonnement Test']
+        assert 'must-revalidate' in response['Cache-Control']
+        etag = response['ETag']
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = authenticated_admin_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert response['ETag'] == etag
+        assert not [q for q in ctx.captured_queries if 'core_abonnement' in q['sql']]
+
+    def test_write_changes_etag(self, authenticated_admin_client, abonnement, django_capture_on_commit_callbacks):
+        url = reverse('abonnement-detail', args=[abonnement.id])
+        etag = authenticated_admin_client.get(url)['ETag']
+        assert authenticated_admin_client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == status.HTTP_304_NOT_MODIFIED
+
+        with django_capture_on_commit_callbacks(execute=True):
+            authenticated_admin_client.patch(url, {'prix': '60.00'}, format='json')
+        response = authenticated_admin_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['prix'] == '60.00'
+        assert response['ETag'] != etag
+
+    def test_search_and_missing_detail(self, authenticated_admin_client, abonnement):
+        Abonnement.objects.create(nom='Gold', prix=Decimal('100'), duree_jours=30)
+        response = authenticated_admin_client.get(reverse('abonnement-list'), {'search': 'gol'})
+        assert [a['nom'] for a in response.data['results']] == ['Gold']
+        response = authenticated_admin_client.get(reverse('abonnement-detail', args=[999]))
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+# ---------------------- Bulk Presence Tests ----------------------
+
+@pytest.mark.django_db
+class TestPresenceBulk:
+    @pytest.fixture
+    def equipe(self):
+        return [
+            Personnel.objects.create(nom=f'Nom{i}', prenom=f'Prenom{i}', date_emploi='2024-01-01', categorie='COACH')
+            for i in range(5)
+        ]
+
+    def _feuille(self, equipe, employee_user, statut='PRESENT'):
+        lignes = [{'personnel_id': p.id, 'statut': statut, 'heure_arrivee': '08:15'} for p in equipe]
+        lignes.append({'employe_id': employee_user.id, 'statut': 'ABSENT', 'heure_arrivee': '09:00'})
+        return {'date_jour': '2025-07-10', 'presences': lignes}
+
+    def test_whole_day_in_one_request(self, authenticated_employee_client, employee_user, equipe):
+        url = reverse('presencepersonnel-bulk')
+        with CaptureQueriesContext(connection) as ctx:
+            response = authenticated_employee_client.post(url, self._feuille(equipe, employee_user), format='json')
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data == {'date_jour': '2025-07-10', 'enregistrees': 6}
+        assert PresencePersonnel.objects.filter(date_jour='2025-07-10').count() == 6
+        assert PresencePersonnel.objects.get(employe=employee_user).heure_arrivee is None
+        assert sum(q['sql'].startswith('INSERT') for q in ctx.captured_queries) == 2
+
+    def test_resubmission_is_idempotent(self, authenticated_employee_client, employee_user, equipe):
+        url = reverse('presencepersonnel-bulk')
+        authenticated_employee_client.post(url, self._feuille(equipe, employee_user), format='json')
+        response = authenticated_employee_client.post(url, self._feuille(equipe, employee_user, 'ABSENT'),
+                                                      format='json')
+        assert response.status_code == status.HTTP_200_OK
+        presences = PresencePersonnel.objects.filter(date_jour='2025-07-10')
+        assert presences.count() == 6
+        assert set(presences.values_list('statut', flat=True)) == {'ABSENT'}
+
+    def test_invalid_lines_are_reported(self, authenticated_employee_client, employee_user, equipe):
+        feuille = self._feuille(equipe, employee_user)
+        feuille['presences'] += [{'personnel_id': 9999}, {'personnel_id': equipe[0].id, 'employe_id': employee_user.id}]
+        response = authenticated_employee_client.post(reverse('presencepersonnel-bulk'), feuille, format='json')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert len(response.data['presences']) == 8
+        assert not PresencePersonnel.objects.exists()
+
+        feuille = self._feuille(equipe, employee_user)
+        feuille['presences'].append({'personnel_id': equipe[0].id})
+        response = authenticated_employee_client.post(reverse('presencepersonnel-bulk'), feuille, format='json')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'personnel_id' in response.data['presences'][6]
+
+    def test_single_create_rejects_duplicate_day(self, employee_user):
+        client = APIClient()
+        client.force_authenticate(employee_user)
+        data = {'employe_id': employee_user.id, 'date_jour': '2025-07-10', 'statut': 'PRESENT'}
+        assert client.post(reverse('presencepersonnel-list'), data, format='json').status_code == status.HTTP_201_CREATED
+        response = client.post(reverse('presencepersonnel-list'), data, format='json')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert PresencePersonnel.objects.count() == 1
+
+    def test_update_rejects_duplicate_day(self, employee_user):
+        client = APIClient()
+        client.force_authenticate(employee_user)
+        PresencePersonnel.objects.create(employe=employee_user, date_jour='2025-07-10', statut='PRESENT')
+        autre = PresencePersonnel.objects.create(employe=employee_user, date_jour='2025-07-11', statut='ABSENT')
+        url = reverse('presencepersonnel-detail', args=[autre.id])
+        data = {'employe_id': employee_user.id, 'date_jour': '2025-07-10', 'statut': 'ABSENT'}
+        for methode in (client.put, client.patch):
+            response = methode(url, data, format='json')
+            assert response.status_code == status.HTTP_400_BAD_REQUEST
+            assert 'date_jour' in response.data
+        autre.refresh_from_db()
+        assert str(autre.date_jour) == '2025-07-11'
+
+
+# ---------------------- Attendance Statistics Tests ----------------------
+
+@pytest.mark.django_db
+class TestStatistiquesPresence:
+    @pytest.fixture(autouse=True)
+    def cache_vide(self):
+        from django.core.cache import cache
+        cache.clear()
+
+    @pytest.fixture
+    def presences(self, employee_user):
+        coach = Personnel.objects.create(nom='Coach', prenom='Alice', date_emploi='2024-01-01', categorie='COACH')
+        for jour, statut, heure in [('2025-05-30', 'PRESENT', '08:00'), ('2025-06-02', 'PRESENT', '09:10'),
+                                    ('2025-06-03', 'ABSENT', None)]:
+            PresencePersonnel.objects.create(personnel=coach, date_jour=jour, statut=statut, heure_arrivee=heure)
+        PresencePersonnel.objects.create(employe=employee_user, date_jour='2025-06-02', statut='PRESENT',
+                                         heure_arrivee='08:20')
+        return coach
+
+    def _stats(self, client, **params):
+        response = client.get(reverse('presencepersonnel-statistiques'), params)
+        assert response.status_code == status.HTTP_200_OK
+        return response.data
+
+    def test_counts_per_person_and_day(self, authenticated_admin_client, presences, employee_user):
+        data = self._stats(authenticated_admin_client, **{'from': '2025-05-01', 'to': '2025-06-30'})
+        lignes = {(l['personnel_id'], l['employe_id']): l for l in data['par_personne']}
+        coach = lignes[(presences.id, None)]
+        assert (coach['presents'], coach['absents'], coach['retards']) == (2, 1, 1)
+        assert lignes[(None, employee_user.id)]['nom'] == employee_user.nom
+        assert [j['date_jour'] for j in data['par_jour']] == ['2025-05-30', '2025-06-02', '2025-06-03']
+        assert data['par_jour'][1] == {'date_jour': '2025-06-02', 'presents': 2, 'absents': 0, 'retards': 1}
+        assert data['totaux'] == {'presents': 3, 'absents': 1, 'retards': 1}
+
+        data = self._stats(authenticated_admin_client, **{'from': '2025-05-01', 'to': '2025-06-30',
+                                                         'heure_limite': '07:30'})
+        assert data['totaux']['retards'] == 3
+
+    def test_closed_month_is_cached_until_written(self, authenticated_admin_client, presences):
+        params = {'from': '2025-06-01', 'to': '2025-06-30'}
+        self._stats(authenticated_admin_client, **params)
+        with CaptureQueriesContext(connection) as ctx:
+            data = self._stats(authenticated_admin_client, **params)
+        assert not [q for q in ctx.captured_queries if 'core_presencepersonnel' in q['sql']]
+        assert data['totaux']['presents'] == 2
+
+        PresencePersonnel.objects.filter(date_jour='2025-06-03').get().delete()
+        data = self._stats(authenticated_admin_client, **params)
+        assert data['totaux'] == {'presents': 2, 'absents': 0, 'retards': 1}
+
+    def test_closed_month_cache_expires(self, authenticated_admin_client, presences, settings):
+        from django.core.cache import cache
+        settings.PRESENCE_CACHE_TTL_SECONDS = 120
+        with patch.object(cache, 'set', wraps=cache.set) as mise_en_cache:
+            self._stats(authenticated_admin_client, **{'from': '2025-06-01', 'to': '2025-06-30'})
+            PresencePersonnel.objects.filter(date_jour='2025-06-03').get().delete()
+        # Invalidation invisible des autres processus : aucun résultat ni version gardé sans limite
+        appels = [appel for appel in mise_en_cache.call_args_list if appel.args[0].startswith('presences:')]
+        assert len(appels) == 2
+        assert all(appel.args[2] == 120 for appel in appels)
+
+    def test_invalid_parameters(self, authenticated_admin_client):
+        url = reverse('presencepersonnel-statistiques')
+        assert authenticated_admin_client.get(url, {'from': '2025-07-01', 'to': '2025-06-01'}).status_code == 400
+        assert authenticated_admin_client.get(url, {'heure_limite': '8h'}).status_code == 400
+
+
+# ---------------------- Subscription Expiry Tests ----------------------
+
+@pytest.mark.django_db
+class TestExpirationAbonnements:
+    @pytest.fixture
+    def echus(self, abonnement, member_user):
+        aujourd_hui = timezone.localdate()
+        presentiels = [
+            AbonnementClientPresentiel.objects.create(client_nom='Doe', client_prenom=str(i), abonnement=abonnement,
+                                                      date_debut=aujourd_hui)
+            for i in range(5)
+        ]
+        # Échus depuis hier pour les trois premiers, sans passage par save()
+        AbonnementClientPresentiel.objects.filter(pk__in=[p.pk for p in presentiels[:3]]).update(
+            date_fin=aujourd_hui - timedelta(days=1))
+        clients = [
+            AbonnementClient.objects.create(client=member_user, abonnement=abonnement, date_debut=aujourd_hui,
+                                            date_fin=aujourd_hui + timedelta(days=delta))
+            for delta in (-10, -1, 0)
+        ]
+        return presentiels, clients
+
+    def test_expires_due_subscriptions_in_batches(self, echus):
+        from .expiration import expirer_abonnements
+        presentiels, clients = echus
+        with CaptureQueriesContext(connection) as ctx:
+            resultat = expirer_abonnements(taille_lot=2)
+        assert resultat == {'AbonnementClientPresentiel': 3, 'AbonnementClient': 2}
+        assert sum(q['sql'].startswith('UPDATE') for q in ctx.captured_queries) == 3
+
+        statuts = dict(AbonnementClientPresentiel.objects.values_list('id', 'statut'))
+        assert [statuts[p.pk] for p in presentiels] == ['EXPIRE'] * 3 + ['EN_COURS'] * 2
+        assert [AbonnementClient.objects.get(pk=c.pk).actif for c in clients] == [False, False, True]
+
+        journal = ExpirationAbonnement.objects.filter(modele='AbonnementClientPresentiel').order_by('id')
+        assert [j.nombre for j in journal] == [2, 1]
+        assert sorted(sum((j.identifiants for j in journal), [])) == sorted(p.pk for p in presentiels[:3])
+
+    def test_rerun_changes_nothing(self, echus):
+        call_command('expirer_abonnements', stdout=StringIO())
+        nombre_lots = ExpirationAbonnement.objects.count()
+        sortie = StringIO()
+        call_command('expirer_abonnements', stdout=sortie)
+        assert sortie.getvalue() == ''
+        assert ExpirationAbonnement.objects.count() == nombre_lots
+
+
+# ---------------------- Check-in Tests ----------------------
+
+@pytest.mark.django_db
+class TestCheckIn:
+    @pytest.fixture(autouse=True)
+    def cache_vide(self):
+        from . import checkin
+        checkin.vider()
+        yield
+        checkin.vider()
+
+    @pytest.fixture
+    def adhesion(self, member_user, abonnement):
+        aujourd_hui = timezone.localdate()
+        paiement = Paiement.objects.create(client=member_user, abonnement=abonnement, montant=abonnement.prix,
+                                           status='PAYE', mode_paiement='ESPECE')
+        abonnement_client = AbonnementClient.objects.create(
+            client=member_user, abonnement=abonnement, paiement=paiement,
+            date_debut=aujourd_hui, date_fin=aujourd_hui + timedelta(days=30)
+        )
+        ticket = planifier_ticket(paiement, abonnement_client, type_ticket='ABONNEMENT', differe=True)
+        return abonnement_client, ticket
+
+    def test_valid_membership_is_served_from_memory(self, authenticated_employee_client, adhesion):
+        abonnement_client, ticket = adhesion
+        url = reverse('checkin', args=[ticket.uuid])
+        response = authenticated_employee_client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['statut'] == 'VALIDE'
+        assert response.data['abonnement'] == 'Abonnement Test'
+        assert response.data['valide_jusqu_au'] == abonnement_client.date_fin
+
+        from . import checkin
+        with CaptureQueriesContext(connection) as ctx:
+            assert checkin.verifier(ticket.uuid)['statut'] == 'VALIDE'
+        assert len(ctx.captured_queries) == 0
+
+    def test_unpaid_membership(self, authenticated_employee_client, adhesion):
+        abonnement_client, ticket = adhesion
+        Paiement.objects.filter(pk=abonnement_client.paiement_id).update(status='EN_ATTENTE')
+        AbonnementClient.objects.filter(pk=abonnement_client.pk).update(actif=False)
+        response = authenticated_employee_client.get(reverse('checkin', args=[ticket.uuid]))
+        assert response.data['statut'] == 'IMPAYE'
+
+    def test_expired_membership(self, authenticated_employee_client, adhesion):
+        abonnement_client, ticket = adhesion
+        # Désactivé par le balayage d'expiration : toujours payé, mais échu
+        AbonnementClient.objects.filter(pk=abonnement_client.pk).update(
+            date_fin=timezone.localdate() - timedelta(days=1), actif=False)
+        response = authenticated_employee_client.get(reverse('checkin', args=[ticket.uuid]))
+        assert response.data['statut'] == 'EXPIRE'
+
+    def test_deactivated_membership(self, authenticated_employee_client, adhesion):
+        abonnement_client, ticket = adhesion
+        # Désactivé par un administrateur avant l'échéance : payé, mais refusé
+        abonnement_client.actif = False
+        abonnement_client.save()
+        response = authenticated_employee_client.get(reverse('checkin', args=[ticket.uuid]))
+        assert response.data['statut'] == 'INACTIF'
+
+    def test_write_invalidates_cached_membership(self, adhesion):
+        from . import checkin
+        abonnement_client, ticket = adhesion
+        assert checkin.verifier(ticket.uuid)['statut'] == 'VALIDE'
+        abonnement_client.date_fin = timezone.localdate() - timedelta(days=1)
+        abonnement_client.save()
+        assert checkin.verifier(ticket.uuid)['statut'] == 'EXPIRE'
+
+    def test_direct_updates_invalidate_cached_membership(self, adhesion, abonnement, monkeypatch):
+        from . import checkin
+        from .expiration import expirer_abonnements
+        abonnement_client, ticket = adhesion
+        assert checkin.verifier(ticket.uuid)['statut'] == 'VALIDE'
+        expirer_abonnements(aujourd_hui=abonnement_client.date_fin + timedelta(days=1))
+        assert str(ticket.uuid) not in checkin._adhesions
+
+        invalides = []
+        monkeypatch.setattr(checkin, 'invalider', lambda modele, pk: invalides.append((modele, pk)))
+        presentiel = AbonnementClientPresentiel.objects.create(
+            client_nom='Nom', client_prenom='Client', abonnement=abonnement, date_debut=timezone.localdate())
+        invalides.clear()
+        assert presentiel.crediter(Decimal('1'))
+        assert invalides == [('AbonnementClientPresentiel', presentiel.pk)]
+
+    def test_unknown_ticket_and_permissions(self, authenticated_employee_client, adhesion):
+        url = reverse('checkin', args=[uuid.uuid4()])
+        assert authenticated_employee_client.get(url).status_code == status.HTTP_404_NOT_FOUND
+        client = APIClient()
+        client.force_authenticate(user=adhesion[0].client)
+        assert client.get(reverse('checkin', args=[adhesion[1].uuid])).status_code == status.HTTP_403_FORBIDDEN
+
+    def test_ticket_pdf_prints_qr_code(self, adhesion, media_root):
+        from pypdf import PdfReader
+        from .utils import contenu_ticket, generer_facture_pdf
+        abonnement_client, ticket = adhesion
+        # Code d'entrée hors du contenu : la mise en page reste partagée entre tickets identiques
+        assert str(ticket.uuid) not in str(contenu_ticket(abonnement_client, abonnement_client.paiement, 'ABONNEMENT'))
+        nom = generer_facture_pdf(abonnement_client, abonnement_client.paiement, type_ticket='ABONNEMENT')
+        page = PdfReader(media_root / nom).pages[0]
+        assert f"Code d'entrée : {ticket.uuid}" in page.extract_text()
+
+
+# ---------------------- Load Seeding Tests ----------------------
+
+@pytest.mark.django_db
+class TestSeedLoad:
+    def test_command_creates_requested_volumes_without_rendering(self, media_root):
+        sortie = StringIO()
+        call_command('seed_load', clients=30, paiements=200, presentiels=10, jours=60, jours_presences=10,
+                     lot=50, stdout=sortie)
+        assert User.objects.filter(role='CLIENT', email__endswith='@load.local').count() == 30
+        assert Paiement.objects.count() == 200
+        assert Reservation.objects.count() == 100
+        assert Seance.objects.count() == 20
+        assert AbonnementClientPresentiel.objects.count() == 10
+        assert PaiementTranche.objects.count() == HistoriquePaiement.objects.count() >= 10
+        assert PresencePersonnel.objects.exists() and Charge.objects.exists()
+
+        payes = Paiement.objects.filter(status='PAYE')
+        assert 0 < payes.count() < 200
+        assert Ticket.objects.count() == payes.count() == Facture.objects.count()
+        assert not Ticket.objects.exclude(statut='A_LA_DEMANDE').exists()
+        assert not Ticket.objects.exclude(fichier_pdf='').exists()
+        assert AgregatFinancier.objects.exists()
+
+        with pytest.raises(CommandError):
+            call_command('seed_load', clients=1, paiements=1, stdout=StringIO())
+
+    def test_same_seed_gives_same_data(self):
+        from .seed import generer
+
+        def jeu(domaine):
+            debut = Paiement.objects.order_by('-id').values_list('id', flat=True).first() or 0
+            generer(clients=20, paiements=100, presentiels=5, jours=30, jours_presences=5, domaine=domaine)
+            return [
+                (p.montant, p.status, p.mode_paiement, p.date_paiement.date(), p.abonnement.nom if p.abonnement else None)
+                for p in Paiement.objects.filter(id__gt=debut).select_related('abonnement').order_by('id')
+            ]
+
+        assert jeu('premier.local') == jeu('second.local')
+
+    def test_reference_date_fixes_generated_dates(self):
+        from .seed import generer
+        reference = datetime(2025, 3, 14).date()
+
+        def jeu(domaine):
+            debuts = [modele.objects.order_by('-id').values_list('id', flat=True).first() or 0
+                      for modele in (Paiement, AbonnementClientPresentiel)]
+            generer(clients=20, paiements=100, presentiels=5, jours=30, jours_presences=5, domaine=domaine,
+                    date_reference=reference)
+            return [
+                list(modele.objects.filter(id__gt=debut).order_by('id').values_list(*champs))
+                for modele, debut, champs in zip((Paiement, AbonnementClientPresentiel), debuts,
+                                                 (('date_paiement', 'status'), ('date_debut', 'statut')))
+            ]
+
+        premier = jeu('premier.local')
+        # Lancé un autre jour : mêmes données pour la même date de référence
+        with patch('django.utils.timezone.now', return_value=timezone.now() + timedelta(days=40)):
+            second = jeu('second.local')
+        assert premier == second
+        assert max(timezone.localdate(d) for d, _statut in premier[0]) <= reference
+
+
+# ---------------------- Streaming Export Tests ----------------------
+
+@pytest.mark.django_db
+class TestExports:
+    @staticmethod
+    def _lire(response):
+        import csv
+        return list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+
+    def test_every_export_streams_csv(self, authenticated_admin_client):
+        from .exports import EXPORTS
+        from .seed import generer
+        generer(clients=10, paiements=50, presentiels=5, jours=30, jours_presences=2)
+        for nom, (modele, _champ, colonnes) in EXPORTS.items():
+            response = authenticated_admin_client.get(reverse('export', args=[nom, 'csv']))
+            assert response.status_code == status.HTTP_200_OK
+            assert response.streaming
+            assert response['Content-Disposition'] == f'attachment; filename="{nom}.csv"'
+            lignes = self._lire(response)
+            assert lignes[0] == [entete for entete, _champ in colonnes]
+            assert len(lignes) == modele.objects.count() + 1
+
+    def test_date_range_is_inclusive_and_ordered(self, authenticated_admin_client, member_user):
+        aujourd_hui = timezone.localdate()
+        date_paiement = Paiement._meta.get_field('date_paiement')
+        date_paiement.auto_now_add = False
+        try:
+            for jours, heure in [(3, 10), (2, 23), (1, 0), (0, 12)]:
+                jour = timezone.make_aware(datetime.combine(aujourd_hui - timedelta(days=jours), datetime.min.time()))
+                Paiement.objects.create(client=member_user, montant=Decimal('1000'), status='PAYE',
+                                        date_paiement=jour + timedelta(hours=heure, minutes=30))
+        finally:
+            date_paiement.auto_now_add = True
+        debut, fin = aujourd_hui - timedelta(days=2), aujourd_hui - timedelta(days=1)
+        response = authenticated_admin_client.get(
+            reverse('export', args=['paiements', 'csv']), {'from': debut.isoformat(), 'to': fin.isoformat()})
+        lignes = self._lire(response)[1:]
+        assert [ligne[1][:10] for ligne in lignes] == [debut.isoformat(), fin.isoformat()]
+        assert lignes[0][4] == member_user.email
+        assert response['Content-Disposition'].endswith(f'paiements_{debut}_{fin}.csv"')
+
+    def test_memory_stays_flat_with_volume(self, settings):
+        import tracemalloc
+        from .exports import flux_csv
+        from .seed import generer
+        settings.EXPORT_CHUNK_SIZE = 100
+        generer(clients=20, paiements=3000, seances=0, reservations=0, presentiels=0, charges=0,
+                jours=30, jours_presences=0)
+        debut = Paiement.objects.order_by('date_paiement').values_list('date_paiement', flat=True)[299]
+
+        def pic(**bornes):
+            tracemalloc.start()
+            lignes = sum(1 for _ligne in flux_csv('paiements', **bornes))
+            valeur = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            return lignes, valeur
+
+        lignes_petit, pic_petit = pic(fin=timezone.localtime(debut).date())
+        lignes_grand, pic_grand = pic()
+        assert lignes_grand == 3001 and lignes_grand > 5 * lignes_petit
+        assert pic_grand < 2 * pic_petit
+
+    def test_formulas_are_neutralised(self, authenticated_admin_client):
+        for titre in ['=HYPERLINK("http://x")', '+1', '-2+3', '@SUM(A1)', '\tTab', 'Loyer']:
+            Charge.objects.create(titre=titre, montant=Decimal('-10.00'), date=timezone.localdate())
+        lignes = self._lire(authenticated_admin_client.get(reverse('export', args=['charges', 'csv'])))[1:]
+        assert [ligne[2] for ligne in lignes] == [
+            '\'=HYPERLINK("http://x")', "'+1", "'-2+3", "'@SUM(A1)", "'\tTab", 'Loyer']
+        assert {ligne[3] for ligne in lignes} == {'-10.00'}
+
+    def test_rejections(self, authenticated_admin_client, employee_user):
+        from .exports import xlsx_disponible
+        assert authenticated_admin_client.get('/api/exports/inconnu.csv').status_code == 404
+        url = reverse('export', args=['charges', 'csv'])
+        assert authenticated_admin_client.get(url, {'from': '01/01/2025'}).status_code == 400
+        assert authenticated_admin_client.get(url, {'from': '2025-02-01', 'to': '2025-01-01'}).status_code == 400
+        response = authenticated_admin_client.get(reverse('export', args=['charges', 'xlsx']))
+        assert response.status_code == (200 if xlsx_disponible() else 406)
+        assert APIClient().get(url).status_code == 401
+        employe = APIClient()
+        employe.force_authenticate(user=employee_user)
+        assert employe.get(url).status_code == 403
+
+
+# ---------------------- Claims Authentication Tests ----------------------
+
+@pytest.mark.django_db
+class TestClaimsAuthentication:
+    @pytest.fixture(autouse=True)
+    def cache_vide(self):
+        from django.core.cache import cache
+        cache.clear()
+        yield
+        cache.clear()
+
+    @staticmethod
+    def _client(user, claims=True):
+        from rest_framework_simplejwt.tokens import RefreshToken
+        from .serializers import MyTokenObtainPairSerializer
+        jeton = MyTokenObtainPairSerializer.get_token(user) if claims else RefreshToken.for_user(user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {jeton.access_token}')
+        return client
+
+    @staticmethod
+    def _requetes_user(ctx):
+        return [q['sql'] for q in ctx.captured_queries if 'core_user' in q['sql']]
+
+    def test_read_path_caches_authorisation_state(self, admin_user):
+        client = self._client(admin_user)
+        with CaptureQueriesContext(connection) as ctx:
+            assert client.get(reverse('financial-report')).status_code == status.HTTP_200_OK
+        assert len(self._requetes_user(ctx)) == 1
+        with CaptureQueriesContext(connection) as ctx:
+            assert client.get(reverse('financial-report')).status_code == status.HTTP_200_OK
+        assert self._requetes_user(ctx) == []
+
+    def test_full_profile_loads_once(self, member_user):
+        client = self._client(member_user)
+        client.get(reverse('me'))  # état d'autorisation mis en cache
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get(reverse('me'))
+        assert response.data['nom'] == 'Member' and response.data['prenom'] == 'Gym'
+        assert len(self._requetes_user(ctx)) == 1
+
+    def test_writes_load_the_user(self, member_user):
+        response = self._client(member_user).patch(reverse('me'), {'nom': 'Renomme'}, format='json')
+        assert response.status_code == status.HTTP_200_OK
+        member_user.refresh_from_db()
+        assert member_user.nom == 'Renomme'
+        assert member_user.role == 'CLIENT'
+
+    def test_role_change_and_deactivation_apply_to_issued_tokens(self, admin_user):
+        client = self._client(admin_user)
+        assert client.get(reverse('financial-report')).status_code == status.HTTP_200_OK
+        admin_user.role = 'CLIENT'
+        admin_user.save()
+        assert client.get(reverse('financial-report')).status_code == status.HTTP_403_FORBIDDEN
+        admin_user.is_active = False
+        admin_user.save(update_fields=['is_active'])
+        assert client.get(reverse('me')).status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_demotion_without_signal_is_enforced_once_cache_is_empty(self, admin_user):
+        from django.core.cache import cache
+        client = self._client(admin_user)
+        assert client.get(reverse('financial-report')).status_code == status.HTTP_200_OK
+        # Mise à jour en masse, ou faite par un autre processus : aucun signal ici
+        User.objects.filter(pk=admin_user.pk).update(role='CLIENT')
+        cache.clear()
+        assert client.get(reverse('financial-report')).status_code == status.HTTP_403_FORBIDDEN
+        User.objects.filter(pk=admin_user.pk).update(is_active=False)
+        cache.clear()
+        assert client.get(reverse('me')).status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_token_without_claims_is_cached(self, admin_user):
+        client = self._client(admin_user, claims=False)
+        with CaptureQueriesContext(connection) as ctx:
+            assert client.get(reverse('financial-report')).status_code == status.HTTP_200_OK
+        assert len(self._requetes_user(ctx)) == 1
+        with CaptureQueriesContext(connection) as ctx:
+            assert client.get(reverse('financial-report')).status_code == status.HTTP_200_OK
+        assert self._requetes_user(ctx) == []
+
+    def test_deleted_user_is_rejected(self, member_user):
+        client = self._client(member_user)
+        member_user.delete()
+        assert client.get(reverse('me')).status_code == status.HTTP_401_UNAUTHORIZED
+
+
+# ---------------------- SQLite Tuning Tests ----------------------
+
+class TestSQLiteTuning:
+    def test_production_profile_applies_pragmas(self, django_db_blocker, tmp_path):
+        from django.db import connections
+        from .bench_sqlite import ALIAS, _configurer, profils
+        options, persistant = profils()['production']
+        assert persistant
+        with django_db_blocker.unblock():
+            _configurer(str(tmp_path / 'pragmas.sqlite3'), options)
+            try:
+                with connections[ALIAS].cursor() as cursor:
+                    valeurs = {}
+                    for pragma in ('journal_mode', 'synchronous', 'busy_timeout', 'cache_size'):
+                        cursor.execute(f'PRAGMA {pragma}')
+                        valeurs[pragma] = cursor.fetchone()[0]
+            finally:
+                connections[ALIAS].close()
+                del connections[ALIAS]
+                del connections.settings[ALIAS]
+        assert valeurs == {'journal_mode': 'wal', 'synchronous': 1, 'busy_timeout': 20000, 'cache_size': -20000}
+
+    def test_concurrent_writers_do_not_fail(self, django_db_blocker, tmp_path):
+        from .bench_sqlite import mesurer
+        with django_db_blocker.unblock():
+            resultat = mesurer('production', travailleurs=3, transactions=30, dossier=tmp_path)
+        assert resultat['erreurs'] == 0
+        assert resultat['validees'] == 90
+        assert resultat['debit_tps'] > 0
+
+
+# ---------------------- Reporting Router Tests ----------------------
+
+# transaction=True : la sauvegarde SQLite attend la fin de la transaction ouverte sur la base copiée
+@pytest.mark.django_db(transaction=True, databases=['default', 'reporting'])
+class TestReportingRouter:
+    @pytest.fixture
+    def copie(self, tmp_path):
+        """Base de reporting pointée sur un fichier de tmp_path (au lieu du miroir de test)."""
+        from django.db import connections
+        connexion = connections['reporting']
+        ancien = connexion.settings_dict
+        connexion.close()
+        connexion.settings_dict = {**connections.settings['reporting'], 'NAME': str(tmp_path / 'reporting.sqlite3')}
+        yield connexion.settings_dict['NAME']
+        connexion.close()
+        connexion.settings_dict = ancien
+
+    def _charge(self, titre, montant='100.00'):
+        return Charge.objects.create(titre=titre, montant=Decimal(montant), date=timezone.now().date())
+
+    def test_missing_snapshot_reads_primary(self, copie):
+        from .routers import lecture_rapports, sur_rapports
+        self._charge('Loyer')
+        with lecture_rapports() as alias:
+            assert alias == 'default'
+            assert Charge.objects.count() == 1
+        assert sur_rapports(Charge.objects.count) == 1
+
+    def test_reads_use_snapshot_and_writes_go_to_primary(self, copie):
+        from .routers import copier_instantane, lecture_rapports
+        self._charge('Loyer')
+        assert copier_instantane() == copie
+        self._charge('Électricité')
+        with lecture_rapports() as alias:
+            assert alias == 'reporting'
+            assert list(Charge.objects.values_list('titre', flat=True)) == ['Loyer']
+            self._charge('Eau')
+        assert Charge.objects.count() == 3
+
+    def test_stale_snapshot_falls_back_to_primary(self, copie, settings):
+        from .routers import base_rapports, copier_instantane
+        copier_instantane()
+        assert base_rapports() == 'reporting'
+        ancien = time.time() - 3600
+        os.utime(copie, (ancien, ancien))
+        assert base_rapports() == 'default'
+        settings.REPORTING_MAX_STALENESS_SECONDS = 7200
+        assert base_rapports() == 'reporting'
+
+    def test_broken_snapshot_falls_back_to_primary(self, copie):
+        from .routers import sur_rapports
+        open(copie, 'w').close()
+        self._charge('Loyer')
+        assert sur_rapports(Charge.objects.count) == 1
+
+    def test_financial_report_reads_snapshot(self, copie, authenticated_admin_client):
+        from .routers import copier_instantane
+        self._charge('Loyer', '300.00')
+        copier_instantane()
+        self._charge('Électricité', '50.00')
+        response = authenticated_admin_client.get(reverse('financial-report'))
+        assert response.status_code == status.HTTP_200_OK
+        assert Decimal(str(response.data['total_charges'])) == Decimal('300.00')
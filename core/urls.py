@@ -2,12 +2,12 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
-    FinancialReportView, ValiderPaiementView, PaiementDirectView, AbonnementDirectView,
+    FinancialReportView, ExportView, MetriquesView, ValiderPaiementView, PaiementDirectView, AbonnementDirectView,
     SeanceDirecteView, AbonnementClientDirectView, ValiderReservationSeanceView,
     ValiderReservationAbonnementView, AbonnementClientReservationView, LoginView,
     RegisterView, MeView,
     AbonnementViewSet, SeanceViewSet, ReservationViewSet,
-    PaiementViewSet, TicketViewSet, ChargeViewSet, PresencePersonnelViewSet,
+    PaiementViewSet, TicketViewSet, DocumentView, CheckInView, ChargeViewSet, PresencePersonnelViewSet,
     UserListView, UserReservationsView, PersonnelViewSet,
     AbonnementClientPresentielViewSet, PaiementTrancheViewSet, AbonnementClientViewSet,
     api_root
@@ -39,6 +39,10 @@ urlpatterns = [
     path('refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('me/', MeView.as_view(), name='me'),
     path('financial-report/', FinancialReportView.as_view(), name='financial-report'),
+    path('exports/<str:nom>.<str:extension>', ExportView.as_view(), name='export'),
+    path('metrics/', MetriquesView.as_view(), name='metrics'),
+    path('documents/<str:type_document>/<int:pk>/', DocumentView.as_view(), name='document-telecharger'),
+    path('checkin/<uuid:code>/', CheckInView.as_view(), name='checkin'),
     path('users/', UserListView.as_view(), name='user-list'),
     path('users/<int:user_id>/reservations/', UserReservationsView.as_view(), name='user-reservations'),
     path('valider-paiement/<int:paiement_id>/', ValiderPaiementView.as_view(), name='valider-paiement'),
@@ -4,12 +4,21 @@ from reportlab.lib import colors
 from reportlab.lib.units import mm
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.graphics.barcode.qr import QrCodeWidget
+from reportlab.graphics.shapes import Drawing
+from reportlab.graphics import renderPDF
+from pypdf import PdfReader, PdfWriter
 from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
 from django.conf import settings
+import hashlib
+import json
 import os
+from functools import lru_cache
 from io import BytesIO
-import uuid
 from core.models import Paiement, Ticket
+from core.instrumentation import mesurer
+from core.metrics import incrementer
 from django.utils import timezone
 
 def enregistrer_paiement_et_valider_reservation(reservation, montant_paye, paiement=None, employe=None):
@@ -23,8 +32,9 @@ def enregistrer_paiement_et_valider_reservation(reservation, montant_paye, paiem
         paiement (Paiement, optional): instance à lier si déjà créée
         employe (User, optional): employé ayant traité le paiement
     Returns:
-        (Reservation, Ticket): la réservation mise à jour et le ticket généré (ou None)
+        (Reservation, Ticket): la réservation mise à jour et le ticket planifié (ou None)
     """
+    from core.jobs import planifier_ticket  # import local : core.jobs dépend de ce module
     # Mise à jour du montant payé
     reservation.montant_paye += montant_paye
     reservation.save()
@@ -48,70 +58,62 @@ def enregistrer_paiement_et_valider_reservation(reservation, montant_paye, paiem
             reservation.save()
             # Générer le ticket si pas déjà fait
             if not Ticket.objects.filter(paiement=paiement).exists():
-                pdf_file = generer_facture_pdf(reservation, paiement, type_ticket='SEANCE')
-                ticket = Ticket.objects.create(
-                    paiement=paiement,
-                    fichier_pdf=pdf_file,
-                    type_ticket='SEANCE'
-                )
+                ticket = planifier_ticket(paiement, reservation, type_ticket='SEANCE')
     elif reservation.type_reservation == 'ABONNEMENT':
         if reservation.montant_paye >= reservation.montant:
             reservation.statut = 'CONFIRMEE'
             reservation.save()
             if not Ticket.objects.filter(paiement=paiement).exists():
-                pdf_file = generer_facture_pdf(reservation, paiement, type_ticket='ABONNEMENT')
-                ticket = Ticket.objects.create(
-                    paiement=paiement,
-                    fichier_pdf=pdf_file,
-                    type_ticket='ABONNEMENT'
-                )
+                ticket = planifier_ticket(paiement, reservation, type_ticket='ABONNEMENT')
     return reservation, ticket
 
 
-def generer_facture_pdf(obj, paiement, type_ticket='SEANCE'):
-    """
-    Génère un PDF stylé pour un ticket de réservation.
-    obj : Reservation, Seance, AbonnementClient, etc.
-    paiement : instance de Paiement liée
-    type_ticket : 'SEANCE' ou 'ABONNEMENT'
-    Retourne un ContentFile prêt à être sauvegardé dans un FileField.
-    """
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=40, leftMargin=40, topMargin=40, bottomMargin=40)
-    elements = []
+# Version du gabarit : à incrémenter quand la mise en page change, pour invalider le cache des PDF
+VERSION_GABARIT = 3
+
+
+@lru_cache(maxsize=None)
+def _styles_ticket():
     styles = getSampleStyleSheet()
-    
-    # Styles personnalisés
-    styleTitle = ParagraphStyle('title', parent=styles['Heading1'], fontSize=32, textColor=colors.HexColor('#215BAA'), alignment=1, spaceAfter=20)
-    styleSubtitle = ParagraphStyle('subtitle', parent=styles['Heading2'], fontSize=18, textColor=colors.HexColor('#4A90E2'), alignment=1, spaceAfter=15)
-    styleSuccess = ParagraphStyle('success', parent=styles['Normal'], fontSize=16, textColor=colors.HexColor('#28A745'), alignment=1, spaceAfter=20)
-    styleInfo = ParagraphStyle('info', parent=styles['Normal'], fontSize=14, textColor=colors.HexColor('#6C757D'), alignment=0, spaceAfter=8, leftIndent=20)
-    styleHighlight = ParagraphStyle('highlight', parent=styles['Normal'], fontSize=16, textColor=colors.HexColor('#215BAA'), alignment=0, spaceAfter=10, leftIndent=20)
-    styleAmount = ParagraphStyle('amount', parent=styles['Heading2'], fontSize=20, textColor=colors.HexColor('#DC3545'), alignment=1, spaceAfter=25)
-    styleFooter = ParagraphStyle('footer', parent=styles['Normal'], fontSize=12, textColor=colors.HexColor('#6C757D'), alignment=1, spaceAfter=10)
-
-    # Logo GYMZONE (si le fichier existe)
+    return {
+        'title': ParagraphStyle('title', parent=styles['Heading1'], fontSize=32, textColor=colors.HexColor('#215BAA'), alignment=1, spaceAfter=20),
+        'subtitle': ParagraphStyle('subtitle', parent=styles['Heading2'], fontSize=18, textColor=colors.HexColor('#4A90E2'), alignment=1, spaceAfter=15),
+        'success': ParagraphStyle('success', parent=styles['Normal'], fontSize=16, textColor=colors.HexColor('#28A745'), alignment=1, spaceAfter=20),
+        'info': ParagraphStyle('info', parent=styles['Normal'], fontSize=14, textColor=colors.HexColor('#6C757D'), alignment=0, spaceAfter=8, leftIndent=20),
+        'highlight': ParagraphStyle('highlight', parent=styles['Normal'], fontSize=16, textColor=colors.HexColor('#215BAA'), alignment=0, spaceAfter=10, leftIndent=20),
+        'amount': ParagraphStyle('amount', parent=styles['Heading2'], fontSize=20, textColor=colors.HexColor('#DC3545'), alignment=1, spaceAfter=25),
+        'footer': ParagraphStyle('footer', parent=styles['Normal'], fontSize=12, textColor=colors.HexColor('#6C757D'), alignment=1, spaceAfter=10),
+    }
+
+
+@lru_cache(maxsize=None)
+def _chemin_logo():
+    """Logo GYMZONE (si le fichier existe) ; vérifié une seule fois par processus."""
     logo_path = os.path.join(settings.BASE_DIR, 'gym-management-app', 'public', 'lg1.jpg')
-    if os.path.exists(logo_path):
-        try:
-            logo = Image(logo_path, width=80, height=80)
-            logo.hAlign = 'CENTER'
-            elements.append(logo)
-            elements.append(Spacer(1, 10))
-        except:
-            pass
+    return logo_path if os.path.exists(logo_path) else None
+
+
+def contenu_ticket(obj, paiement, type_ticket='SEANCE'):
+    """
+    Décrit le contenu du ticket sous forme de blocs ('logo',), ('spacer', hauteur)
+    ou (style, texte). Ne fait aucune mise en page : sert de clé au cache des PDF.
+    """
+    blocs = []
+    if _chemin_logo():
+        blocs.append(('logo',))
+        blocs.append(('spacer', 10))
     
     # En-tête avec logo (texte stylé comme logo)
-    elements.append(Paragraph("🏋️ GYMZONE", styleTitle))
-    elements.append(Spacer(1, 10))
+    blocs.append(('title', "🏋️ GYMZONE"))
+    blocs.append(('spacer', 10))
     
     # Message de réservation réussie
-    elements.append(Paragraph("✅ RÉSERVATION RÉUSSIE", styleSuccess))
-    elements.append(Spacer(1, 15))
+    blocs.append(('success', "✅ RÉSERVATION RÉUSSIE"))
+    blocs.append(('spacer', 15))
     
     # Message principal
-    elements.append(Paragraph("Passez à la salle pour effectuer votre paiement", styleSubtitle))
-    elements.append(Spacer(1, 25))
+    blocs.append(('subtitle', "Passez à la salle pour effectuer votre paiement"))
+    blocs.append(('spacer', 25))
 
     # Informations de la réservation
     if hasattr(obj, 'nom_client'):
@@ -122,21 +124,21 @@ def generer_facture_pdf(obj, paiement, type_ticket='SEANCE'):
         description = obj.description or ""
         date_creation = obj.id  # Utiliser l'ID comme référence
         
-        elements.append(Paragraph(f"<b>👤 Client :</b> {client_nom}", styleHighlight))
-        elements.append(Paragraph(f"<b>🎯 Type :</b> {type_reservation}", styleHighlight))
+        blocs.append(('highlight', f"<b>👤 Client :</b> {client_nom}"))
+        blocs.append(('highlight', f"<b>🎯 Type :</b> {type_reservation}"))
         
         # Afficher "À définir" pour les réservations de séance en attente
         if type_reservation == 'SEANCE' and montant == 0 and paiement and paiement.montant > 0:
             # Si la séance a été validée et qu'un paiement existe, afficher le montant payé
-            elements.append(Paragraph(f"<b>💰 Montant :</b> {paiement.montant} FCFA", styleHighlight))
+            blocs.append(('highlight', f"<b>💰 Montant :</b> {paiement.montant} FCFA"))
         elif type_reservation == 'SEANCE' and montant == 0:
-            elements.append(Paragraph(f"<b>💰 Montant :</b> À définir par l'employé", styleHighlight))
+            blocs.append(('highlight', f"<b>💰 Montant :</b> À définir par l'employé"))
         else:
-            elements.append(Paragraph(f"<b>💰 Montant :</b> {montant} FCFA", styleHighlight))
+            blocs.append(('highlight', f"<b>💰 Montant :</b> {montant} FCFA"))
             
         if description:
-            elements.append(Paragraph(f"<b>📝 Description :</b> {description}", styleHighlight))
-        elements.append(Paragraph(f"<b>🔢 Référence :</b> #{date_creation}", styleHighlight))
+            blocs.append(('highlight', f"<b>📝 Description :</b> {description}"))
+        blocs.append(('highlight', f"<b>🔢 Référence :</b> #{date_creation}"))
         
     elif type_ticket == 'ABONNEMENT' and hasattr(obj, 'montant_total'):
         # Cas d'un abonnement présentiel
@@ -146,11 +148,11 @@ def generer_facture_pdf(obj, paiement, type_ticket='SEANCE'):
         date_debut = obj.date_debut.strftime('%d/%m/%Y') if hasattr(obj.date_debut, 'strftime') else str(obj.date_debut)
         date_fin = obj.date_fin.strftime('%d/%m/%Y') if hasattr(obj.date_fin, 'strftime') else str(obj.date_fin)
         
-        elements.append(Paragraph(f"<b>👤 Client :</b> {client_nom}", styleHighlight))
-        elements.append(Paragraph(f"<b>🎯 Type :</b> Abonnement {abonnement_nom}", styleHighlight))
-        elements.append(Paragraph(f"<b>💰 Montant :</b> {montant} FCFA", styleHighlight))
-        elements.append(Paragraph(f"<b>📅 Période :</b> {date_debut} au {date_fin}", styleHighlight))
-        elements.append(Paragraph(f"<b>🔢 Référence :</b> #{obj.id}", styleHighlight))
+        blocs.append(('highlight', f"<b>👤 Client :</b> {client_nom}"))
+        blocs.append(('highlight', f"<b>🎯 Type :</b> Abonnement {abonnement_nom}"))
+        blocs.append(('highlight', f"<b>💰 Montant :</b> {montant} FCFA"))
+        blocs.append(('highlight', f"<b>📅 Période :</b> {date_debut} au {date_fin}"))
+        blocs.append(('highlight', f"<b>🔢 Référence :</b> #{obj.id}"))
             
     else:
         # Cas d'une séance
@@ -163,55 +165,144 @@ def generer_facture_pdf(obj, paiement, type_ticket='SEANCE'):
         date_info = getattr(obj, 'date_jour', '') or ""
         heures_info = getattr(obj, 'nombre_heures', 0) or 0
         
-        elements.append(Paragraph(f"<b>👤 Client :</b> {client_nom}", styleHighlight))
-        elements.append(Paragraph(f"<b>🎯 Type :</b> Séance d'entraînement", styleHighlight))
-        elements.append(Paragraph(f"<b>💰 Montant :</b> {montant} FCFA", styleHighlight))
+        blocs.append(('highlight', f"<b>👤 Client :</b> {client_nom}"))
+        blocs.append(('highlight', f"<b>🎯 Type :</b> Séance d'entraînement"))
+        blocs.append(('highlight', f"<b>💰 Montant :</b> {montant} FCFA"))
         if date_info:
-            elements.append(Paragraph(f"<b>📅 Date :</b> {date_info}", styleHighlight))
+            blocs.append(('highlight', f"<b>📅 Date :</b> {date_info}"))
         if heures_info:
-            elements.append(Paragraph(f"<b>⏱️ Durée :</b> {heures_info} heure(s)", styleHighlight))
-        elements.append(Paragraph(f"<b>🔢 Référence :</b> #{obj.id}", styleHighlight))
+            blocs.append(('highlight', f"<b>⏱️ Durée :</b> {heures_info} heure(s)"))
+        blocs.append(('highlight', f"<b>🔢 Référence :</b> #{obj.id}"))
 
-    elements.append(Spacer(1, 30))
+    blocs.append(('spacer', 30))
     
     # Montant en évidence
     montant_total = obj.montant if hasattr(obj, 'montant') else (paiement.montant if paiement else 0)
     
     # Afficher "À définir" pour les réservations de séance en attente
     if hasattr(obj, 'type_reservation') and obj.type_reservation == 'SEANCE' and montant_total == 0 and paiement and paiement.montant > 0:
-        elements.append(Paragraph(f"<b>💳 MONTANT À PAYER : {paiement.montant} FCFA</b>", styleAmount))
+        blocs.append(('amount', f"<b>💳 MONTANT À PAYER : {paiement.montant} FCFA</b>"))
     elif hasattr(obj, 'type_reservation') and obj.type_reservation == 'SEANCE' and montant_total == 0:
-        elements.append(Paragraph(f"<b>💳 MONTANT À PAYER : À DÉFINIR</b>", styleAmount))
+        blocs.append(('amount', f"<b>💳 MONTANT À PAYER : À DÉFINIR</b>"))
     else:
-        elements.append(Paragraph(f"<b>💳 MONTANT À PAYER : {montant_total} FCFA</b>", styleAmount))
+        blocs.append(('amount', f"<b>💳 MONTANT À PAYER : {montant_total} FCFA</b>"))
     
-    elements.append(Spacer(1, 30))
+    blocs.append(('spacer', 30))
 
     # Instructions importantes
-    elements.append(Paragraph("📋 INSTRUCTIONS :", styleHighlight))
+    blocs.append(('highlight', "📋 INSTRUCTIONS :"))
     
     # Instructions spécifiques selon le type
     if hasattr(obj, 'type_reservation') and obj.type_reservation == 'SEANCE' and montant_total == 0:
         # Réservation de séance en attente
-        elements.append(Paragraph("• Présentez ce ticket à la réception", styleInfo))
-        elements.append(Paragraph("• L'employé définira le montant selon vos besoins", styleInfo))
-        elements.append(Paragraph("• Effectuez le paiement après validation", styleInfo))
-        elements.append(Paragraph("• Votre séance sera confirmée après paiement", styleInfo))
+        blocs.append(('info', "• Présentez ce ticket à la réception"))
+        blocs.append(('info', "• L'employé définira le montant selon vos besoins"))
+        blocs.append(('info', "• Effectuez le paiement après validation"))
+        blocs.append(('info', "• Votre séance sera confirmée après paiement"))
     else:
         # Réservation confirmée ou abonnement
-        elements.append(Paragraph("• Présentez ce ticket à la réception", styleInfo))
-        elements.append(Paragraph("• Effectuez le paiement en espèces ou par carte", styleInfo))
-        elements.append(Paragraph("• Conservez votre reçu de paiement", styleInfo))
-        elements.append(Paragraph("• Votre réservation sera confirmée après paiement", styleInfo))
+        blocs.append(('info', "• Présentez ce ticket à la réception"))
+        blocs.append(('info', "• Effectuez le paiement en espèces ou par carte"))
+        blocs.append(('info', "• Conservez votre reçu de paiement"))
+        blocs.append(('info', "• Votre réservation sera confirmée après paiement"))
     
-    elements.append(Spacer(1, 30))
+    blocs.append(('spacer', 30))
 
     # Message de remerciement
-    elements.append(Paragraph("🏆 Merci pour votre confiance chez GYMZONE !", styleFooter))
-    elements.append(Paragraph("💪 Votre bien-être est notre priorité", styleFooter))
+    blocs.append(('footer', "🏆 Merci pour votre confiance chez GYMZONE !"))
+    blocs.append(('footer', "💪 Votre bien-être est notre priorité"))
+    return blocs
+
+
+def _code_qr(texte, taille=110):
+    widget = QrCodeWidget(texte)
+    x1, y1, x2, y2 = widget.getBounds()
+    dessin = Drawing(taille, taille, transform=[taille / (x2 - x1), 0, 0, taille / (y2 - y1), 0, 0])
+    dessin.add(widget)
+    dessin.hAlign = 'CENTER'
+    return dessin
 
-    doc.build(elements)
+
+def _mise_en_page(blocs):
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=40, leftMargin=40, topMargin=40, bottomMargin=40)
+    styles = _styles_ticket()
+    elements = []
+    for bloc in blocs:
+        if bloc[0] == 'logo':
+            try:
+                logo = Image(_chemin_logo(), width=80, height=80)
+                logo.hAlign = 'CENTER'
+                elements.append(logo)
+            except Exception:
+                pass
+        elif bloc[0] == 'spacer':
+            elements.append(Spacer(1, bloc[1]))
+        else:
+            elements.append(Paragraph(bloc[1], styles[bloc[0]]))
+    with mesurer('pdf'):
+        doc.build(elements)
     pdf_content = buffer.getvalue()
     buffer.close()
-    filename = f"ticket_{type_ticket.lower()}_{uuid.uuid4()}.pdf"
-    return ContentFile(pdf_content, name=filename) 
\ No newline at end of file
+    return pdf_content
+
+
+def _tampon_entree(code, taille=90):
+    """Page A4 portant le QR code d'entrée (coin supérieur droit) et son texte (marge basse)."""
+    buffer = BytesIO()
+    largeur, hauteur = A4
+    page = canvas.Canvas(buffer, pagesize=A4)
+    renderPDF.draw(_code_qr(code, taille), page, largeur - 40 - taille, hauteur - 40 - taille)
+    page.setFont('Helvetica', 9)
+    page.setFillColor(colors.HexColor('#6C757D'))
+    page.drawCentredString(largeur / 2, 22, f"Code d'entrée : {code}")
+    page.save()
+    return buffer.getvalue()
+
+
+def _avec_code_entree(corps, code):
+    """Ajoute le code d'entrée `code` sur la première page du PDF `corps` (sans nouvelle mise en page)."""
+    document = PdfWriter(clone_from=BytesIO(corps))
+    document.pages[0].merge_page(PdfReader(BytesIO(_tampon_entree(code))).pages[0])
+    buffer = BytesIO()
+    document.write(buffer)
+    return buffer.getvalue()
+
+
+def cle_ticket(blocs):
+    """Empreinte SHA-256 du contenu d'un ticket (et de la version du gabarit)."""
+    donnees = json.dumps([VERSION_GABARIT, blocs], ensure_ascii=False, default=str)
+    return hashlib.sha256(donnees.encode('utf-8')).hexdigest()
+
+
+def generer_facture_pdf(obj, paiement, type_ticket='SEANCE', dossier='tickets'):
+    """
+    Génère un PDF stylé pour un ticket de réservation.
+    obj : Reservation, Seance, AbonnementClient, etc.
+    paiement : instance de Paiement liée
+    type_ticket : 'SEANCE' ou 'ABONNEMENT'
+    dossier : répertoire de stockage ('tickets' ou 'factures')
+    Retourne le nom du fichier stocké, à affecter à un FileField.
+
+    La mise en page est nommée d'après l'empreinte de son contenu : un ticket identique
+    à un ticket déjà rendu (ex. régénération lors de `valider`) la réutilise sans
+    nouvelle mise en page. Le code d'entrée du ticket (uuid, propre à chaque Ticket)
+    n'en fait pas partie : il est apposé ensuite sur une copie (voir core.checkin).
+    """
+    blocs = contenu_ticket(obj, paiement, type_ticket)
+    nom = f"{dossier}/ticket_{type_ticket.lower()}_{cle_ticket(blocs)[:40]}.pdf"
+    if default_storage.exists(nom):
+        incrementer('pdf_cache_hit')
+    else:
+        incrementer('pdf_cache_miss')
+        nom = default_storage.save(nom, ContentFile(_mise_en_page(blocs)))
+
+    ticket = Ticket.objects.filter(paiement=paiement).only('uuid').first() if paiement and paiement.pk else None
+    if ticket is None:
+        return nom
+    nom_ticket = f"{nom[:-len('.pdf')]}_{ticket.uuid.hex}.pdf"
+    if not default_storage.exists(nom_ticket):
+        with default_storage.open(nom, 'rb') as fichier:
+            corps = fichier.read()
+        nom_ticket = default_storage.save(nom_ticket, ContentFile(_avec_code_entree(corps, str(ticket.uuid))))
+    return nom_ticket
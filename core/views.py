@@ -1,8 +1,12 @@
 from uuid import uuid4
+import hashlib
+import json
+import logging
 import time
 from datetime import datetime, timedelta
-from decimal import Decimal
-from django.db.models import Sum, Count, F
+from decimal import Decimal, InvalidOperation
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Sum, Count, F, Prefetch
 from django.db.models.functions import TruncMonth
 from django.db import transaction
 
@@ -14,9 +18,11 @@ from django.conf import settings
 #from cinetpay import Order  # SUPPRIMER
 from rest_framework.decorators import action
 
+from .pagination import KeysetPagination
+
 from .models import (
     User, Abonnement, Seance,
-    Reservation, Paiement, Ticket,
+    Reservation, Paiement, Ticket, Facture,
     Charge, PresencePersonnel, Personnel,
     AbonnementClient, AbonnementClientPresentiel, PaiementTranche, HistoriquePaiement
 )
@@ -30,88 +36,140 @@ from .serializers import (
     TicketSerializer,
     AbonnementClientSerializer,
     AbonnementClientPresentielSerializer,
+    AbonnementClientPresentielResumeSerializer,
     PaiementTrancheSerializer,
     HistoriquePaiementSerializer,
-    MyTokenObtainPairSerializer
+    MyTokenObtainPairSerializer,
+    PresenceLotSerializer,
+    url_ticket
 )
 from .permissions import IsAdmin, IsEmploye, IsClient, IsAdminOrEmploye, IsClientOrEmploye
 # from .cinetpay_client import cinetpay_client  # SUPPRIMER
 from django.utils import timezone
+from django.http import Http404, FileResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
 from .utils import generer_facture_pdf
+from .jobs import planifier_ticket, materialiser_ticket
+from .downloads import servir_fichier
+from . import catalogue, checkin, exports
+from .routers import base_rapports, sur_rapports
+from .reporting import rapport_financier
+from .presences import statistiques_presences
+from .metrics import valeurs as valeurs_metriques
 from rest_framework_simplejwt.views import TokenObtainPairView
 
+logger = logging.getLogger(__name__)
+
+# ---------- Supervision ----------
+class MetriquesView(APIView):
+    """Compteurs de supervision (ex. pdf_cache_hit / pdf_cache_miss)."""
+    permission_classes = [IsAdmin]
+
+    def get(self, request):
+        return Response(valeurs_metriques())
+
+
 # ---------- Rapports Financiers ----------
 class FinancialReportView(APIView):
+    """
+    Rapport financier lu depuis les agrégats journaliers (core.reporting).
+    Paramètres optionnels : ?from=YYYY-MM-DD&to=YYYY-MM-DD (bornes incluses).
+    """
     permission_classes = [IsAdmin]
 
     def get(self, request):
-        print("\n=== FinancialReportView.get() appelé ===")
-        print(f"Utilisateur: {request.user}")
-        print(f"Rôle: {getattr(request.user, 'role', 'Non défini')}")
-        print(f"Headers: {request.headers}")
-        print(f"Query params: {request.query_params}")
+        try:
+            debut = self._parse_date(request.query_params.get('from'))
+            fin = self._parse_date(request.query_params.get('to'))
+        except ValueError:
+            return Response(
+                {'error': 'Les paramètres from et to doivent être au format YYYY-MM-DD'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if debut and fin and debut > fin:
+            return Response(
+                {'error': 'La date de début doit précéder la date de fin'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
         try:
-            # Version simplifiée pour diagnostiquer
-            print("Test de base - comptage des objets...")
-            
-            # Compter les objets de base
-            paiement_count = Paiement.objects.count()
-            charge_count = Charge.objects.count()
-            
-            print(f"Nombre de paiements: {paiement_count}")
-            print(f"Nombre de charges: {charge_count}")
-            
-            # Test simple des revenus
-            print("Test des revenus...")
-            total_revenue = Paiement.objects.filter(
-                status='PAYE'
-            ).aggregate(total=Sum('montant'))['total'] or 0
-            
-            print(f"Revenus totaux: {total_revenue}")
-            
-            # Test simple des dépenses
-            print("Test des dépenses...")
-            total_expenses = Charge.objects.aggregate(
-                total=Sum('montant')
-            )['total'] or 0
-            
-            print(f"Dépenses totales: {total_expenses}")
-            
-            # Réponse simplifiée
-            response_data = {
-                'total_revenue': total_revenue,
-                'total_expenses': total_expenses,
-                'total_charges': total_expenses,
-                'profit': total_revenue - total_expenses,
-                'active_clients': 0,  # Simplifié pour l'instant
-                'monthly_stats': [],  # Simplifié pour l'instant
-                'subscription_stats': [],  # Simplifié pour l'instant
-                'session_stats': []  # Simplifié pour l'instant
-            }
-            
-            print("Réponse finale:", response_data)
-            print("Taille de la réponse:", len(str(response_data)))
-            
+            response_data = sur_rapports(self._rapport, debut, fin)
             return Response(response_data)
-            
+
         except Exception as e:
-            print(f"Erreur dans FinancialReportView: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            
-            # Retourner une réponse d'erreur plus détaillée
+            logger.exception("Erreur dans FinancialReportView")
             error_response = {
                 'error': str(e),
                 'error_type': type(e).__name__,
                 'message': 'Une erreur est survenue lors de la génération du rapport financier'
             }
-            
             return Response(
                 error_response,
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    @staticmethod
+    def _parse_date(valeur):
+        if not valeur:
+            return None
+        return datetime.strptime(valeur, "%Y-%m-%d").date()
+
+    @classmethod
+    def _rapport(cls, debut, fin):
+        rapport = rapport_financier(debut, fin)
+        rapport['active_clients'] = cls._clients_actifs()
+        return rapport
+
+    @staticmethod
+    def _clients_actifs():
+        today = timezone.now().date()
+        en_ligne = AbonnementClient.objects.filter(actif=True, date_fin__gte=today).values('client').distinct().count()
+        presentiels = AbonnementClientPresentiel.objects.filter(statut='EN_COURS', date_fin__gte=today).count()
+        return en_ligne + presentiels
+
+
+class ExportView(APIView):
+    """
+    Exports comptables en flux : /exports/<paiements|tranches|charges|abonnements-presentiels>.<csv|xlsx>
+    Paramètres optionnels : ?from=YYYY-MM-DD&to=YYYY-MM-DD (bornes incluses).
+    """
+    permission_classes = [IsAdmin]
+    CONTENT_TYPES = {
+        'csv': 'text/csv; charset=utf-8',
+        'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    }
+
+    def get(self, request, nom, extension):
+        if nom not in exports.EXPORTS or extension not in self.CONTENT_TYPES:
+            raise Http404("Export inconnu")
+        try:
+            debut = FinancialReportView._parse_date(request.query_params.get('from'))
+            fin = FinancialReportView._parse_date(request.query_params.get('to'))
+        except ValueError:
+            return Response(
+                {'error': 'Les paramètres from et to doivent être au format YYYY-MM-DD'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if debut and fin and debut > fin:
+            return Response(
+                {'error': 'La date de début doit précéder la date de fin'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        nom_fichier = '_'.join([nom] + [d.isoformat() for d in (debut, fin) if d]) + f'.{extension}'
+        if extension == 'xlsx':
+            if not exports.xlsx_disponible():
+                return Response({'error': "L'export XLSX nécessite openpyxl"}, status=status.HTTP_406_NOT_ACCEPTABLE)
+            return FileResponse(sur_rapports(exports.fichier_xlsx, nom, debut, fin), as_attachment=True,
+                                filename=nom_fichier, content_type=self.CONTENT_TYPES['xlsx'])
+        # Lignes lues pendant l'envoi de la réponse : la base de reporting est choisie dès maintenant
+        response = StreamingHttpResponse(exports.flux_csv(nom, debut, fin, using=base_rapports()),
+                                         content_type=self.CONTENT_TYPES['csv'])
+        response['Content-Disposition'] = f'attachment; filename="{nom_fichier}"'
+        return response
+
 
 # ---------- Auth ----------
 class RegisterView(generics.CreateAPIView):
@@ -271,32 +329,46 @@ class AbonnementDirectView(APIView):
             status='PAYE'
         )
         
-        # Remplace la création du ticket par get_or_create pour éviter l'erreur d'unicité
-        pdf_file = generer_facture_pdf(paiement, paiement.abonnement, type_ticket='ABONNEMENT')
-        ticket, created = Ticket.objects.get_or_create(
-            paiement=paiement,
-            defaults={
-                'fichier_pdf': pdf_file,
-                'type_ticket': 'ABONNEMENT'
-            }
-        )
+        # Le PDF du ticket est généré en tâche de fond (pdf_worker)
+        ticket = planifier_ticket(paiement, paiement, type_ticket='ABONNEMENT')
         
         return Response({
             "message": "Abonnement enregistré avec succès",
             "paiement_id": paiement.id,
-            "montant": abonnement.prix
+            "montant": abonnement.prix,
+            "ticket_id": ticket.id,
+            "ticket_statut": ticket.statut
         })
 
 
 # ---------- Abonnements Clients Présentiels ----------
 class AbonnementClientPresentielViewSet(viewsets.ModelViewSet):
-    queryset = AbonnementClientPresentiel.objects.all()
+    queryset = AbonnementClientPresentiel.objects.select_related('abonnement', 'employe_creation').order_by('-date_creation', '-id')
     serializer_class = AbonnementClientPresentielSerializer
     permission_classes = [IsAdminOrEmploye]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
     search_fields = ['client_nom', 'client_prenom', 'abonnement__nom']
     filterset_fields = ['statut', 'statut_paiement', 'abonnement']
 
+    def _mode_resume(self):
+        # ?resume=1 : liste légère, sans tranches ni historique
+        return self.action == 'list' and self.request.query_params.get('resume') in ('1', 'true')
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self._mode_resume():
+            return queryset
+        # Graphe complet en requêtes constantes : les employés sont chargés avec chaque tranche/historique
+        return queryset.prefetch_related(
+            Prefetch('paiements_tranches', queryset=PaiementTranche.objects.select_related('employe').order_by('date_paiement', 'id')),
+            Prefetch('historique_paiements', queryset=HistoriquePaiement.objects.select_related('employe').order_by('date_modification', 'id')),
+        )
+
+    def get_serializer_class(self):
+        if self._mode_resume():
+            return AbonnementClientPresentielResumeSerializer
+        return super().get_serializer_class()
+
     def perform_create(self, serializer):
         # Assigner l'employé qui crée l'abonnement
         serializer.save(employe_creation=self.request.user)
@@ -322,8 +394,6 @@ class AbonnementClientPresentielViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'])
     def modifier_montant_paye(self, request, pk=None):
         """Ajouter un montant au paiement et créer automatiquement l'historique"""
-        from decimal import Decimal
-        import logging
         abonnement = self.get_object()
         montant_ajoute = request.data.get('montant_ajoute')
 
@@ -334,7 +404,7 @@ class AbonnementClientPresentielViewSet(viewsets.ModelViewSet):
             )
         try:
             montant_ajoute = Decimal(str(montant_ajoute))
-        except (ValueError, TypeError):
+        except (ValueError, TypeError, InvalidOperation):
             return Response(
                 {"error": "Le montant doit être un nombre valide"}, 
                 status=status.HTTP_400_BAD_REQUEST
@@ -344,38 +414,38 @@ class AbonnementClientPresentielViewSet(viewsets.ModelViewSet):
                 {"error": "Le montant ajouté doit être supérieur à zéro"}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
-        ancien_montant = abonnement.montant_paye
-        nouveau_montant = ancien_montant + montant_ajoute
-        if nouveau_montant > abonnement.montant_total:
-            return Response(
-                {"error": f"Le montant total ne peut pas dépasser {abonnement.montant_total} FCFA"}, 
-                status=status.HTTP_400_BAD_REQUEST
+        with transaction.atomic():
+            # Incrément atomique : le plafond est vérifié dans la même requête UPDATE
+            if not abonnement.crediter(montant_ajoute):
+                return Response(
+                    {"error": f"Le montant total ne peut pas dépasser {abonnement.montant_total} FCFA"}, 
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            # Créer un historique de paiement
+            HistoriquePaiement.objects.create(
+                abonnement_presentiel=abonnement,
+                montant_ajoute=montant_ajoute,
+                montant_total_apres=abonnement.montant_paye,
+                employe=request.user
             )
-        # Log pour debug
-        logging.warning(f"[DEBUG] Ajout paiement: ancien={ancien_montant}, ajoute={montant_ajoute}, nouveau={nouveau_montant}")
-        # Créer un historique de paiement
-        HistoriquePaiement.objects.create(
-            abonnement_presentiel=abonnement,
-            montant_ajoute=montant_ajoute,
-            montant_total_apres=nouveau_montant,
-            employe=request.user
-        )
-        # Mettre à jour le montant payé
-        abonnement.montant_paye = nouveau_montant
-        abonnement.save()
+        logger.debug("Ajout paiement abonnement %s: ajoute=%s, nouveau=%s",
+                     abonnement.id, montant_ajoute, abonnement.montant_paye)
 
-        # Générer la facture automatiquement si paiement terminé et pas encore de facture
-        if abonnement.montant_paye >= abonnement.montant_total and not abonnement.facture_pdf:
-            from .utils import generer_facture_pdf
-            pdf_file = generer_facture_pdf(abonnement, None, type_ticket='ABONNEMENT')
-            abonnement.facture_pdf = pdf_file
-            abonnement.save()
+        self._facturer_si_termine(abonnement)
 
         return Response({
             "message": "Montant ajouté avec succès",
-            "montant_paye": float(nouveau_montant)
+            "montant_paye": float(abonnement.montant_paye)
         })
 
+    @staticmethod
+    def _facturer_si_termine(abonnement):
+        """Génère la facture une fois le paiement terminé (hors transaction : le rendu PDF ne bloque pas la ligne)."""
+        if abonnement.statut_paiement != 'PAIEMENT_TERMINE' or abonnement.facture_pdf:
+            return
+        abonnement.facture_pdf = generer_facture_pdf(abonnement, None, type_ticket='ABONNEMENT', dossier='factures')
+        AbonnementClientPresentiel.objects.filter(pk=abonnement.pk).update(facture_pdf=abonnement.facture_pdf.name)
+
     @action(detail=True, methods=['post'])
     def ajouter_paiement(self, request, pk=None):
         """Ajouter un paiement en tranche pour un abonnement présentiel"""
@@ -388,29 +458,36 @@ class AbonnementClientPresentielViewSet(viewsets.ModelViewSet):
                 {"error": "Le montant est requis"}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
+        try:
+            montant = Decimal(str(montant))
+        except InvalidOperation:
+            return Response(
+                {"error": "Le montant doit être un nombre valide"}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if montant <= 0:
+            return Response(
+                {"error": "Le montant doit être supérieur à zéro"}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        # Vérifier que le montant ne dépasse pas le montant restant
-        montant_restant = abonnement.montant_total - abonnement.montant_paye
-        if montant > montant_restant:
+        # Créer le paiement en tranche ; le reste à payer est vérifié atomiquement à l'enregistrement
+        try:
+            paiement_tranche = PaiementTranche.objects.create(
+                abonnement_presentiel=abonnement,
+                montant=montant,
+                mode_paiement=mode_paiement,
+                employe=request.user
+            )
+        except DjangoValidationError:
+            montant_restant = abonnement.montant_total - abonnement.montant_paye
             return Response(
                 {"error": f"Le montant ne peut pas dépasser {montant_restant} FCFA"}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Créer le paiement en tranche
-        paiement_tranche = PaiementTranche.objects.create(
-            abonnement_presentiel=abonnement,
-            montant=montant,
-            mode_paiement=mode_paiement,
-            employe=request.user
-        )
-        
         # Générer la facture si le paiement est complet
-        if abonnement.statut_paiement == 'PAIEMENT_TERMINE' and not abonnement.facture_pdf:
-            from .utils import generer_facture_pdf
-            pdf_file = generer_facture_pdf(abonnement, None, type_ticket='ABONNEMENT')
-            abonnement.facture_pdf = pdf_file
-            abonnement.save()
+        self._facturer_si_termine(abonnement)
         
         return Response({
             "message": "Paiement ajouté avec succès",
@@ -435,9 +512,7 @@ class AbonnementClientPresentielViewSet(viewsets.ModelViewSet):
             })
         
         # Générer la facture
-        from .utils import generer_facture_pdf
-        pdf_file = generer_facture_pdf(abonnement, None, type_ticket='ABONNEMENT')
-        abonnement.facture_pdf = pdf_file
+        abonnement.facture_pdf = generer_facture_pdf(abonnement, None, type_ticket='ABONNEMENT', dossier='factures')
         abonnement.save()
         
         return Response({
@@ -447,26 +522,13 @@ class AbonnementClientPresentielViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['get'])
     def telecharger_facture(self, request, pk=None):
-        """Télécharger la facture d'un abonnement présentiel"""
-        from django.http import FileResponse, Http404
-        from django.conf import settings
-        import os
-        
+        """Télécharger la facture d'un abonnement présentiel (ETag, Range, X-Sendfile : voir core.downloads)"""
         abonnement = self.get_object()
         
         if not abonnement.facture_pdf:
             raise Http404("Facture non trouvée")
         
-        try:
-            file_path = os.path.join(settings.MEDIA_ROOT, str(abonnement.facture_pdf))
-            if os.path.exists(file_path):
-                response = FileResponse(open(file_path, 'rb'), content_type='application/pdf')
-                response['Content-Disposition'] = f'attachment; filename="{os.path.basename(file_path)}"'
-                return response
-            else:
-                raise Http404("Fichier non trouvé sur le serveur")
-        except Exception as e:
-            raise Http404(f"Erreur lors du téléchargement: {str(e)}")
+        return servir_fichier(request, abonnement.facture_pdf)
 
 
 class PaiementTrancheViewSet(viewsets.ModelViewSet):
@@ -475,13 +537,23 @@ class PaiementTrancheViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAdminOrEmploye]
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['abonnement_presentiel', 'mode_paiement']
+    pagination_class = KeysetPagination
+    pagination_date_field = 'date_paiement'
 
     def perform_create(self, serializer):
         # Assigner l'employé qui effectue le paiement
-        serializer.save(employe=self.request.user)
+        try:
+            serializer.save(employe=self.request.user)
+        except DjangoValidationError as e:
+            raise serializers.ValidationError({'montant': e.messages})
 
 
 # ---------- ViewSets existants ----------
+def _empreinte(donnees):
+    """ETag d'une représentation JSON : identique d'un processus à l'autre pour un même contenu."""
+    return quote_etag(hashlib.sha1(json.dumps(donnees, sort_keys=True, default=str).encode()).hexdigest())
+
+
 class AbonnementViewSet(viewsets.ModelViewSet):
     queryset = Abonnement.objects.all()
     serializer_class = AbonnementSerializer
@@ -496,13 +568,56 @@ class AbonnementViewSet(viewsets.ModelViewSet):
         return [permission() for permission in self.permission_classes]
         
     def create(self, request, *args, **kwargs):
-        print("Données reçues pour la création d'un abonnement:", request.data)
+        logger.debug("Création d'un abonnement: %s", request.data)
         try:
             return super().create(request, *args, **kwargs)
-        except Exception as e:
-            print("Erreur lors de la création de l'abonnement:", str(e))
+        except Exception:
+            logger.exception("Erreur lors de la création de l'abonnement")
             raise
 
+    # Lecture servie depuis le catalogue en mémoire (core.catalogue), avec ETag :
+    # un client à jour reçoit un 304 sans que le catalogue soit relu ni resérialisé.
+    def _instantane(self):
+        def construire(abonnements):
+            donnees = AbonnementSerializer(abonnements, many=True).data
+            return {
+                'donnees': donnees,
+                'par_id': {d['id']: d for d in donnees},
+                'etag': _empreinte(donnees),
+                'etags': {d['id']: _empreinte(d) for d in donnees},
+            }
+        return catalogue.derive('api', construire)
+
+    def _reponse(self, request, etag, construire):
+        conditionnelle = get_conditional_response(request, etag=etag)
+        if conditionnelle is None:
+            conditionnelle = construire()
+        conditionnelle['ETag'] = etag
+        conditionnelle['Cache-Control'] = f"private, max-age={getattr(settings, 'CATALOGUE_MAX_AGE', 0)}, must-revalidate"
+        return conditionnelle
+
+    def list(self, request, *args, **kwargs):
+        instantane = self._instantane()
+
+        def construire():
+            termes = [t.lower() for t in filters.SearchFilter().get_search_terms(request)]
+            donnees = [d for d in instantane['donnees'] if all(t in d['nom'].lower() for t in termes)]
+            page = self.paginate_queryset(donnees)
+            if page is not None:
+                return self.get_paginated_response(page)
+            return Response(donnees)
+        return self._reponse(request, instantane['etag'], construire)
+
+    def retrieve(self, request, *args, **kwargs):
+        instantane = self._instantane()
+        try:
+            pk = int(kwargs[self.lookup_field])
+        except ValueError:
+            raise Http404
+        if pk not in instantane['par_id']:
+            raise Http404
+        return self._reponse(request, instantane['etags'][pk], lambda: Response(instantane['par_id'][pk]))
+
     @action(detail=True, methods=['get'], permission_classes=[IsAdminOrEmploye])
     def clients(self, request, pk=None):
         abonnement = self.get_object()
@@ -549,20 +664,16 @@ class SeanceViewSet(viewsets.ModelViewSet):
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
 
     def create_v2(self, request, *args, **kwargs):
-        print("=== DEBUG SEANCE CREATE ===")
-        print("Request data:", request.data)
-        print("Request user:", request.user)
+        logger.debug("Création de séance par %s: %s", request.user, request.data)
         response = super().create(request, *args, **kwargs)
-        print("Response data:", response.data)
+        logger.debug("Séance créée: %s", response.data)
         return response
 
     def update(self, request, *args, **kwargs):
         """Permet à un employé de modifier une séance"""
         try:
-            print("=== DEBUG SEANCE UPDATE ===")
-            print("Request data:", request.data)
-            print("Request user:", request.user)
-            print("User role:", getattr(request.user, 'role', 'Non défini'))
+            logger.debug("Modification de séance par %s (%s): %s",
+                         request.user, getattr(request.user, 'role', 'Non défini'), request.data)
             
             # Vérifier les permissions
             if not request.user.is_authenticated:
@@ -579,11 +690,9 @@ class SeanceViewSet(viewsets.ModelViewSet):
             
             # Récupérer la séance à modifier
             seance = self.get_object()
-            print(f"Modifying session: {seance.id} - {seance.client_prenom} {seance.client_nom}")
             
             # Préparer les données
             data = request.data.copy()
-            print("Original data:", data)
             
             # Nettoyer et valider les données
             cleaned_data = {}
@@ -638,13 +747,13 @@ class SeanceViewSet(viewsets.ModelViewSet):
             else:
                 cleaned_data['coach'] = None
             
-            print("Cleaned data:", cleaned_data)
+            logger.debug("Séance %s, données nettoyées: %s", seance.id, cleaned_data)
             
             # Valider et sauvegarder les modifications
             serializer = self.get_serializer(seance, data=cleaned_data, partial=kwargs.get('partial', False))
             
             if not serializer.is_valid():
-                print("Validation errors:", serializer.errors)
+                logger.debug("Séance %s, erreurs de validation: %s", seance.id, serializer.errors)
                 return Response(
                     {"error": "Données invalides", "details": serializer.errors},
                     status=status.HTTP_400_BAD_REQUEST
@@ -652,15 +761,10 @@ class SeanceViewSet(viewsets.ModelViewSet):
             
             self.perform_update(serializer)
             
-            print("Session updated successfully")
             return Response(serializer.data)
             
         except Exception as e:
-            print("=== ERROR IN SEANCE UPDATE ===")
-            print("Error type:", type(e))
-            print("Error message:", str(e))
-            import traceback
-            print("Traceback:", traceback.format_exc())
+            logger.exception("Erreur lors de la modification de la séance")
             
             return Response(
                 {"error": f"Erreur lors de la modification de la séance: {str(e)}"},
@@ -713,6 +817,8 @@ class ReservationViewSet(viewsets.ModelViewSet):
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
     filterset_fields = ['nom_client', 'type_reservation', 'statut']
     permission_classes = [IsAdminOrEmploye | IsClient]  
+    pagination_class = KeysetPagination
+    pagination_date_field = 'created_at'
 
     def get_permissions(self):
         if self.action in ['create_v2', 'create']:
@@ -724,11 +830,10 @@ class ReservationViewSet(viewsets.ModelViewSet):
         user = self.request.user
         if user.is_authenticated and user.role == 'CLIENT':
             # Les clients ne voient que leurs propres réservations
-            client_name = f"{user.prenom} {user.nom}"
-            return Reservation.objects.filter(nom_client=client_name)
+            return Reservation.objects.filter(client=user).avec_paiements()
         elif user.is_authenticated and user.role in ['ADMIN', 'EMPLOYE']:
             # Les admins et employés voient toutes les réservations
-            return super().get_queryset()
+            return super().get_queryset().avec_paiements()
         return Reservation.objects.none()
         
     def get_serializer_context(self):
@@ -769,48 +874,25 @@ class ReservationViewSet(viewsets.ModelViewSet):
             
             # Vérification spécifique pour les abonnements
             if reservation.type_reservation == 'ABONNEMENT':
-                # On tente de retrouver l'abonnement par le nom dans la description
-                from .models import Abonnement
                 try:
-                    print(f"=== DEBUG VALIDATION ABONNEMENT ===")
-                    print(f"Description de la réservation: {reservation.description}")
-                    print(f"Montant de la réservation: {reservation.montant}")
-                    print(f"Montant saisi: {montant}")
-                    print(f"Montant total déjà payé: {montant_total_paye}")
+                    logger.debug("Validation abonnement réservation %s: abonnement=%s, montant=%s, saisi=%s, deja_paye=%s",
+                                 reservation.id, reservation.abonnement_id, reservation.montant, montant, montant_total_paye)
                     
-                    # On suppose que la description contient le nom de l'abonnement (ex: 'Abonnement Gold - ...')
-                    nom_abonnement = None
-                    if reservation.description:
-                        # Cherche le mot après 'Abonnement' dans la description
-                        import re
-                        match = re.search(r'Abonnement\s+([\w\- ]+)', reservation.description)
-                        if match:
-                            nom_abonnement = match.group(1).strip()
-                            print(f"Nom d'abonnement trouvé: {nom_abonnement}")
-                    
-                    # Si on ne trouve pas le nom dans la description, on utilise le montant de la réservation
-                    if not nom_abonnement:
-                        print("Nom d'abonnement non trouvé dans la description, utilisation du montant de la réservation")
-                        # On va chercher un abonnement avec un prix proche du montant de la réservation
-                        abonnement = Abonnement.objects.filter(
-                            prix__gte=reservation.montant * 0.9,  # 10% de tolérance
-                            prix__lte=reservation.montant * 1.1
-                        ).first()
-                    else:
-                        abonnement = Abonnement.objects.filter(nom__icontains=nom_abonnement).first()
+                    # Abonnement fixé à la création de la réservation (catalogue en mémoire, voir core.catalogue)
+                    abonnement = catalogue.abonnement(reservation.abonnement_id)
                     
                     if not abonnement:
-                        print("Aucun abonnement trouvé, utilisation du montant de la réservation comme référence")
+                        logger.debug("Aucun abonnement trouvé, montant de la réservation pris comme référence")
                         # Si on ne trouve pas d'abonnement, on utilise le montant de la réservation comme référence
                         montant_reference = reservation.montant if reservation.montant > 0 else 5000  # Valeur par défaut
                     else:
-                        print(f"Abonnement trouvé: {abonnement.nom} - Prix: {abonnement.prix}")
+                        logger.debug("Abonnement trouvé: %s - Prix: %s", abonnement.nom, abonnement.prix)
                         montant_reference = float(abonnement.prix)
                         # Mettre à jour le montant de la réservation si c'est le premier paiement
                         if montant_total_paye == 0:
                             reservation.montant = montant_reference
                             reservation.save()
-                            print(f"Montant de la réservation mis à jour: {reservation.montant}")
+                            logger.debug("Montant de la réservation %s mis à jour: %s", reservation.id, reservation.montant)
                     
                     # Vérifier que le montant total payé ne dépasse pas le montant de référence
                     montant_total_apres_paiement = montant_total_paye + float(montant)
@@ -820,10 +902,10 @@ class ReservationViewSet(viewsets.ModelViewSet):
                             status=status.HTTP_400_BAD_REQUEST
                         )
                     
-                    print(f"Validation OK - Montant total après paiement: {montant_total_apres_paiement}")
+                    logger.debug("Validation OK - Montant total après paiement: %s", montant_total_apres_paiement)
                     
                 except Exception as e:
-                    print(f"Erreur lors de la vérification du montant de l'abonnement: {str(e)}")
+                    logger.exception("Erreur lors de la vérification du montant de l'abonnement")
                     return Response({'error': f'Erreur lors de la vérification du montant de l\'abonnement: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
             
             # Créer un paiement pour cette réservation
@@ -845,20 +927,15 @@ class ReservationViewSet(viewsets.ModelViewSet):
                     reservation.statut = 'CONFIRMEE'
                     reservation.save()
                     
-                    # Générer le ticket PDF
+                    # Planifier le ticket PDF (généré en tâche de fond)
                     try:
                         # Supprimer les anciens tickets liés à cette réservation
                         from .models import Ticket
                         Ticket.objects.filter(paiement__reservation=reservation).delete()
-                        pdf_file = generer_facture_pdf(reservation, paiement, type_ticket=reservation.type_reservation)
-                        ticket = Ticket.objects.create(
-                            paiement=paiement,
-                            fichier_pdf=pdf_file,
-                            type_ticket=reservation.type_reservation
-                        )
-                        print(f"Ticket créé avec succès: {ticket.id} pour la réservation {reservation.id}")
+                        ticket = planifier_ticket(paiement, reservation, type_ticket=reservation.type_reservation)
+                        logger.debug("Ticket %s planifié pour la réservation %s", ticket.id, reservation.id)
                     except Exception as e:
-                        print(f"Erreur lors de la création du ticket: {str(e)}")
+                        logger.exception("Erreur lors de la planification du ticket de la réservation %s", reservation.id)
                         # Ne pas lever l'exception pour ne pas bloquer la validation
                     
                     return Response({
@@ -867,7 +944,8 @@ class ReservationViewSet(viewsets.ModelViewSet):
                         'montant': str(paiement.montant),
                         'montant_total_paye': str(nouveau_montant_total_paye),
                         'montant_abonnement': str(reservation.montant),
-                        'ticket_url': ticket.fichier_pdf.url if 'ticket' in locals() else None
+                        'ticket_id': ticket.id if 'ticket' in locals() else None,
+                        'ticket_statut': ticket.statut if 'ticket' in locals() else None
                     }, status=status.HTTP_200_OK)
                 else:
                     # Paiement partiel, garder en attente
@@ -885,27 +963,23 @@ class ReservationViewSet(viewsets.ModelViewSet):
                 reservation.statut = 'CONFIRMEE'
                 reservation.save()
                 
-                # Générer le ticket PDF
+                # Planifier le ticket PDF (généré en tâche de fond)
                 try:
                     # Supprimer les anciens tickets liés à cette réservation
                     from .models import Ticket
                     Ticket.objects.filter(paiement__reservation=reservation).delete()
-                    pdf_file = generer_facture_pdf(reservation, paiement, type_ticket=reservation.type_reservation)
-                    ticket = Ticket.objects.create(
-                        paiement=paiement,
-                        fichier_pdf=pdf_file,
-                        type_ticket=reservation.type_reservation
-                    )
-                    print(f"Ticket créé avec succès: {ticket.id} pour la réservation {reservation.id}")
+                    ticket = planifier_ticket(paiement, reservation, type_ticket=reservation.type_reservation)
+                    logger.debug("Ticket %s planifié pour la réservation %s", ticket.id, reservation.id)
                 except Exception as e:
-                    print(f"Erreur lors de la création du ticket: {str(e)}")
+                    logger.exception("Erreur lors de la planification du ticket de la réservation %s", reservation.id)
                     # Ne pas lever l'exception pour ne pas bloquer la validation
                 
                 return Response({
                     'message': 'Réservation validée avec succès',
                     'paiement_id': paiement.id,
                     'montant': str(paiement.montant),
-                    'ticket_url': ticket.fichier_pdf.url if 'ticket' in locals() else None
+                    'ticket_id': ticket.id if 'ticket' in locals() else None,
+                    'ticket_statut': ticket.statut if 'ticket' in locals() else None
                 }, status=status.HTTP_200_OK)
             
         except Reservation.DoesNotExist:
@@ -945,8 +1019,8 @@ class ReservationViewSet(viewsets.ModelViewSet):
         )
         
     def perform_create(self, serializer):
-        # Sauvegarder la réservation
-        reservation = serializer.save()
+        # Sauvegarder la réservation en la rattachant au client connecté
+        reservation = serializer.save(client=self.request.user)
         
         # Créer automatiquement un paiement en attente pour cette réservation
         try:
@@ -958,21 +1032,16 @@ class ReservationViewSet(viewsets.ModelViewSet):
                 status='EN_ATTENTE'
             )
             
-            # Générer le ticket PDF
+            # Billet de réservation : rendu au premier téléchargement (voir TicketViewSet.pdf)
             try:
-                pdf_file = generer_facture_pdf(reservation, paiement, type_ticket=reservation.type_reservation)
-                ticket = Ticket.objects.create(
-                    paiement=paiement,
-                    fichier_pdf=pdf_file,
-                    type_ticket=reservation.type_reservation
-                )
-                print(f"Ticket créé avec succès: {ticket.id} pour la réservation {reservation.id}")
+                ticket = planifier_ticket(paiement, reservation, type_ticket=reservation.type_reservation, differe=True)
+                logger.debug("Ticket %s planifié pour la réservation %s", ticket.id, reservation.id)
             except Exception as e:
-                print(f"Erreur lors de la création du ticket: {str(e)}")
+                logger.exception("Erreur lors de la planification du ticket de la réservation %s", reservation.id)
                 # Ne pas lever l'exception pour ne pas bloquer la création de la réservation
                 
         except Exception as e:
-            print(f"Erreur lors de la création du paiement: {str(e)}")
+            logger.exception("Erreur lors de la création du paiement de la réservation")
             # Ne pas lever l'exception pour ne pas bloquer la création de la réservation
 
     def perform_create_v2(self, request, *args, **kwargs):
@@ -995,37 +1064,24 @@ class ReservationViewSet(viewsets.ModelViewSet):
             status='EN_ATTENTE'
         )
         
-        # Générer le ticket PDF (billet de réservation)
+        # Billet de réservation : rendu au premier téléchargement
         try:
-            pdf_file = generer_facture_pdf(reservation, paiement, type_ticket=type_ticket)
-            ticket = Ticket.objects.create(
-                paiement=paiement,
-                fichier_pdf=pdf_file,
-                type_ticket=type_ticket
-            )
-            print(f"Ticket créé avec succès: {ticket.id} pour la réservation {reservation.id}")
+            ticket = planifier_ticket(paiement, reservation, type_ticket=type_ticket, differe=True)
+            logger.debug("Ticket %s planifié pour la réservation %s", ticket.id, reservation.id)
         except Exception as e:
-            print(f"Erreur lors de la création du ticket: {str(e)}")
+            logger.exception("Erreur lors de la planification du ticket de la réservation %s", reservation.id)
             raise
 
     def destroy(self, request, *args, **kwargs):
         """Permet aux clients de supprimer leurs réservations en attente"""
         try:
-            print(f"[DEBUG] Tentative de suppression de réservation - ID: {kwargs.get('pk')}")
-            print(f"[DEBUG] Utilisateur: {request.user}")
-            print(f"[DEBUG] Rôle: {getattr(request.user, 'role', 'Non défini')}")
-            
             reservation = self.get_object()
-            print(f"[DEBUG] Réservation trouvée: {reservation.id} - Statut: {reservation.statut}")
+            logger.debug("Suppression de la réservation %s (statut %s) par %s",
+                         reservation.id, reservation.statut, request.user)
             
             # Vérifier que l'utilisateur est le propriétaire de la réservation
             if request.user.role == 'CLIENT':
-                client_name = f"{request.user.prenom} {request.user.nom}"
-                print(f"[DEBUG] Nom client attendu: {client_name}")
-                print(f"[DEBUG] Nom client réservation: {reservation.nom_client}")
-                
-                if reservation.nom_client != client_name:
-                    print(f"[DEBUG] Erreur: nom client ne correspond pas")
+                if reservation.client_id != request.user.id:
                     return Response(
                         {'error': 'Vous ne pouvez supprimer que vos propres réservations'},
                         status=status.HTTP_403_FORBIDDEN
@@ -1033,41 +1089,40 @@ class ReservationViewSet(viewsets.ModelViewSet):
                 
                 # Vérifier que la réservation est en attente
                 if reservation.statut != 'EN_ATTENTE':
-                    print(f"[DEBUG] Erreur: réservation pas en attente")
                     return Response(
                         {'error': 'Vous ne pouvez supprimer que les réservations en attente'},
                         status=status.HTTP_400_BAD_REQUEST
                     )
             
             # Supprimer la réservation
-            print(f"[DEBUG] Suppression de la réservation {reservation.id}")
             reservation.delete()
-            print(f"[DEBUG] Réservation supprimée avec succès")
             
             return Response(
                 {'message': 'Réservation supprimée avec succès'},
                 status=status.HTTP_204_NO_CONTENT
             )
             
-        except Reservation.DoesNotExist:
-            print(f"[DEBUG] Réservation introuvable")
+        except (Reservation.DoesNotExist, Http404):
             return Response(
                 {'error': 'Réservation introuvable'},
                 status=status.HTTP_404_NOT_FOUND
             )
         except Exception as e:
-            print(f"[DEBUG] Erreur lors de la suppression: {str(e)}")
+            logger.exception("Erreur lors de la suppression de la réservation")
             return Response(
                 {'error': f'Erreur lors de la suppression: {str(e)}'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
 class PaiementViewSet(viewsets.ModelViewSet):
-    queryset = Paiement.objects.all()
+    # Les trois relations sont rendues par PaiementSerializer (StringRelatedField)
+    queryset = Paiement.objects.select_related('client', 'abonnement', 'seance')
     serializer_class = PaiementSerializer
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
     filterset_fields = ['client', 'abonnement', 'seance', 'status']
     permission_classes = [IsAdminOrEmploye | IsClient]  # Permettre aux clients de lire
+    pagination_class = KeysetPagination
+    pagination_date_field = 'date_paiement'
 
     def get_permissions(self):
         if self.action in ['create', 'update', 'destroy']:
@@ -1079,7 +1134,7 @@ class PaiementViewSet(viewsets.ModelViewSet):
         user = self.request.user
         if user.is_authenticated and user.role == 'CLIENT':
             # Les clients ne voient que leurs propres paiements
-            return Paiement.objects.filter(client=user)
+            return super().get_queryset().filter(client=user)
         elif user.is_authenticated and user.role in ['ADMIN', 'EMPLOYE']:
             # Les admins et employés voient tous les paiements
             return super().get_queryset()
@@ -1090,6 +1145,8 @@ class TicketViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Ticket.objects.all()
     serializer_class = TicketSerializer
     permission_classes = [IsAdminOrEmploye | IsClient]  # Permettre aux clients de lire
+    pagination_class = KeysetPagination
+    pagination_date_field = 'date_generation'
 
     def get_permissions(self):
         if self.action in ['create', 'update', 'destroy']:
@@ -1104,9 +1161,70 @@ class TicketViewSet(viewsets.ReadOnlyModelViewSet):
             return Ticket.objects.filter(paiement__client=user)
         elif user.is_authenticated and user.role in ['ADMIN', 'EMPLOYE']:
             # Les admins et employés voient tous les tickets
-            return super().get_queryset().order_by('-id')  # Tri par ID décroissant
+            return super().get_queryset()
         return Ticket.objects.none()  # Aucun résultat si non authentifié
 
+    @action(detail=True, methods=['get'], url_path='pdf')
+    def pdf(self, request, pk=None):
+        """
+        Télécharge le PDF du ticket. Un ticket à la demande est rendu au premier appel ;
+        un ticket confié au worker répond 202 tant que son rendu n'est pas terminé.
+        """
+        return _telecharger_ticket(request, self.get_object())
+
+
+def _telecharger_ticket(request, ticket):
+    ticket = materialiser_ticket(ticket)
+    if ticket.est_pret:
+        return servir_fichier(request, ticket.fichier_pdf)
+    if ticket.statut == 'ECHEC':
+        return Response({'error': 'Le ticket n\'a pas pu être généré.', 'ticket_statut': ticket.statut},
+                        status=status.HTTP_410_GONE)
+    return Response({'message': 'Ticket en cours de génération.', 'ticket_statut': ticket.statut},
+                    status=status.HTTP_202_ACCEPTED)
+
+
+class DocumentView(APIView):
+    """
+    Téléchargement générique des documents PDF : /documents/<ticket|facture|presentiel>/<id>/.
+    Les clients n'accèdent qu'à leurs propres documents.
+    Réponses avec ETag/Last-Modified (304), Range (206) et délégation X-Accel-Redirect/X-Sendfile.
+    """
+    permission_classes = [IsAdminOrEmploye | IsClient]
+
+    # type de document -> (modèle, lien vers le client propriétaire, champ fichier)
+    DOCUMENTS = {
+        'ticket': (Ticket, 'paiement__client', 'fichier_pdf'),
+        'facture': (Facture, 'paiement__client', 'fichier_pdf'),
+        'presentiel': (AbonnementClientPresentiel, 'client', 'facture_pdf'),
+    }
+
+    def get(self, request, type_document, pk):
+        if type_document not in self.DOCUMENTS:
+            raise Http404("Type de document inconnu")
+        modele, proprietaire, champ = self.DOCUMENTS[type_document]
+        documents = modele.objects.all()
+        if request.user.role == 'CLIENT':
+            documents = documents.filter(**{proprietaire: request.user})
+        document = get_object_or_404(documents, pk=pk)
+        if type_document == 'ticket':
+            return _telecharger_ticket(request, document)
+        return servir_fichier(request, getattr(document, champ))
+
+
+class CheckInView(APIView):
+    """
+    Contrôle à l'entrée : /checkin/<uuid du ticket>/ (QR code du ticket).
+    Réponse : statut VALIDE, EXPIRE, IMPAYE ou INACTIF, client, abonnement et date de fin.
+    """
+    permission_classes = [IsAdminOrEmploye]
+
+    def get(self, request, code):
+        reponse = checkin.verifier(code)
+        if reponse is None:
+            return Response({'error': 'Ticket inconnu'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(reponse)
+
 
 class ChargeViewSet(viewsets.ModelViewSet):
     queryset = Charge.objects.all()
@@ -1132,6 +1250,8 @@ class PresencePersonnelViewSet(viewsets.ModelViewSet):
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['personnel', 'date_jour', 'statut']
     permission_classes = [IsAdminOrEmploye]
+    pagination_class = KeysetPagination
+    pagination_date_field = 'date_jour'
 
     def get_permissions(self):
         if self.action in ['create', 'update', 'destroy']:
@@ -1146,11 +1266,45 @@ class PresencePersonnelViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(presences, many=True)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['get'], permission_classes=[IsAdmin])
+    def statistiques(self, request):
+        """
+        Présences agrégées par personne et par jour (core.presences).
+        Paramètres optionnels : ?from=YYYY-MM-DD&to=YYYY-MM-DD (défaut : mois en cours) et
+        ?heure_limite=HH:MM (au-delà, l'arrivée compte comme un retard ; défaut PRESENCE_HEURE_LIMITE).
+        """
+        aujourd_hui = timezone.localdate()
+        try:
+            debut = FinancialReportView._parse_date(request.query_params.get('from')) or aujourd_hui.replace(day=1)
+            fin = FinancialReportView._parse_date(request.query_params.get('to')) or aujourd_hui
+        except ValueError:
+            return Response(
+                {'error': 'Les paramètres from et to doivent être au format YYYY-MM-DD'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if debut > fin:
+            return Response(
+                {'error': 'La date de début doit précéder la date de fin'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            heure_limite = datetime.strptime(
+                request.query_params.get('heure_limite') or settings.PRESENCE_HEURE_LIMITE, '%H:%M'
+            ).time()
+        except ValueError:
+            return Response({'error': 'heure_limite doit être au format HH:MM'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(sur_rapports(statistiques_presences, debut, fin, heure_limite))
+
+    @action(detail=False, methods=['post'], url_path='bulk', permission_classes=[IsAdminOrEmploye])
+    def bulk(self, request):
+        """Enregistre la feuille de présence d'une journée en une requête (upsert par personne et par jour)"""
+        serializer = PresenceLotSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
     def perform_create(self, serializer):
-        print("=== DEBUG PERFORM CREATE ===")
-        print("Request data:", self.request.data)
-        print("Validated data:", serializer.validated_data)
-        print("User:", self.request.user)
+        logger.debug("Création de présence par %s: %s", self.request.user, serializer.validated_data)
         
         # Le serializer gère maintenant tout automatiquement
         # On sauvegarde simplement
@@ -1197,11 +1351,10 @@ class UserReservationsView(APIView):
                 )
             
             # Récupérer les réservations confirmées du client
-            client_name = f"{user.prenom} {user.nom}"
             reservations = Reservation.objects.filter(
-                nom_client=client_name,
+                client=user,
                 statut='CONFIRMEE'
-            ).order_by('-created_at')
+            ).order_by('-created_at').avec_paiements()
             
             # Sérialiser les réservations
             from .serializers import ReservationSerializer
@@ -1249,15 +1402,11 @@ class SeanceDirecteView(APIView):
             status='PAYE',
             mode_paiement='ESPECE'
         )
-        pdf_file = generer_facture_pdf(seance, paiement, type_ticket='SEANCE')
-        ticket = Ticket.objects.create(
-            paiement=paiement,
-            fichier_pdf=pdf_file,
-            type_ticket='SEANCE'
-        )
+        ticket = planifier_ticket(paiement, seance, type_ticket='SEANCE')
         response_data = SeanceSerializer(seance, context={'request': request}).data
         response_data['ticket_id'] = ticket.id
-        response_data['ticket_pdf_url'] = ticket.fichier_pdf.url if ticket.fichier_pdf else None
+        response_data['ticket_statut'] = ticket.statut
+        response_data['ticket_pdf_url'] = ticket.fichier_pdf.url if ticket.est_pret else None
         return Response(response_data, status=status.HTTP_201_CREATED)
 
 class AbonnementClientDirectView(APIView):
@@ -1289,17 +1438,11 @@ class AbonnementClientDirectView(APIView):
             actif=True,
             paiement=paiement
         )
-        pdf_file = generer_facture_pdf(ab_client, paiement, type_ticket='ABONNEMENT')
-        ticket, created = Ticket.objects.get_or_create(
-            paiement=paiement,
-            defaults={
-                'fichier_pdf': pdf_file,
-                'type_ticket': 'ABONNEMENT'
-            }
-        )
+        ticket = planifier_ticket(paiement, ab_client, type_ticket='ABONNEMENT')
         response_data = AbonnementClientSerializer(ab_client).data
         response_data['ticket_id'] = ticket.id
-        response_data['ticket_pdf_url'] = ticket.fichier_pdf.url if ticket.fichier_pdf else None
+        response_data['ticket_statut'] = ticket.statut
+        response_data['ticket_pdf_url'] = ticket.fichier_pdf.url if ticket.est_pret else None
         return Response(response_data, status=status.HTTP_201_CREATED)
 
 class ValiderReservationSeanceView(APIView):
@@ -1311,7 +1454,8 @@ class ValiderReservationSeanceView(APIView):
         except Reservation.DoesNotExist:
             return Response({'error': 'Réservation introuvable ou déjà validée'}, status=404)
         
-        # Récupérer le montant depuis la requête ou utiliser celui de la séance
+        # Récupérer le montant depuis la requête ou utiliser celui de la réservation
+        # (Reservation n'a pas de séance : le paiement est rattaché par reservation=, seance reste vide)
         montant = request.data.get('montant')
         if montant is not None:
             try:
@@ -1321,7 +1465,7 @@ class ValiderReservationSeanceView(APIView):
             except (ValueError, TypeError):
                 return Response({'error': 'Montant invalide'}, status=400)
         else:
-            montant = reservation.seance.montant_paye or 0
+            montant = reservation.montant or 0
         
         # Mettre à jour la réservation avec le montant payé et le montant total
         reservation.statut = 'CONFIRMEE'
@@ -1332,7 +1476,6 @@ class ValiderReservationSeanceView(APIView):
         # Créer le paiement
         paiement = Paiement.objects.create(
             client=reservation.client,
-            seance=reservation.seance,
             montant=Decimal(str(montant)),
             status='PAYE',
             mode_paiement=request.data.get('mode_paiement', 'ESPECE'),
@@ -1342,13 +1485,8 @@ class ValiderReservationSeanceView(APIView):
         # Rafraîchir l'objet pour s'assurer d'avoir les dernières données
         reservation.refresh_from_db()
         
-        # Générer le ticket PDF
-        pdf_file = generer_facture_pdf(reservation.seance, paiement, type_ticket='SEANCE')
-        ticket = Ticket.objects.create(
-            paiement=paiement,
-            fichier_pdf=pdf_file,
-            type_ticket='SEANCE'
-        )
+        # Planifier le ticket PDF (généré en tâche de fond)
+        ticket = planifier_ticket(paiement, reservation, type_ticket='SEANCE')
         
         # Sérializer la réservation mise à jour pour la réponse
         from .serializers import ReservationSerializer
@@ -1363,7 +1501,8 @@ class ValiderReservationSeanceView(APIView):
             'message': 'Réservation validée et facture générée.',
             'reservation': response_data,
             'ticket_id': ticket.id, 
-            'ticket_pdf_url': ticket.fichier_pdf.url if ticket.fichier_pdf else None
+            'ticket_statut': ticket.statut,
+            'ticket_pdf_url': ticket.fichier_pdf.url if ticket.est_pret else None
         })
 
 class ValiderReservationAbonnementView(APIView):
@@ -1385,13 +1524,8 @@ class ValiderReservationAbonnementView(APIView):
         )
         ab_client.paiement = paiement
         ab_client.save()
-        pdf_file = generer_facture_pdf(ab_client, paiement, type_ticket='ABONNEMENT')
-        ticket = Ticket.objects.create(
-            paiement=paiement,
-            fichier_pdf=pdf_file,
-            type_ticket='ABONNEMENT'
-        )
-        return Response({'message': 'Abonnement validé et facture générée.', 'ticket_id': ticket.id, 'ticket_pdf_url': ticket.fichier_pdf.url if ticket.fichier_pdf else None})
+        ticket = planifier_ticket(paiement, ab_client, type_ticket='ABONNEMENT')
+        return Response({'message': 'Abonnement validé et facture générée.', 'ticket_id': ticket.id, 'ticket_statut': ticket.statut, 'ticket_pdf_url': ticket.fichier_pdf.url if ticket.est_pret else None})
 
 class AbonnementClientReservationView(APIView):
     permission_classes = [IsClient]
@@ -1416,14 +1550,14 @@ class AbonnementClientReservationView(APIView):
             status='EN_ATTENTE',
             mode_paiement='ESPECE'
         )
-        # Générer le ticket PDF (billet de réservation)
-        pdf_file = generer_facture_pdf(ab_client, paiement, type_ticket='ABONNEMENT')
-        Ticket.objects.create(
-            paiement=paiement,
-            fichier_pdf=pdf_file,
-            type_ticket='ABONNEMENT'
-        )
-        return Response({'message': 'Réservation d\'abonnement enregistrée, ticket généré.'}, status=status.HTTP_201_CREATED)
+        # Billet de réservation : rendu au premier téléchargement (voir TicketViewSet.pdf)
+        ticket = planifier_ticket(paiement, ab_client, type_ticket='ABONNEMENT', differe=True)
+        return Response({
+            'message': 'Réservation d\'abonnement enregistrée.',
+            'ticket_id': ticket.id,
+            'ticket_statut': ticket.statut,
+            'ticket_url': url_ticket(ticket, request),
+        }, status=status.HTTP_201_CREATED)
 
 class AbonnementClientViewSet(viewsets.ModelViewSet):
     queryset = AbonnementClient.objects.all()
@@ -2,6 +2,8 @@ from pathlib import Path
 import os
 from datetime import timedelta
 
+from core.log import niveaux_par_module
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 SECRET_KEY = 'django-insecure-!$(ch8&%_bsveh43m7=a-y74*vd#0$j8p3sgpfr(u+hgq6go5_'
@@ -29,7 +31,7 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'core.authentication.ClaimsJWTAuthentication',
     ),
     'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
@@ -40,14 +42,21 @@ SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(hours=1),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
     'AUTH_HEADER_TYPES': ('Bearer',),
+    # role et email dans tous les jetons, pour le frontend (l'autorisation relit l'état : core.authentication)
+    'TOKEN_OBTAIN_SERIALIZER': 'core.serializers.MyTokenObtainPairSerializer',
 }
 
+# Authentification (core.authentication) : état d'autorisation (role, is_active) lu en base et gardé
+# N secondes ; délai maximal avant qu'un changement de rôle soit appliqué par tous les processus
+AUTH_CACHE_TTL_SECONDS = 60
+
 AUTH_USER_MODEL = 'core.User'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 MIDDLEWARE = [
+    'core.instrumentation.PerformanceMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -97,12 +106,46 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'gym_project.wsgi.application'
 
+# SQLite partagé par plusieurs workers gunicorn (mesure : python manage.py bench_sqlite)
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',           # les lectures ne bloquent plus l'écriture (et inversement)
+    'synchronous': 'NORMAL',         # sûr en WAL : plus de fsync à chaque commit
+    'mmap_size': 134217728,          # 128 Mo lus par projection mémoire
+    'cache_size': -20000,            # ~20 Mo de cache de pages par connexion (négatif = KiB)
+    'temp_store': 'MEMORY',
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        # Connexion gardée d'une requête à l'autre (vérifiée avant réutilisation)
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', '600')),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # Attente du verrou d'écriture (secondes) avant « database is locked »
+            'timeout': float(os.environ.get('SQLITE_BUSY_TIMEOUT', '20')),
+            # Verrou d'écriture pris dès BEGIN : pas d'échec immédiat lecture -> écriture
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': ';'.join(f'PRAGMA {nom}={valeur}' for nom, valeur in SQLITE_PRAGMAS.items()),
+        },
+    },
+    # Copie de la base principale pour les rapports (core.routers, manage.py snapshot_reporting)
+    'reporting': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('REPORTING_DB_PATH') or BASE_DIR / 'reporting.sqlite3',
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', '600')),
+        'OPTIONS': {
+            'init_command': 'PRAGMA query_only=ON;PRAGMA mmap_size=134217728;PRAGMA cache_size=-20000',
+        },
+        'TEST': {'MIRROR': 'default'},
+    },
 }
+DATABASE_ROUTERS = ['core.routers.ReportingRouter']
+
+# Rapports lus sur la copie si elle a moins de REPORTING_MAX_STALENESS_SECONDS, sinon sur la base principale
+REPORTING_DATABASE = 'reporting'
+REPORTING_MAX_STALENESS_SECONDS = 300
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -128,3 +171,69 @@ STATIC_URL = 'static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Génération des tickets PDF en tâche de fond (python manage.py pdf_worker)
+PDF_JOBS_MAX_ATTEMPTS = 3
+# Bail d'un rendu de ticket à la demande (core.jobs.materialiser_ticket)
+PDF_LAZY_LEASE_SECONDS = 60
+
+# Téléchargement des documents (core.downloads) : None (envoi par Django),
+# 'x-accel-redirect' (nginx, location interne DOCUMENTS_ACCEL_PREFIX -> MEDIA_ROOT) ou 'x-sendfile'
+DOCUMENTS_OFFLOAD = os.environ.get('DOCUMENTS_OFFLOAD') or None
+DOCUMENTS_ACCEL_PREFIX = '/protected-media/'
+
+# Catalogue des abonnements gardé en mémoire (core.catalogue) : durée de vie maximale d'une copie
+CATALOGUE_TTL_SECONDS = 60
+# max-age des réponses /api/abonnements/ (revalidation par ETag au-delà)
+CATALOGUE_MAX_AGE = 0
+
+# Statistiques de présence (core.presences) : heure d'arrivée au-delà de laquelle on compte un retard,
+# et cache des résultats des mois écoulés
+PRESENCE_HEURE_LIMITE = '08:30'
+PRESENCE_CACHE_MOIS_CLOS = True
+# Durée de vie de ce cache : délai maximal avant qu'un autre processus voie une présence modifiée
+# (cache par processus ; immédiat avec un cache partagé dans CACHES)
+PRESENCE_CACHE_TTL_SECONDS = 300
+
+# Compteurs de supervision (core.metrics) : écrits en base au plus toutes les N secondes par processus
+METRICS_FLUSH_SECONDS = 10
+
+# Contrôle d'accès par QR code (core.checkin) : adhésions valides gardées en mémoire
+# Cache par processus : délai maximal avant qu'un autre processus refuse une adhésion désactivée
+CHECKIN_CACHE_TTL_SECONDS = 30
+CHECKIN_CACHE_MAX = 10000
+
+# Exports comptables (core.exports) : lignes lues par lots de cette taille
+EXPORT_CHUNK_SIZE = 2000
+
+# Instrumentation des requêtes (core.instrumentation.PerformanceMiddleware)
+PERF_SERVER_TIMING = True
+PERF_QUERY_BUDGET = 50
+PERF_LATENCY_BUDGET_MS = 500
+
+# Journalisation (core.log) : JSON sur la console, niveaux par module et échantillonnage du DEBUG
+# Ex. LOG_LEVELS="core.views=DEBUG,core.perf=WARNING" LOG_DEBUG_SAMPLE_RATE=0.05
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')  # 'json' ou 'text'
+LOG_DEBUG_SAMPLE_RATE = float(os.environ.get('LOG_DEBUG_SAMPLE_RATE', '1.0' if DEBUG else '0.1'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {'()': 'core.log.JsonFormatter'},
+        'text': {'format': '%(asctime)s %(levelname)s %(name)s %(message)s'},
+    },
+    'filters': {
+        'debug_sampling': {'()': 'core.log.DebugSamplingFilter', 'rate': LOG_DEBUG_SAMPLE_RATE},
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': LOG_FORMAT,
+            'filters': ['debug_sampling'],
+        },
+    },
+    'loggers': niveaux_par_module(os.environ.get('LOG_LEVELS'), LOG_LEVEL),
+}
+LOGGING['loggers']['core']['handlers'] = ['console']